@@ -93,6 +93,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'voitures.context_processors.notification_counts',
+                'voitures.context_processors.logo_sprite_manifest',
             ],
         },
     },
@@ -115,6 +116,39 @@ if REQUIRE_POSTGRES and "sqlite3" in DATABASES["default"]["ENGINE"]:
         "PostgreSQL requis: définissez DATABASE_URL vers une base Postgres (ex: postgres://...)."
     )
 
+# Cache à deux niveaux (voir voitures/services/caching.py) :
+# - "local" : mémoire du processus, courte durée ;
+# - "default" : partagé entre processus/workers — Redis si REDIS_URL (paquet `redis`
+#   requis), sinon fichiers dans CACHE_DIR. Les écritures fréquentes (anti-doublon des
+#   vues) restent en mémoire locale sans Redis : voir caching.hot_cache().
+# Les tests remplacent CACHES par la mémoire locale (voir voitures/tests.py).
+REDIS_URL = os.getenv("REDIS_URL", "")
+if _env_bool("CACHE_LOCAL_ONLY", default=False):
+    _shared_cache = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "vente-voitures-shared",
+    }
+elif REDIS_URL:
+    _shared_cache = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    }
+else:
+    _shared_cache = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("CACHE_DIR", str(BASE_DIR / ".cache")),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+CACHES = {
+    "default": {**_shared_cache, "TIMEOUT": 300},
+    "local": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "vente-voitures-local",
+        "TIMEOUT": 60,
+        "OPTIONS": {"MAX_ENTRIES": 2000},
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -136,7 +170,12 @@ USE_I18N = True
 USE_TZ = True
 
 STATIC_URL = '/static/'
+# Fichiers statiques générés (generate_brand_svgs), hors du dépôt (.gitignore) :
+# collectstatic les publie avec ceux de static/.
+GENERATED_STATIC_DIR = Path(os.getenv("GENERATED_STATIC_DIR", BASE_DIR / "build" / "static"))
 STATICFILES_DIRS = [BASE_DIR / 'static']
+if GENERATED_STATIC_DIR.is_dir():
+    STATICFILES_DIRS.append(GENERATED_STATIC_DIR)
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 STORAGES = {
@@ -163,6 +202,37 @@ LOGIN_URL = 'connexion'
 # Réservations / transactions
 # Durée max (en heures) d'une transaction "en_attente" avant annulation automatique.
 RESERVATION_TTL_HOURS = int(os.getenv("RESERVATION_TTL_HOURS", "24"))
+# Intervalle (en secondes) entre deux passages d'expiration (worker / garde en processus).
+EXPIRY_SWEEP_INTERVAL_SECONDS = int(os.getenv("EXPIRY_SWEEP_INTERVAL_SECONDS", "60"))
+
+# Compteur de vues : écriture groupée en base toutes les N secondes (0 = écriture immédiate),
+# et déduplication d'un même visiteur pendant VIEW_COUNTER_DEDUP_SECONDS.
+VIEW_COUNTER_FLUSH_SECONDS = int(os.getenv("VIEW_COUNTER_FLUSH_SECONDS", "30"))
+VIEW_COUNTER_DEDUP_SECONDS = int(os.getenv("VIEW_COUNTER_DEDUP_SECONDS", "1800"))
+
+# Durée de cache des compteurs de facettes du catalogue (par combinaison de filtres).
+FACETS_CACHE_SECONDS = int(os.getenv("FACETS_CACHE_SECONDS", "60"))
+
+# Durée de cache du calendrier de disponibilités (invalidé à chaque changement de réservation).
+AVAILABILITY_CACHE_SECONDS = int(os.getenv("AVAILABILITY_CACHE_SECONDS", "300"))
+
+# Durée de conservation en cache des reçus PDF définitifs (vente confirmée/terminée).
+RECEIPT_CACHE_SECONDS = int(os.getenv("RECEIPT_CACHE_SECONDS", str(30 * 24 * 3600)))
+# Processus de rendu de l'export des reçus depuis le dashboard (1 = dans le worker web).
+RECEIPT_EXPORT_WORKERS = int(os.getenv("RECEIPT_EXPORT_WORKERS", "1"))
+
+# Durée de vie du compteur de notifications non lues en cache (recalculé ensuite).
+NOTIFICATIONS_UNREAD_CACHE_SECONDS = int(os.getenv("NOTIFICATIONS_UNREAD_CACHE_SECONDS", "300"))
+
+# Instantané de la page d'accueil : frais pendant N secondes, puis servi périmé pendant
+# HOMEPAGE_STALE_SECONDS le temps qu'une seule requête le reconstruise.
+HOMEPAGE_SNAPSHOT_SECONDS = int(os.getenv("HOMEPAGE_SNAPSHOT_SECONDS", "300"))
+HOMEPAGE_STALE_SECONDS = int(os.getenv("HOMEPAGE_STALE_SECONDS", "600"))
+
+# File d'envoi des notifications (outbox) vidée par `manage.py run_outbox_worker`.
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
 
 # Paramètres de sécurité (activés en production uniquement)
 if not DEBUG:
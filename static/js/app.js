@@ -100,6 +100,97 @@ document.addEventListener("click", (event) => {
   form.submit();
 });
 
+// Défilement infini : charge la page suivante (pagination par curseur) quand le
+// lien « Suivant » devient visible, puis ajoute ses éléments à la liste courante.
+document.addEventListener("DOMContentLoaded", () => {
+  const list = document.querySelector("[data-infinite-list]");
+  if (!list || !("IntersectionObserver" in window)) return;
+
+  let loading = false;
+  const observer = new IntersectionObserver(async (entries) => {
+    const entry = entries.find((e) => e.isIntersecting);
+    if (!entry || loading) return;
+    const link = entry.target;
+    loading = true;
+    observer.unobserve(link);
+
+    try {
+      const res = await fetch(link.href, { headers: { "X-Requested-With": "XMLHttpRequest" } });
+      if (!res.ok) throw new Error(res.statusText);
+      const doc = new DOMParser().parseFromString(await res.text(), "text/html");
+      const nextList = doc.querySelector("[data-infinite-list]");
+      if (nextList) list.append(...Array.from(nextList.children));
+
+      const nav = document.querySelector("[data-infinite-nav]");
+      const nextNav = doc.querySelector("[data-infinite-nav]");
+      if (nav && nextNav) {
+        nav.replaceWith(nextNav);
+      } else if (nav) {
+        nav.remove();
+      }
+      watch();
+    } catch (err) {
+      // En cas d'échec, le lien reste cliquable (pagination classique).
+    } finally {
+      loading = false;
+    }
+  }, { rootMargin: "400px 0px" });
+
+  const watch = () => {
+    const next = document.querySelector("[data-infinite-nav] [data-infinite-next]");
+    if (next) observer.observe(next);
+  };
+  watch();
+});
+
+// Disponibilités : avant l'envoi d'une réservation, vérifie le créneau choisi contre
+// les intervalles occupés (JSON revalidé par ETag) et bloque la soumission s'il y a conflit.
+document.addEventListener("DOMContentLoaded", () => {
+  const form = document.querySelector("form[data-availability-url]");
+  if (!form) return;
+  const debutInput = form.querySelector("[name='debut']");
+  const finInput = form.querySelector("[name='fin']");
+  const feedback = form.querySelector("[data-availability-feedback]");
+  if (!debutInput || !finInput) return;
+
+  const isoDay = (d) => `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, "0")}-${String(d.getDate()).padStart(2, "0")}`;
+  const formatSlot = (d) => d.toLocaleString("fr-FR", { day: "2-digit", month: "2-digit", hour: "2-digit", minute: "2-digit" });
+
+  const setConflict = (message) => {
+    finInput.setCustomValidity(message);
+    if (feedback) {
+      feedback.textContent = message;
+      feedback.classList.toggle("d-none", !message);
+    }
+  };
+
+  const check = async () => {
+    setConflict("");
+    if (!debutInput.value || !finInput.value) return;
+    const debut = new Date(debutInput.value);
+    const fin = new Date(finInput.value);
+    if (!(debut < fin)) return;
+
+    const lastDay = new Date(fin);
+    lastDay.setDate(lastDay.getDate() + 1);
+    const url = `${form.dataset.availabilityUrl}?debut=${isoDay(debut)}&fin=${isoDay(lastDay)}`;
+    try {
+      const res = await fetch(url, { headers: { Accept: "application/json" } });
+      if (!res.ok) return;
+      const data = await res.json();
+      const conflict = (data.occupe || []).find(([b, e]) => new Date(b) < fin && new Date(e) > debut);
+      if (conflict) {
+        setConflict(`Créneau déjà pris (${formatSlot(new Date(conflict[0]))} → ${formatSlot(new Date(conflict[1]))}).`);
+      }
+    } catch (err) {
+      // Hors ligne : le serveur refusera le créneau s'il est pris.
+    }
+  };
+
+  debutInput.addEventListener("change", check);
+  finInput.addEventListener("change", check);
+});
+
 // ======================
 // Feedback & formulaires
 // ======================
@@ -1,8 +1,11 @@
 from django.contrib import admin
+from django.db.models import Count
+from django.utils import timezone
 from django.utils.html import format_html
 from .models import (
     Marque, Modele, Voiture, ImageVoiture, 
-    Favori, Avis, Transaction, Message, Notification
+    Favori, Avis, Transaction, Message, Notification, NotificationGlobale,
+    OutboxNotification
 )
 
 class ImageVoitureInline(admin.TabularInline):
@@ -19,26 +22,44 @@ class ImageVoitureInline(admin.TabularInline):
 
 @admin.register(Marque)
 class MarqueAdmin(admin.ModelAdmin):
-    list_display = ['nom', 'pays', 'date_creation', 'nombre_modeles', 'nombre_voitures']
+    # Compteurs dénormalisés : aucune requête COUNT par ligne de la liste.
+    list_display = [
+        'nom', 'pays', 'date_creation', 'nombre_modeles',
+        'nb_voitures', 'nb_disponibles', 'nb_reservees', 'nb_vendues',
+    ]
     list_filter = ['pays', 'date_creation']
     search_fields = ['nom', 'pays']
-    readonly_fields = ['nombre_modeles', 'nombre_voitures']
+    readonly_fields = ['nombre_modeles', 'nb_voitures', 'nb_disponibles', 'nb_reservees', 'nb_vendues']
     fieldsets = (
         ('Informations', {
             'fields': ('nom', 'pays', 'date_creation', 'logo', 'description')
         }),
         ('Statistiques', {
-            'fields': ('nombre_modeles', 'nombre_voitures'),
+            'fields': ('nombre_modeles', 'nb_voitures', 'nb_disponibles', 'nb_reservees', 'nb_vendues'),
             'classes': ('collapse',)
         }),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(_nb_modeles=Count('modeles'))
+
+    def nombre_modeles(self, obj):
+        if hasattr(obj, '_nb_modeles'):
+            return obj._nb_modeles
+        return obj.nombre_modeles()
+    nombre_modeles.short_description = 'Modèles'
+    nombre_modeles.admin_order_field = '_nb_modeles'
+
 @admin.register(Modele)
 class ModeleAdmin(admin.ModelAdmin):
-    list_display = ['marque', 'nom', 'annee_lancement', 'type_carburant', 'transmission', 'nombre_voitures']
+    list_display = [
+        'marque', 'nom', 'annee_lancement', 'type_carburant', 'transmission',
+        'nb_voitures', 'nb_disponibles', 'nb_reservees', 'nb_vendues',
+    ]
+    list_select_related = ['marque']
     list_filter = ['marque', 'type_carburant', 'transmission']
     search_fields = ['nom', 'marque__nom']
-    readonly_fields = ['nombre_voitures']
+    readonly_fields = ['nb_voitures', 'nb_disponibles', 'nb_reservees', 'nb_vendues']
 
 @admin.register(Voiture)
 class VoitureAdmin(admin.ModelAdmin):
@@ -164,3 +185,27 @@ class NotificationAdmin(admin.ModelAdmin):
     list_filter = ["type", "lu", "date_creation"]
     search_fields = ["utilisateur__username", "titre", "contenu"]
     readonly_fields = ["date_creation"]
+
+
+@admin.register(NotificationGlobale)
+class NotificationGlobaleAdmin(admin.ModelAdmin):
+    list_display = ["titre", "type", "auteur", "date_creation"]
+    list_filter = ["type", "date_creation"]
+    search_fields = ["titre", "contenu", "auteur__username"]
+    readonly_fields = ["date_creation"]
+
+
+@admin.register(OutboxNotification)
+class OutboxNotificationAdmin(admin.ModelAdmin):
+    list_display = ["id", "audience", "utilisateur", "titre", "statut", "tentatives", "prochain_essai"]
+    list_filter = ["statut", "audience", "type"]
+    search_fields = ["utilisateur__username", "titre", "derniere_erreur"]
+    readonly_fields = ["date_creation", "date_traitement", "derniere_erreur"]
+    actions = ["remettre_en_file"]
+
+    def remettre_en_file(self, request, queryset):
+        count = queryset.exclude(statut="livree").update(
+            statut="en_attente", tentatives=0, prochain_essai=timezone.now()
+        )
+        self.message_user(request, f"{count} notifications remises en file d'envoi.")
+    remettre_en_file.short_description = "Remettre en file d'envoi"
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class VoituresConfig(AppConfig):
     name = 'voitures'
+
+    def ready(self):
+        from . import signals  # noqa: F401
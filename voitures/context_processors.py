@@ -1,14 +1,17 @@
 from __future__ import annotations
 
-from voitures.models import Notification
+from django.utils.functional import SimpleLazyObject
+
+from voitures.services import logo_sprite, notifications
 
 
 def notification_counts(request):
     if not getattr(request, "user", None) or not request.user.is_authenticated:
         return {"unread_notifications_count": 0}
-    return {
-        "unread_notifications_count": Notification.objects.filter(
-            utilisateur=request.user, lu=False
-        ).count()
-    }
+    # Évalué à la première lecture dans le template (aucune requête sinon).
+    return {"unread_notifications_count": notifications.lazy_unread_count(request.user)}
+
 
+def logo_sprite_manifest(request):
+    # Lu une fois par rendu, au premier logo affiché ({} tant qu'aucune planche n'est composée).
+    return {"logo_sprite": SimpleLazyObject(lambda: logo_sprite.published() or {})}
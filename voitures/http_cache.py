@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+# Les URLs versionnées changent avec le contenu : le navigateur ne revalide jamais.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=86400"
+
+
+def not_modified(request, etag: str, cache_control: str = DEFAULT_CACHE_CONTROL) -> HttpResponse | None:
+    """304 si le client a déjà cette version (If-None-Match)."""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+        response["Cache-Control"] = cache_control
+    return response
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from voitures.services import logo_sprite
+
+
+class Command(BaseCommand):
+    help = (
+        "Compose la planche des logos de marques (PNG, WebP, SVG de symboles) et son manifeste. "
+        "Sans --force, ne fait rien si la planche des logos actuels existe déjà."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Recomposer même si la planche existe.")
+
+    def handle(self, *args, **options):
+        current = logo_sprite.build(force=options["force"])
+        symbols = len(current["symbols"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Planche {current['signature']}: {len(current['logos'])} logo(s) image, "
+                f"{symbols} symbole(s) SVG ({current['size'][0]}×{current['size'][1]} px)"
+            )
+        )
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from voitures.services import reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Annule la plus récente de chaque paire de réservations actives qui se chevauchent "
+        "sur une même voiture : elles empêchent d'installer la garde anti-chevauchement."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Lister les réservations concernées sans les annuler.",
+        )
+
+    def handle(self, *args, **options):
+        ids = reservations.cancel_overlapping(dry_run=options["dry_run"])
+        if options["dry_run"]:
+            self.stdout.write(f"Réservations à annuler: {len(ids)}")
+            for reservation_id in ids:
+                self.stdout.write(f"  #{reservation_id}")
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Réservations annulées: {len(ids)}. Relancez `migrate` pour installer la garde."
+            )
+        )
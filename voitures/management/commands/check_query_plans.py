@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from voitures.models import Voiture
+from voitures.services import query_plans
+
+
+class Command(BaseCommand):
+    help = (
+        "Exécute EXPLAIN sur les requêtes des vues les plus sollicitées et échoue si un plan "
+        "parcourt une table séquentiellement (à lancer sur une base peuplée, ex. create_demo_data)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--allow",
+            action="append",
+            default=[],
+            metavar="TABLE",
+            help="Table dont le parcours séquentiel est accepté (répétable).",
+        )
+        parser.add_argument("--verbose-plans", action="store_true", help="Afficher chaque plan.")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in query_plans.SUPPORTED_VENDORS:
+            raise CommandError(f"Base non prise en charge: {connection.vendor}")
+
+        voiture = Voiture.objects.select_related("vendeur").order_by("id").first()
+        if voiture is None:
+            raise CommandError("Aucune voiture en base : peuplez-la d'abord (manage.py create_demo_data).")
+        user = voiture.vendeur or User.objects.order_by("id").first()
+
+        results = query_plans.check(
+            query_plans.hot_queries(user, voiture), allowed=set(options["allow"])
+        )
+        for result in results:
+            if result.ok:
+                self.stdout.write(f"OK    {result.name}")
+            else:
+                tables = ", ".join(result.sequential_scans)
+                self.stdout.write(self.style.ERROR(f"SCAN  {result.name} ({tables})"))
+            if options["verbose_plans"] or not result.ok:
+                for line in result.plan.splitlines():
+                    self.stdout.write(f"      {line}")
+
+        failed = [result.name for result in results if not result.ok]
+        if failed:
+            raise CommandError(f"{len(failed)} requête(s) avec parcours séquentiel: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} plans vérifiés, aucun parcours séquentiel."))
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from django.core.management.base import BaseCommand
 
-from voitures.services.transactions import expire_stale_purchase_requests, get_reservation_ttl_hours
+from voitures.services.transactions import expire_stale_purchase_requests
 
 
 class Command(BaseCommand):
@@ -13,13 +13,13 @@ class Command(BaseCommand):
             "--ttl-hours",
             type=int,
             default=None,
-            help="Override RESERVATION_TTL_HOURS (en heures).",
+            help="Ignore expires_at et annule les demandes plus anciennes que ce délai (en heures).",
         )
 
     def handle(self, *args, **options):
         ttl_hours = options.get("ttl_hours")
-        if ttl_hours is None:
-            ttl_hours = get_reservation_ttl_hours()
-
         count = expire_stale_purchase_requests(ttl_hours=ttl_hours)
-        self.stdout.write(self.style.SUCCESS(f"Expirées: {count} (ttl={ttl_hours}h)"))
+        if ttl_hours is None:
+            self.stdout.write(self.style.SUCCESS(f"Expirées: {count} (échéance expires_at)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Expirées: {count} (ttl={ttl_hours}h)"))
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import os
+from datetime import date
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from voitures.services import receipt_export
+from voitures.services.receipt_store import ROLES
+
+
+def _date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Date invalide (AAAA-MM-JJ attendu): {value}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporte les reçus des ventes confirmées/terminées d'une période : archive ZIP "
+        "(un PDF par vente) ou PDF multi-pages, rendus en parallèle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", required=True, help="Premier jour (AAAA-MM-JJ).")
+        parser.add_argument("--to", dest="end", required=True, help="Dernier jour inclus (AAAA-MM-JJ).")
+        parser.add_argument("--format", dest="fmt", choices=receipt_export.FORMATS, default="zip")
+        parser.add_argument("--role", choices=ROLES, default="vendeur", help="Exemplaire du reçu.")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processus de rendu (1 = dans le processus courant).",
+        )
+        parser.add_argument("--output", "-o", help="Fichier de sortie (défaut: recus_<from>_<to>.<format>).")
+
+    def handle(self, *args, **options):
+        start, end = _date(options["start"]), _date(options["end"])
+        if end < start:
+            raise CommandError("--to doit être postérieur ou égal à --from.")
+
+        fmt = options["fmt"]
+        output = Path(options["output"] or receipt_export.export_filename(start, end, fmt))
+        with output.open("wb") as sink:
+            count = receipt_export.export(
+                sink, start, end, fmt=fmt, role=options["role"], workers=max(1, options["workers"])
+            )
+        self.stdout.write(self.style.SUCCESS(f"{count} reçu(s) exporté(s) dans {output}"))
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from voitures.models import Marque
+from voitures.services import brand_svg
+
+
+class Command(BaseCommand):
+    help = (
+        "Pré-génère le logo SVG de repli de chaque marque dans les fichiers statiques générés "
+        "(<GENERATED_STATIC_DIR>/brand-logos/<empreinte>.svg), servis ensuite par whitenoise "
+        "sans passer par Django."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Dossier de sortie (défaut: <GENERATED_STATIC_DIR>/brand-logos).",
+        )
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Supprimer les SVG qui ne correspondent plus à aucune marque.",
+        )
+
+    def handle(self, *args, **options):
+        output = Path(options["output"] or Path(settings.GENERATED_STATIC_DIR) / brand_svg.STATIC_DIR)
+        output.mkdir(parents=True, exist_ok=True)
+
+        written = 0
+        wanted: set[str] = set()
+        for nom in Marque.objects.order_by("id").values_list("nom", flat=True).iterator():
+            svg = brand_svg.fallback_svg(nom)
+            path = output / f"{svg.digest}.svg"
+            wanted.add(path.name)
+            if path.exists():
+                continue
+            path.write_bytes(svg.content)
+            written += 1
+
+        pruned = 0
+        if options["prune"]:
+            for path in output.glob("*.svg"):
+                if path.name not in wanted:
+                    path.unlink()
+                    pruned += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"SVG de repli: {written} écrit(s), {len(wanted) - written} déjà présent(s), "
+                f"{pruned} supprimé(s) dans {output}. Lancez collectstatic pour les publier."
+            )
+        )
@@ -1,12 +1,19 @@
 from __future__ import annotations
 
+import os
 import unicodedata
+from functools import lru_cache
 from pathlib import Path
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db.models import Q
+from PIL import Image, ImageDraw, ImageFont
 
 from voitures.models import Voiture
+from voitures.services import parallel, photo_batch
+
+DEFAULT_IMAGE = "voitures/default.jpg"
 
 
 def _normalize_key(value: str) -> str:
@@ -16,6 +23,53 @@ def _normalize_key(value: str) -> str:
     return "".join(ch for ch in value if ch.isalnum() or ch in {"-", "_"})
 
 
+@lru_cache(maxsize=None)
+def _load_font(size: int):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size=size)
+    except Exception:
+        return ImageFont.load_default()
+
+
+def _render(task: tuple[int, str, str, str, str]) -> tuple[int, str]:
+    """Dessine et écrit l'image d'une annonce (exécuté dans un processus de rendu)."""
+    voiture_id, dest_path, relative, title, meta = task
+
+    width, height = 1200, 675
+    image = Image.new("RGB", (width, height), color=(245, 247, 250))
+    draw = ImageDraw.Draw(image)
+
+    # Card background
+    draw.rounded_rectangle(
+        (60, 60, width - 60, height - 60),
+        radius=28,
+        outline=(220, 225, 235),
+        width=6,
+        fill=(255, 255, 255),
+    )
+
+    # Accent band
+    draw.rounded_rectangle(
+        (60, 60, width - 60, 190),
+        radius=28,
+        fill=(30, 55, 120),
+    )
+
+    # Title/subtitle
+    draw.text((110, 90), "AutoMarket", fill=(230, 238, 255), font=_load_font(36))
+    draw.text((110, 230), title, fill=(30, 45, 70), font=_load_font(62))
+    draw.text((110, 320), meta, fill=(90, 105, 125), font=_load_font(32))
+
+    # Simple car-like line
+    line_color = (80, 125, 255)
+    draw.line((250, 470, 430, 390, 770, 390, 950, 470), fill=line_color, width=14)
+    draw.ellipse((320, 470, 440, 590), outline=line_color, width=14)
+    draw.ellipse((760, 470, 880, 590), outline=line_color, width=14)
+
+    image.save(dest_path, format="JPEG", quality=88, optimize=True)
+    return voiture_id, relative
+
+
 class Command(BaseCommand):
     help = "Génère des images de démo pour les annonces (utile en hébergement sans stockage persistant)."
 
@@ -31,99 +85,78 @@ class Command(BaseCommand):
             default=0,
             help="Limite le nombre d'images générées (0 = aucune limite).",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processus de rendu (1 = dans le processus courant).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=photo_batch.BATCH_SIZE,
+            help="Voitures mises à jour par requête, et entre deux points de reprise.",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Reprend après la dernière voiture enregistrée par un lancement interrompu.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=None,
+            help="Fichier de reprise (défaut: <MEDIA_ROOT>/.checkpoints/generate_demo_images.json).",
+        )
 
     def handle(self, *args, **options):
         overwrite: bool = options["overwrite"]
         limit: int = options["limit"] or 0
 
-        try:
-            from PIL import Image, ImageDraw, ImageFont
-        except Exception as exc:  # pragma: no cover
-            raise SystemExit(
-                "Pillow est requis pour générer des images (pip install -r requirements.txt)."
-            ) from exc
-
         media_root = Path(settings.MEDIA_ROOT)
         dest_dir = media_root / "voitures"
         dest_dir.mkdir(parents=True, exist_ok=True)
 
-        def _load_font(size: int):
-            try:
-                return ImageFont.truetype("DejaVuSans.ttf", size=size)
-            except Exception:
-                return ImageFont.load_default()
-
-        title_font = _load_font(62)
-        subtitle_font = _load_font(36)
-        meta_font = _load_font(32)
-
+        checkpoint = photo_batch.Checkpoint(
+            options["checkpoint"] or photo_batch.default_checkpoint("generate_demo_images")
+        )
         qs = Voiture.objects.select_related("modele__marque").order_by("id")
+        skipped = 0
+        if not overwrite:
+            missing = qs.filter(Q(image_principale="") | Q(image_principale=DEFAULT_IMAGE))
+            skipped = qs.count() - missing.count()
+            qs = missing
+        resume_after = checkpoint.load() if options["resume"] else None
+        if resume_after is not None:
+            qs = qs.filter(id__gt=resume_after)
+            self.stdout.write(f"Reprise après la voiture #{resume_after}")
         if limit > 0:
             qs = qs[:limit]
+        total = qs.count()
+
+        def tasks():
+            for v in qs.iterator(chunk_size=photo_batch.BATCH_SIZE):
+                marque = v.modele.marque.nom
+                modele = v.modele.nom
+
+                year = getattr(v, "annee", "") or ""
+                km = getattr(v, "kilometrage", "") or ""
+                price = getattr(v, "prix_format", None)
+                price_text = v.prix_format() if callable(price) else ""
+                meta = f"{year}  •  {km} km"
+                if price_text:
+                    meta = f"{meta}  •  {price_text}"
+
+                filename = f"demo_{_normalize_key(marque)}_{_normalize_key(modele)}_{v.id}.jpg"
+                yield (v.id, str(dest_dir / filename), f"voitures/{filename}", f"{marque} {modele}", meta)
+
+        updater = photo_batch.PhotoUpdater(
+            total=total, checkpoint=checkpoint, batch_size=options["batch_size"], progress=self._progress
+        )
+        for voiture_id, relative in parallel.ordered_map(_render, tasks(), max(1, options["workers"])):
+            updater.add(voiture_id, relative)
+        updater.close()
 
-        generated = 0
-        skipped = 0
-
-        for v in qs:
-            current = getattr(v.image_principale, "name", "") or ""
-            is_missing = not current or current == "voitures/default.jpg"
-            if not overwrite and not is_missing:
-                skipped += 1
-                continue
-
-            marque = v.modele.marque.nom
-            modele = v.modele.nom
-            title = f"{marque} {modele}"
-
-            year = getattr(v, "annee", "") or ""
-            km = getattr(v, "kilometrage", "") or ""
-            price = getattr(v, "prix_format", None)
-            price_text = v.prix_format() if callable(price) else ""
-
-            filename = f"demo_{_normalize_key(marque)}_{_normalize_key(modele)}_{v.id}.jpg"
-            relative = f"voitures/{filename}"
-            dest_path = dest_dir / filename
-
-            width, height = 1200, 675
-            image = Image.new("RGB", (width, height), color=(245, 247, 250))
-            draw = ImageDraw.Draw(image)
-
-            # Card background
-            draw.rounded_rectangle(
-                (60, 60, width - 60, height - 60),
-                radius=28,
-                outline=(220, 225, 235),
-                width=6,
-                fill=(255, 255, 255),
-            )
-
-            # Accent band
-            draw.rounded_rectangle(
-                (60, 60, width - 60, 190),
-                radius=28,
-                fill=(30, 55, 120),
-            )
-
-            # Title/subtitle
-            draw.text((110, 90), "AutoMarket", fill=(230, 238, 255), font=subtitle_font)
-            draw.text((110, 230), title, fill=(30, 45, 70), font=title_font)
-
-            meta = f"{year}  •  {km} km"
-            if price_text:
-                meta = f"{meta}  •  {price_text}"
-            draw.text((110, 320), meta, fill=(90, 105, 125), font=meta_font)
-
-            # Simple car-like line
-            line_color = (80, 125, 255)
-            draw.line((250, 470, 430, 390, 770, 390, 950, 470), fill=line_color, width=14)
-            draw.ellipse((320, 470, 440, 590), outline=line_color, width=14)
-            draw.ellipse((760, 470, 880, 590), outline=line_color, width=14)
-
-            image.save(dest_path, format="JPEG", quality=88, optimize=True)
-
-            v.image_principale.name = relative
-            v.save(update_fields=["image_principale"])
-            generated += 1
-
-        self.stdout.write(self.style.SUCCESS(f"Images générées: {generated}, ignorées: {skipped}"))
+        self.stdout.write(self.style.SUCCESS(f"Images générées: {updater.done}, ignorées: {skipped}"))
 
+    def _progress(self, done: int, total: int, rate: float) -> None:
+        self.stdout.write(f"{done}/{total} image(s) ({rate:.1f}/s)")
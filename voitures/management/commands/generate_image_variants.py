@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from voitures.models import ImageVoiture, Voiture
+from voitures.services import image_variants
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère les déclinaisons responsives (320/640/1280 px, WebP et JPEG) des photos "
+        "d'annonces déjà en ligne. Sans --force, seules les déclinaisons manquantes sont écrites."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Régénérer même les déclinaisons existantes.")
+
+    def handle(self, *args, **options):
+        names = set(Voiture.objects.exclude(image_principale="").values_list("image_principale", flat=True))
+        names.update(ImageVoiture.objects.exclude(image="").values_list("image", flat=True))
+
+        written = failed = 0
+        for name in sorted(names):
+            try:
+                written += image_variants.generate(name, force=options["force"])
+            except (OSError, ValueError) as exc:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f"SKIP {name}: {exc}"))
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Photos: {len(names)}, déclinaisons écrites: {written}, illisibles: {failed}")
+        )
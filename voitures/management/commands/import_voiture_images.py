@@ -12,6 +12,7 @@ from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
 
 from voitures.models import Marque, Modele, Voiture
+from voitures.services import parallel, photo_batch
 
 
 def _normalize_key(value: str) -> str:
@@ -28,6 +29,13 @@ class ImageFile:
     ext: str
 
 
+def _copy(task: tuple[int, str, str, str]) -> tuple[int, str]:
+    """Copie une photo vers le dossier média (exécuté dans un processus de copie)."""
+    voiture_id, source, dest_path, relative = task
+    shutil.copy2(source, dest_path)
+    return voiture_id, relative
+
+
 class Command(BaseCommand):
     help = "Importe des images de véhicules et les associe aux annonces existantes selon le nom du fichier."
 
@@ -53,6 +61,28 @@ class Command(BaseCommand):
             action="store_true",
             help="Crée une annonce de démo si aucune voiture ne correspond à l'image (ex: 'TESLA.jpg').",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processus de copie (1 = dans le processus courant).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=photo_batch.BATCH_SIZE,
+            help="Voitures mises à jour par requête, et entre deux points de reprise.",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Reprend après la dernière voiture enregistrée par un lancement interrompu.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=None,
+            help="Fichier de reprise (défaut: <MEDIA_ROOT>/.checkpoints/import_voiture_images.json).",
+        )
 
     def handle(self, *args, **options):
         source_dir = Path(options["source_dir"]).expanduser().resolve()
@@ -110,9 +140,14 @@ class Command(BaseCommand):
             # Consider default image as "missing"
             return bool(v.image_principale) and v.image_principale.name not in {"", "voitures/default.jpg"}
 
+        checkpoint = photo_batch.Checkpoint(
+            options["checkpoint"] or photo_batch.default_checkpoint("import_voiture_images")
+        )
         linked = 0
         skipped = 0
         unmatched = []
+        # voiture_id -> (fichier source, destination, nom dans le stockage)
+        planned: dict[int, tuple[str, str, str]] = {}
 
         default_model_by_marque = {
             "citroen": "C3",
@@ -195,11 +230,9 @@ class Command(BaseCommand):
                     f"SET  voiture#{v.id} ({v.modele.marque.nom} {v.modele.nom}) <- {img.source.name}  =>  {relative}"
                 )
 
-                if not dry_run:
-                    shutil.copy2(img.source, dest_path)
-                    v.image_principale.name = relative
-                    v.save(update_fields=["image_principale"])
-
+                # Une voiture visée par plusieurs fichiers garde le dernier (comme avant, copie par copie).
+                v.image_principale.name = relative
+                planned[v.id] = (str(img.source), str(dest_path), relative)
                 linked += 1
 
         if unmatched:
@@ -207,8 +240,27 @@ class Command(BaseCommand):
             for name in unmatched:
                 self.stdout.write(self.style.WARNING(f" - {name}"))
 
+        if not dry_run:
+            resume_after = checkpoint.load() if options["resume"] else None
+            if resume_after is not None:
+                self.stdout.write(f"Reprise après la voiture #{resume_after}")
+            tasks = [
+                (voiture_id, *planned[voiture_id])
+                for voiture_id in sorted(planned)
+                if resume_after is None or voiture_id > resume_after
+            ]
+            updater = photo_batch.PhotoUpdater(
+                total=len(tasks), checkpoint=checkpoint, batch_size=options["batch_size"], progress=self._progress
+            )
+            for voiture_id, relative in parallel.ordered_map(_copy, tasks, max(1, options["workers"])):
+                updater.add(voiture_id, relative)
+            updater.close()
+
         self.stdout.write(
             self.style.SUCCESS(
                 f"Terminé. Liés: {linked}, ignorés: {skipped}, non associés: {len(unmatched)}"
             )
         )
+
+    def _progress(self, done: int, total: int, rate: float) -> None:
+        self.stdout.write(f"{done}/{total} photo(s) copiée(s) ({rate:.1f}/s)")
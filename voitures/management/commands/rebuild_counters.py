@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from voitures.services import counters
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs d'annonces des marques et modèles et corrige les écarts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Compter les lignes divergentes sans les corriger.",
+        )
+
+    def handle(self, *args, **options):
+        fixed = counters.rebuild(dry_run=options["dry_run"])
+        verb = "à corriger" if options["dry_run"] else "corrigés"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compteurs {verb}: {fixed['marques']} marque(s), {fixed['modeles']} modèle(s)"
+            )
+        )
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from voitures.models import Voiture
+from voitures.services import search
+
+
+class Command(BaseCommand):
+    help = "Recalcule les documents de recherche des voitures et reconstruit l'index plein texte."
+
+    def handle(self, *args, **options):
+        search.install_search_backend(connection)
+        updated = search.refresh_documents(Voiture.objects.all())
+        search.rebuild_fts(connection)
+        self.stdout.write(self.style.SUCCESS(f"Documents de recherche mis à jour: {updated}"))
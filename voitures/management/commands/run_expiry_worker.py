@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from voitures.services.expiry import get_sweep_interval_seconds, run_expiry_sweep
+
+
+class Command(BaseCommand):
+    help = (
+        "Processus longue durée qui expire les demandes d'achat et réservations "
+        "(remplace le cron horaire expire_purchase_requests)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=None,
+            help="Secondes entre deux passages (défaut: EXPIRY_SWEEP_INTERVAL_SECONDS).",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Effectue un seul passage puis s'arrête.",
+        )
+
+    def handle(self, *args, **options):
+        interval = options.get("interval") or get_sweep_interval_seconds()
+        once: bool = options["once"]
+
+        self.stdout.write(f"Worker d'expiration démarré (intervalle={interval}s)")
+        try:
+            while True:
+                close_old_connections()
+                result = run_expiry_sweep()
+                if result.total or once:
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            "Expirées: "
+                            f"achats={result.purchase_requests}, "
+                            f"réservations en attente={result.pending_reservations}, "
+                            f"réservations terminées={result.finished_reservations}"
+                        )
+                    )
+                if once:
+                    return
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write("Arrêt du worker d'expiration.")
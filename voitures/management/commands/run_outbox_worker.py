@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from voitures.services.outbox import drain
+
+
+class Command(BaseCommand):
+    help = "Processus longue durée qui livre les notifications de la file d'envoi (outbox)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="Secondes d'attente quand la file est vide (défaut: OUTBOX_POLL_SECONDS).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Nombre maximum de notifications par lot (défaut: OUTBOX_BATCH_SIZE).",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Vide la file une fois puis s'arrête.",
+        )
+
+    def handle(self, *args, **options):
+        interval = options.get("interval") or float(getattr(settings, "OUTBOX_POLL_SECONDS", 2))
+        batch_size = options.get("batch_size")
+        once: bool = options["once"]
+
+        self.stdout.write(f"Worker outbox démarré (intervalle={interval}s)")
+        try:
+            while True:
+                close_old_connections()
+                result = drain(batch_size=batch_size)
+                if result.processed:
+                    self.stdout.write(
+                        f"Livrées: {result.delivered}, à réessayer: {result.retried}, "
+                        f"en échec: {result.failed}"
+                    )
+                    # Lot non vide : on enchaîne sans attendre.
+                    continue
+                if once:
+                    self.stdout.write(self.style.SUCCESS("File d'envoi vide."))
+                    return
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write("Arrêt du worker outbox.")
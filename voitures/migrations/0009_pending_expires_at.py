@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def _ttl_hours() -> int:
+    # Copie figée de transactions.get_reservation_ttl_hours (une migration n'importe pas les services).
+    try:
+        return max(int(getattr(settings, "RESERVATION_TTL_HOURS", 24) or 24), 1)
+    except (TypeError, ValueError):
+        return 24
+
+
+def backfill_expires_at(apps, schema_editor):
+    Transaction = apps.get_model("voitures", "Transaction")
+    Reservation = apps.get_model("voitures", "Reservation")
+    ttl = timedelta(hours=_ttl_hours())
+
+    # Un UPDATE par table, calculé par la base.
+    Transaction.objects.filter(statut="en_attente", expires_at__isnull=True).update(
+        expires_at=F("date_transaction") + ttl
+    )
+    Reservation.objects.filter(statut="en_attente", expires_at__isnull=True).update(
+        expires_at=F("date_creation") + ttl
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("voitures", "0005_alter_modele_annee_lancement_reservation"),
+        ("voitures", "0008_transaction_date_confirmation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="reservation",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["statut", "expires_at"], name="trx_statut_expires_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(fields=["statut", "expires_at"], name="res_statut_expires_idx"),
+        ),
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+    ]
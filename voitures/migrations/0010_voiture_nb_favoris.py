@@ -0,0 +1,25 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_nb_favoris(apps, schema_editor):
+    Voiture = apps.get_model("voitures", "Voiture")
+    Favori = apps.get_model("voitures", "Favori")
+    counts = Favori.objects.values("voiture_id").annotate(n=Count("id")).order_by()
+    for row in counts.iterator():
+        Voiture.objects.filter(id=row["voiture_id"]).update(nb_favoris=row["n"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("voitures", "0009_pending_expires_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="voiture",
+            name="nb_favoris",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_nb_favoris, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+import unicodedata
+
+from django.db import migrations, models
+
+# Copies figées de voitures.services.search à la date de cette migration :
+# une migration ne doit pas dépendre du code applicatif courant.
+FTS_TABLE = "voitures_voiture_fts"
+PG_INDEX = "voiture_search_gin"
+TABLE = "voitures_voiture"
+
+
+def _fold_text(value):
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    value = "".join(ch if ch.isalnum() else " " for ch in value.lower())
+    return " ".join(value.split())
+
+
+def _document(voiture):
+    modele = voiture.modele
+    parts = (
+        modele.marque.nom,
+        modele.nom,
+        voiture.get_couleur_display(),
+        modele.get_type_carburant_display(),
+        modele.get_transmission_display(),
+        voiture.description,
+    )
+    return _fold_text(" ".join(p for p in parts if p))
+
+
+def backfill_search_document(apps, schema_editor):
+    Voiture = apps.get_model("voitures", "Voiture")
+    batch = []
+    for voiture in Voiture.objects.select_related("modele__marque").iterator(chunk_size=500):
+        voiture.search_document = _document(voiture)
+        batch.append(voiture)
+        if len(batch) >= 500:
+            Voiture.objects.bulk_update(batch, ["search_document"])
+            batch = []
+    if batch:
+        Voiture.objects.bulk_update(batch, ["search_document"])
+
+
+def install_backend(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON {TABLE} "
+            "USING GIN (to_tsvector('simple', search_document))"
+        )
+        return
+    if connection.vendor != "sqlite":
+        return
+
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"search_document, content='{TABLE}', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document); END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) "
+        "VALUES ('delete', old.id, old.search_document); END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_document ON {TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) "
+        "VALUES ('delete', old.id, old.search_document); "
+        f"INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document); END",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+    try:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+    except Exception:
+        # SQLite compilé sans FTS5 : la recherche retombe sur search_document LIKE.
+        pass
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("voitures", "0010_voiture_nb_favoris"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="voiture",
+            name="search_document",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.RunPython(backfill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(install_backend, migrations.RunPython.noop),
+    ]
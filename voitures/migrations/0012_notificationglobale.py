@@ -0,0 +1,69 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("voitures", "0011_voiture_search_document"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationGlobale",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("new_listing", "Nouvelle annonce"),
+                            ("purchase_request", "Demande d'achat"),
+                            ("sale_confirmed", "Vente confirmée"),
+                            ("message", "Message"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                ("titre", models.CharField(max_length=200)),
+                ("contenu", models.TextField(blank=True)),
+                ("url", models.CharField(blank=True, max_length=300)),
+                ("date_creation", models.DateTimeField(auto_now_add=True, db_index=True)),
+                (
+                    "auteur",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="notifications_diffusees",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Notification globale",
+                "verbose_name_plural": "Notifications globales",
+                "ordering": ["-date_creation"],
+            },
+        ),
+        migrations.CreateModel(
+            name="NotificationGlobaleLecture",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("derniere_lue_id", models.PositiveBigIntegerField(default=0)),
+                (
+                    "utilisateur",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lecture_notifications_globales",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Lecture des notifications globales",
+                "verbose_name_plural": "Lectures des notifications globales",
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("voitures", "0012_notificationglobale"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxNotification",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "audience",
+                    models.CharField(
+                        choices=[("utilisateur", "Utilisateur"), ("staff", "Équipe (staff)")],
+                        default="utilisateur",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("new_listing", "Nouvelle annonce"),
+                            ("purchase_request", "Demande d'achat"),
+                            ("sale_confirmed", "Vente confirmée"),
+                            ("message", "Message"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                ("titre", models.CharField(max_length=200)),
+                ("contenu", models.TextField(blank=True)),
+                ("url", models.CharField(blank=True, max_length=300)),
+                (
+                    "statut",
+                    models.CharField(
+                        choices=[("en_attente", "En attente"), ("livree", "Livrée"), ("echec", "Échec")],
+                        default="en_attente",
+                        max_length=20,
+                    ),
+                ),
+                ("tentatives", models.PositiveSmallIntegerField(default=0)),
+                ("prochain_essai", models.DateTimeField(default=django.utils.timezone.now)),
+                ("derniere_erreur", models.TextField(blank=True)),
+                ("date_creation", models.DateTimeField(auto_now_add=True)),
+                ("date_traitement", models.DateTimeField(blank=True, null=True)),
+                (
+                    "utilisateur",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Notification en file d'envoi",
+                "verbose_name_plural": "Notifications en file d'envoi",
+                "ordering": ["id"],
+                "indexes": [models.Index(fields=["statut", "id"], name="outbox_statut_id_idx")],
+            },
+        ),
+    ]
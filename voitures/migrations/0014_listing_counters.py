@@ -0,0 +1,46 @@
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+COUNTERS = ("nb_voitures", "nb_disponibles", "nb_reservees", "nb_vendues")
+
+
+def _annotate(queryset, voitures):
+    return queryset.annotate(
+        total=Count(voitures),
+        vendues=Count(voitures, filter=Q(**{f"{voitures}__est_vendue": True})),
+        reservees=Count(
+            voitures, filter=Q(**{f"{voitures}__est_vendue": False, f"{voitures}__est_reservee": True})
+        ),
+    )
+
+
+def backfill_counters(apps, schema_editor):
+    Marque = apps.get_model("voitures", "Marque")
+    Modele = apps.get_model("voitures", "Modele")
+    for model, voitures in ((Modele, "voitures"), (Marque, "modeles__voitures")):
+        for row in _annotate(model.objects.all(), voitures).iterator():
+            model.objects.filter(id=row.id).update(
+                nb_voitures=row.total,
+                nb_vendues=row.vendues,
+                nb_reservees=row.reservees,
+                nb_disponibles=row.total - row.vendues - row.reservees,
+            )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("voitures", "0013_outboxnotification"),
+    ]
+
+    operations = [
+        *(
+            migrations.AddField(
+                model_name=model_name,
+                name=name,
+                field=models.PositiveIntegerField(default=0, editable=False),
+            )
+            for model_name in ("marque", "modele")
+            for name in COUNTERS
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
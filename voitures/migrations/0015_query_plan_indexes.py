@@ -0,0 +1,82 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("voitures", "0014_listing_counters"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="voiture",
+            index=models.Index(
+                condition=models.Q(("est_vendue", False)),
+                fields=["-date_ajout", "-id"],
+                name="voiture_dispo_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="voiture",
+            index=models.Index(
+                condition=models.Q(("est_vendue", False)),
+                fields=["prix", "id"],
+                name="voiture_dispo_prix_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="voiture",
+            index=models.Index(fields=["vendeur", "-date_ajout"], name="voiture_vendeur_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["statut", "-date_transaction"], name="trx_statut_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["voiture", "statut"], name="trx_voiture_statut_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["acheteur", "-date_transaction"], name="trx_acheteur_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["vendeur", "-date_transaction"], name="trx_vendeur_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                condition=models.Q(("statut__in", ["en_attente", "acceptee"])),
+                fields=["voiture", "debut", "fin"],
+                name="res_voiture_active_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(fields=["client", "-date_creation"], name="res_client_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(fields=["utilisateur", "-date_creation"], name="notif_user_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("lu", False)), fields=["utilisateur"], name="notif_user_non_lues_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(fields=["destinataire", "-date_envoi"], name="msg_dest_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(fields=["expediteur", "-date_envoi"], name="msg_exp_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                condition=models.Q(("lu", False)), fields=["destinataire"], name="msg_dest_non_lus_idx"
+            ),
+        ),
+    ]
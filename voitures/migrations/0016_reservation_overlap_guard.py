@@ -0,0 +1,93 @@
+from django.db import migrations
+
+# Copies figées de voitures.services.availability à la date de cette migration :
+# une migration ne doit pas dépendre du code applicatif courant.
+TABLE = "voitures_reservation"
+CONSTRAINT_NAME = "reservation_sans_chevauchement"
+TRIGGER_PREFIX = "voitures_reservation_chevauchement"
+OVERLAP_ERROR = "reservation_chevauchement"
+ACTIVE_SQL = "('en_attente', 'acceptee')"
+
+OVERLAPS_SQL = f"""
+    SELECT r.id FROM {TABLE} r
+    WHERE r.statut IN {ACTIVE_SQL} AND EXISTS (
+        SELECT 1 FROM {TABLE} o
+        WHERE o.voiture_id = r.voiture_id
+          AND o.id < r.id
+          AND o.statut IN {ACTIVE_SQL}
+          AND o.debut < r.fin
+          AND o.fin > r.debut
+    )
+    ORDER BY r.id
+"""
+
+
+def _sqlite_trigger_sql(suffix, event, same_row_filter):
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_{suffix}
+        BEFORE {event} ON {TABLE}
+        WHEN NEW.statut IN {ACTIVE_SQL} AND EXISTS (
+            SELECT 1 FROM {TABLE}
+            WHERE voiture_id = NEW.voiture_id
+              AND statut IN {ACTIVE_SQL}
+              AND debut < NEW.fin
+              AND fin > NEW.debut
+              {same_row_filter}
+        )
+        BEGIN
+            SELECT RAISE(ABORT, '{OVERLAP_ERROR}');
+        END
+    """
+
+
+def install_backend(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in {"postgresql", "sqlite"}:
+        return
+    with connection.cursor() as cursor:
+        # Aucune annulation implicite : les chevauchements existants bloquent la migration
+        # jusqu'à `manage.py cancel_overlapping_reservations` (ou une correction à la main).
+        cursor.execute(OVERLAPS_SQL)
+        overlapping = [row[0] for row in cursor.fetchall()]
+        if overlapping:
+            shown = ", ".join(f"#{reservation_id}" for reservation_id in overlapping[:20])
+            raise RuntimeError(
+                f"{len(overlapping)} réservation(s) active(s) en chevauchent une plus ancienne "
+                f"({shown}). Lancez `python manage.py cancel_overlapping_reservations "
+                "--dry-run` pour les lister, sans --dry-run pour les annuler, puis relancez migrate."
+            )
+
+        if connection.vendor == "postgresql":
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+            cursor.execute(
+                f"""
+                ALTER TABLE {TABLE} ADD CONSTRAINT {CONSTRAINT_NAME}
+                EXCLUDE USING gist (voiture_id WITH =, tstzrange(debut, fin, '[)') WITH &&)
+                WHERE (statut IN {ACTIVE_SQL})
+                """
+            )
+        else:
+            cursor.execute(_sqlite_trigger_sql("bi", "INSERT", ""))
+            cursor.execute(
+                _sqlite_trigger_sql("bu", "UPDATE OF voiture_id, debut, fin, statut", "AND id <> NEW.id")
+            )
+
+
+def uninstall_backend(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"ALTER TABLE {TABLE} DROP CONSTRAINT IF EXISTS {CONSTRAINT_NAME}")
+        elif connection.vendor == "sqlite":
+            cursor.execute(f"DROP TRIGGER IF EXISTS {TRIGGER_PREFIX}_bi")
+            cursor.execute(f"DROP TRIGGER IF EXISTS {TRIGGER_PREFIX}_bu")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("voitures", "0015_query_plan_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(install_backend, uninstall_backend),
+    ]
@@ -1,9 +1,17 @@
-from django.db import models
+from django.db import models, transaction
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
+
+
+def _pending_deadline():
+    """Échéance d'une demande 'en_attente' créée maintenant (RESERVATION_TTL_HOURS)."""
+    from voitures.services.transactions import get_reservation_ttl_hours
+
+    return timezone.now() + timedelta(hours=get_reservation_ttl_hours())
 
 class Marque(models.Model):
     nom = models.CharField(max_length=100, unique=True)
@@ -11,6 +19,12 @@ class Marque(models.Model):
     logo = models.ImageField(upload_to='logos/', blank=True, null=True)
     date_creation = models.DateField()
     description = models.TextField(blank=True)
+    # Compteurs d'annonces dénormalisés : maintenus par les signaux de Voiture
+    # (voitures/services/counters.py), réconciliés par `manage.py rebuild_counters`.
+    nb_voitures = models.PositiveIntegerField(default=0, editable=False)
+    nb_disponibles = models.PositiveIntegerField(default=0, editable=False)
+    nb_reservees = models.PositiveIntegerField(default=0, editable=False)
+    nb_vendues = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['nom']
@@ -24,7 +38,7 @@ class Marque(models.Model):
         return self.modeles.count()
     
     def nombre_voitures(self):
-        return Voiture.objects.filter(modele__marque=self).count()
+        return self.nb_voitures
 
 class Modele(models.Model):
     TYPE_CARBURANT = [
@@ -51,6 +65,11 @@ class Modele(models.Model):
     puissance = models.PositiveIntegerField(help_text="Puissance en chevaux", default=100)
     consommation = models.FloatField(help_text="Consommation en L/100km", default=6.0)
     description = models.TextField(blank=True)
+    # Mêmes compteurs que Marque, au niveau du modèle.
+    nb_voitures = models.PositiveIntegerField(default=0, editable=False)
+    nb_disponibles = models.PositiveIntegerField(default=0, editable=False)
+    nb_reservees = models.PositiveIntegerField(default=0, editable=False)
+    nb_vendues = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['marque', 'nom']
@@ -60,9 +79,25 @@ class Modele(models.Model):
     
     def __str__(self):
         return f"{self.marque.nom} {self.nom}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Changement de marque : les compteurs suivent (voir voitures/signals.py).
+        instance._marque_initiale = instance.__dict__.get('marque_id')
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._marque_initiale = self.__dict__.get('marque_id')
     
     def nombre_voitures(self):
-        return self.voitures.count()
+        return self.nb_voitures
+
+
+# Champs de Voiture qui entrent dans search_document.
+SEARCH_SOURCE_FIELDS = {'modele', 'modele_id', 'couleur', 'description'}
+
 
 class Voiture(models.Model):
     ETAT_CHOICES = [
@@ -110,18 +145,84 @@ class Voiture(models.Model):
         blank=True
     )
     vue = models.PositiveIntegerField(default=0)
+    # Dénormalisé : maintenu par les signaux de Favori (voitures/signals.py).
+    nb_favoris = models.PositiveIntegerField(default=0)
+    # Texte plié (marque, modèle, couleur, carburant, transmission, description) indexé
+    # en plein texte : voir voitures/services/search.py.
+    search_document = models.TextField(blank=True, default='', editable=False)
     
     class Meta:
         ordering = ['-date_ajout']
         verbose_name = 'Voiture'
         verbose_name_plural = 'Voitures'
+        # Index partiels : le catalogue et l'accueil ne lisent que les annonces en vente.
+        # Vérification des plans : `manage.py check_query_plans`.
+        indexes = [
+            models.Index(
+                fields=['-date_ajout', '-id'],
+                condition=models.Q(est_vendue=False),
+                name='voiture_dispo_date_idx',
+            ),
+            models.Index(
+                fields=['prix', 'id'],
+                condition=models.Q(est_vendue=False),
+                name='voiture_dispo_prix_idx',
+            ),
+            models.Index(fields=['vendeur', '-date_ajout'], name='voiture_vendeur_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.modele} - {self.annee} - {self.couleur}"
-    
-    def incrementer_vue(self):
-        self.vue += 1
-        self.save(update_fields=['vue'])
+
+    def _snapshot_compteurs(self):
+        # Instantané pour les compteurs de Marque/Modele (voir voitures/signals.py).
+        if all(name in self.__dict__ for name in ('modele_id', 'est_vendue', 'est_reservee')):
+            self._compteurs_initial = (self.modele_id, self.est_vendue, self.est_reservee)
+
+    def _search_source(self):
+        # Champs propres à l'annonce dont dépend search_document (marque/modèle : voir signals.py).
+        return (self.modele_id, self.couleur, self.description)
+
+    def _snapshot_search(self):
+        if all(name in self.__dict__ for name in ('modele_id', 'couleur', 'description')):
+            self._search_initial = self._search_source()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_compteurs()
+        instance._snapshot_search()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._snapshot_compteurs()
+        self._snapshot_search()
+
+    def _search_document_stale(self, update_fields) -> bool:
+        if update_fields is not None and not SEARCH_SOURCE_FIELDS & set(update_fields):
+            return False
+        initial = getattr(self, '_search_initial', None)
+        return initial is None or initial != self._search_source()
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        # Document recalculé (modèle et marque relus) seulement si ses champs ont changé.
+        if self._search_document_stale(update_fields):
+            from voitures.services.search import build_search_document
+
+            self.search_document = build_search_document(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_document'}
+        # Les compteurs sont mis à jour par post_save : même transaction que l'annonce.
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+        self._snapshot_search()
+    
+    def incrementer_vue(self, n=1):
+        # Incrément atomique en base (pas de perte en cas de requêtes concurrentes).
+        Voiture.objects.filter(pk=self.pk).update(vue=models.F('vue') + n)
+        self.vue += n
     
     def prix_format(self):
         if self.prix is None:
@@ -213,15 +314,28 @@ class Transaction(models.Model):
     date_transaction = models.DateTimeField(auto_now_add=True)
     statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
     date_mise_a_jour = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
     notes = models.TextField(blank=True)
     
     class Meta:
         ordering = ['-date_transaction']
         verbose_name = 'Transaction'
         verbose_name_plural = 'Transactions'
+        indexes = [
+            models.Index(fields=['statut', 'expires_at'], name='trx_statut_expires_idx'),
+            models.Index(fields=['statut', '-date_transaction'], name='trx_statut_date_idx'),
+            models.Index(fields=['voiture', 'statut'], name='trx_voiture_statut_idx'),
+            models.Index(fields=['acheteur', '-date_transaction'], name='trx_acheteur_date_idx'),
+            models.Index(fields=['vendeur', '-date_transaction'], name='trx_vendeur_date_idx'),
+        ]
     
     def __str__(self):
         return f"Transaction #{self.id} - {self.voiture}"
+
+    def save(self, *args, **kwargs):
+        if self.expires_at is None and self.statut == 'en_attente':
+            self.expires_at = _pending_deadline()
+        super().save(*args, **kwargs)
     
     def est_terminee(self):
         return self.statut == 'terminee'
@@ -265,27 +379,40 @@ class Reservation(models.Model):
     note = models.TextField(blank=True)
     signature = models.TextField(blank=True)
     date_creation = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ["-date_creation"]
         verbose_name = "Réservation"
         verbose_name_plural = "Réservations"
+        indexes = [
+            models.Index(fields=["statut", "expires_at"], name="res_statut_expires_idx"),
+            # Chevauchements : seules les réservations actives comptent.
+            models.Index(
+                fields=["voiture", "debut", "fin"],
+                condition=models.Q(statut__in=["en_attente", "acceptee"]),
+                name="res_voiture_active_idx",
+            ),
+            models.Index(fields=["client", "-date_creation"], name="res_client_date_idx"),
+        ]
 
     def __str__(self):
         return f"Reservation #{self.id} - {self.voiture}"
 
+    def save(self, *args, **kwargs):
+        if self.expires_at is None and self.statut == "en_attente":
+            self.expires_at = _pending_deadline()
+        super().save(*args, **kwargs)
+
     @property
     def is_active(self):
         return self.statut in {"en_attente", "acceptee"} and self.fin > timezone.now()
 
     @staticmethod
     def overlaps(voiture_id: int, start: datetime, end: datetime) -> bool:
-        return Reservation.objects.filter(
-            voiture_id=voiture_id,
-            statut__in=["en_attente", "acceptee"],
-            debut__lt=end,
-            fin__gt=start,
-        ).exists()
+        from voitures.services.availability import blocking
+
+        return blocking(voiture_id, start, end).exists()
 
 class Message(models.Model):
     expediteur = models.ForeignKey(User, on_delete=models.CASCADE, related_name='messages_envoyes')
@@ -299,6 +426,13 @@ class Message(models.Model):
         ordering = ['-date_envoi']
         verbose_name = 'Message'
         verbose_name_plural = 'Messages'
+        indexes = [
+            models.Index(fields=['destinataire', '-date_envoi'], name='msg_dest_date_idx'),
+            models.Index(fields=['expediteur', '-date_envoi'], name='msg_exp_date_idx'),
+            models.Index(
+                fields=['destinataire'], condition=models.Q(lu=False), name='msg_dest_non_lus_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.expediteur} -> {self.destinataire}: {self.sujet}"
@@ -328,6 +462,96 @@ class Notification(models.Model):
         ordering = ["-date_creation"]
         verbose_name = "Notification"
         verbose_name_plural = "Notifications"
+        indexes = [
+            models.Index(fields=["utilisateur", "-date_creation"], name="notif_user_date_idx"),
+            models.Index(
+                fields=["utilisateur"], condition=models.Q(lu=False), name="notif_user_non_lues_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.utilisateur.username}: {self.titre}"
+
+
+class OutboxNotification(models.Model):
+    """
+    Notification à envoyer, écrite dans la même transaction que le changement métier
+    puis livrée par `manage.py run_outbox_worker` (voir voitures/services/outbox.py).
+    """
+
+    AUDIENCES = [
+        ("utilisateur", "Utilisateur"),
+        ("staff", "Équipe (staff)"),
+    ]
+    STATUTS = [
+        ("en_attente", "En attente"),
+        ("livree", "Livrée"),
+        ("echec", "Échec"),
+    ]
+
+    audience = models.CharField(max_length=20, choices=AUDIENCES, default="utilisateur")
+    utilisateur = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name="+"
+    )
+    type = models.CharField(max_length=30, choices=Notification.TYPE_CHOICES)
+    titre = models.CharField(max_length=200)
+    contenu = models.TextField(blank=True)
+    url = models.CharField(max_length=300, blank=True)
+    statut = models.CharField(max_length=20, choices=STATUTS, default="en_attente")
+    tentatives = models.PositiveSmallIntegerField(default=0)
+    prochain_essai = models.DateTimeField(default=timezone.now)
+    derniere_erreur = models.TextField(blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_traitement = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name = "Notification en file d'envoi"
+        verbose_name_plural = "Notifications en file d'envoi"
+        indexes = [
+            models.Index(fields=["statut", "id"], name="outbox_statut_id_idx"),
+        ]
+
+    def __str__(self):
+        cible = self.utilisateur.username if self.utilisateur_id else self.audience
+        return f"{cible}: {self.titre} ({self.statut})"
+
+
+class NotificationGlobale(models.Model):
+    """
+    Notification diffusée à tous les utilisateurs, stockée une seule fois.
+    Chaque utilisateur la voit à la lecture de son fil (voir NotificationGlobaleLecture).
+    """
+
+    type = models.CharField(max_length=30, choices=Notification.TYPE_CHOICES)
+    titre = models.CharField(max_length=200)
+    contenu = models.TextField(blank=True)
+    url = models.CharField(max_length=300, blank=True)
+    auteur = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="notifications_diffusees"
+    )
+    date_creation = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["-date_creation"]
+        verbose_name = "Notification globale"
+        verbose_name_plural = "Notifications globales"
+
+    def __str__(self):
+        return self.titre
+
+
+class NotificationGlobaleLecture(models.Model):
+    """Filigrane par utilisateur : id de la dernière notification globale lue."""
+
+    utilisateur = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name="lecture_notifications_globales"
+    )
+    derniere_lue_id = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Lecture des notifications globales"
+        verbose_name_plural = "Lectures des notifications globales"
+
+    def __str__(self):
+        return f"{self.utilisateur.username}: {self.derniere_lue_id}"
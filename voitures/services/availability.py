@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import hashlib
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Exists, OuterRef, QuerySet
+from django.utils import timezone
+
+from voitures.models import Reservation, Voiture
+from voitures.services import caching
+
+ACTIVE_STATUSES = ("en_attente", "acceptee")
+
+CONSTRAINT_NAME = "reservation_sans_chevauchement"
+TRIGGER_PREFIX = "voitures_reservation_chevauchement"
+# Message du trigger SQLite (IntegrityError), équivalent de la contrainte d'exclusion.
+OVERLAP_ERROR = "reservation_chevauchement"
+
+_ACTIVE_SQL = "('en_attente', 'acceptee')"
+TABLE = Reservation._meta.db_table
+
+# Calendrier JSON : horodatage du dernier changement de réservation par voiture.
+CHANGE_KEY = "disponibilites:modif:{}"
+DEFAULT_CALENDAR_DAYS = 30
+MAX_CALENDAR_DAYS = 92
+
+
+@dataclass(frozen=True)
+class Creneau:
+    debut: datetime
+    fin: datetime
+
+    @property
+    def duree(self) -> timedelta:
+        return self.fin - self.debut
+
+
+def blocking(voiture_id: int, debut: datetime, fin: datetime, *, now: datetime | None = None) -> QuerySet:
+    """
+    Réservations qui occupent [debut, fin) : actives, hors demandes en attente échues
+    (pas encore balayées par le worker). Servi par l'index partiel res_voiture_active_idx.
+    """
+    now = now or timezone.now()
+    return Reservation.objects.filter(
+        voiture_id=voiture_id,
+        statut__in=ACTIVE_STATUSES,
+        debut__lt=fin,
+        fin__gt=debut,
+    ).exclude(statut="en_attente", expires_at__lte=now)
+
+
+def free_slots(
+    voiture_id: int,
+    window: tuple[datetime, datetime],
+    *,
+    min_duration: timedelta = timedelta(0),
+) -> list[Creneau]:
+    """Créneaux libres de la voiture dans `window` (début, fin), d'au moins `min_duration`."""
+    start, end = window
+    if start >= end:
+        return []
+
+    busy = blocking(voiture_id, start, end).order_by("debut").values_list("debut", "fin")
+    slots = []
+    cursor = start
+    for debut, fin in busy:
+        if debut > cursor:
+            slots.append(Creneau(cursor, min(debut, end)))
+        cursor = max(cursor, fin)
+        if cursor >= end:
+            break
+    if cursor < end:
+        slots.append(Creneau(cursor, end))
+    return [slot for slot in slots if slot.duree >= min_duration and slot.duree > timedelta(0)]
+
+
+def release_expired_overlaps(voiture_id: int, debut: datetime, fin: datetime) -> int:
+    """
+    Libère les réservations échues qui chevauchent [debut, fin) : la contrainte ne
+    connaît pas l'heure, une demande expirée non encore balayée bloque toujours.
+    Seules celles-ci sont touchées (chacune bloque le créneau demandé) ; les autres
+    réservations échues de la voiture attendent le worker d'expiration.
+    """
+    now = timezone.now()
+    overlapping = Reservation.objects.filter(
+        voiture_id=voiture_id, statut__in=ACTIVE_STATUSES, debut__lt=fin, fin__gt=debut
+    )
+    released = overlapping.filter(statut="en_attente", expires_at__lte=now).update(statut="annulee")
+    released += overlapping.filter(fin__lte=now).update(statut="terminee")
+    if released:
+        touch([voiture_id])
+    return released
+
+
+def last_change(voiture_id: int) -> float:
+    """Horodatage du dernier changement de réservation de la voiture (Last-Modified)."""
+    key = CHANGE_KEY.format(voiture_id)
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, time.time(), None)
+        stamp = cache.get(key) or time.time()
+    return stamp
+
+
+def touch(voiture_ids: Iterable[int]) -> None:
+    """Invalide le calendrier des voitures, une fois la transaction validée."""
+    keys = {CHANGE_KEY.format(voiture_id) for voiture_id in voiture_ids if voiture_id}
+    if keys:
+        db_transaction.on_commit(lambda: cache.set_many(dict.fromkeys(keys, time.time()), None))
+
+
+def calendar_range(debut: str | None, fin: str | None) -> tuple[date, date]:
+    """Plage en jours entiers (fin exclue) ; par défaut les 30 prochains jours, 92 au plus."""
+    today = timezone.localdate()
+    try:
+        start = date.fromisoformat(debut) if debut else today
+    except ValueError:
+        start = today
+    try:
+        end = date.fromisoformat(fin) if fin else start + timedelta(days=DEFAULT_CALENDAR_DAYS)
+    except ValueError:
+        end = start + timedelta(days=DEFAULT_CALENDAR_DAYS)
+    end = min(max(end, start + timedelta(days=1)), start + timedelta(days=MAX_CALENDAR_DAYS))
+    return start, end
+
+
+def calendar_etag(voiture_id: int, start: date, end: date) -> str:
+    raw = f"{voiture_id}:{start.isoformat()}:{end.isoformat()}:{last_change(voiture_id)!r}"
+    return hashlib.sha1(raw.encode("ascii")).hexdigest()[:20]
+
+
+def _aware(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, dtime.min))
+
+
+def calendar(voiture_id: int, start: date, end: date) -> dict | None:
+    """
+    Intervalles occupés de la voiture sur [start, end), en JSON compact. Mis en cache
+    sous l'horodatage du dernier changement : une réservation modifiée l'invalide.
+    Retourne None si la voiture n'existe pas ou est vendue.
+    """
+
+    def compute():
+        if not Voiture.objects.filter(id=voiture_id, est_vendue=False).exists():
+            return None
+        busy = (
+            blocking(voiture_id, _aware(start), _aware(end))
+            .order_by("debut")
+            .values_list("debut", "fin")
+        )
+        return {
+            "voiture": voiture_id,
+            "debut": start.isoformat(),
+            "fin": end.isoformat(),
+            "occupe": [[debut.isoformat(), fin.isoformat()] for debut, fin in busy],
+        }
+
+    key = caching.make_key("disponibilites", [voiture_id, start, end, last_change(voiture_id)])
+    timeout = int(getattr(settings, "AVAILABILITY_CACHE_SECONDS", 300) or 0)
+    if timeout <= 0:
+        return compute()
+    return caching.get_or_set(key, compute, timeout=timeout)
+
+
+def overlapping_reservations() -> QuerySet:
+    """
+    Réservations actives qui chevauchent une réservation active plus ancienne de la même
+    voiture : données antérieures à la garde, qui en empêchent l'installation.
+    """
+    earlier = Reservation.objects.filter(
+        voiture_id=OuterRef("voiture_id"),
+        id__lt=OuterRef("id"),
+        statut__in=ACTIVE_STATUSES,
+        debut__lt=OuterRef("fin"),
+        fin__gt=OuterRef("debut"),
+    )
+    return Reservation.objects.filter(statut__in=ACTIVE_STATUSES).filter(Exists(earlier))
+
+
+def _sqlite_trigger_sql(suffix: str, event: str, same_row_filter: str) -> str:
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_{suffix}
+        BEFORE {event} ON {TABLE}
+        WHEN NEW.statut IN {_ACTIVE_SQL} AND EXISTS (
+            SELECT 1 FROM {TABLE}
+            WHERE voiture_id = NEW.voiture_id
+              AND statut IN {_ACTIVE_SQL}
+              AND debut < NEW.fin
+              AND fin > NEW.debut
+              {same_row_filter}
+        )
+        BEGIN
+            SELECT RAISE(ABORT, '{OVERLAP_ERROR}');
+        END
+    """
+
+
+def install_availability_backend(connection) -> bool:
+    """
+    Interdit en base deux réservations actives qui se chevauchent sur une voiture.
+
+    - PostgreSQL : contrainte d'exclusion GiST sur (voiture_id =, tstzrange(debut, fin) &&),
+      limitée aux statuts actifs (extension btree_gist) ;
+    - SQLite : triggers BEFORE INSERT/UPDATE qui interrogent l'index partiel
+      (voiture_id, debut, fin) des réservations actives.
+
+    Idempotent ; réinstallé après chaque migrate (une reconstruction de table SQLite
+    supprime les triggers). Ne modifie aucune donnée : tant que des réservations se
+    chevauchent (overlapping_reservations), rien n'est installé et False est retourné.
+    """
+    vendor = connection.vendor
+    if vendor not in {"postgresql", "sqlite"}:
+        return True
+    with connection.cursor() as cursor:
+        if TABLE not in connection.introspection.table_names(cursor):
+            return True
+        if vendor == "postgresql":
+            cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = %s", [CONSTRAINT_NAME])
+            if cursor.fetchone():
+                return True
+        if overlapping_reservations().using(connection.alias).exists():
+            return False
+        if vendor == "postgresql":
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+            cursor.execute(
+                f"""
+                ALTER TABLE {TABLE} ADD CONSTRAINT {CONSTRAINT_NAME}
+                EXCLUDE USING gist (voiture_id WITH =, tstzrange(debut, fin, '[)') WITH &&)
+                WHERE (statut IN {_ACTIVE_SQL})
+                """
+            )
+        else:
+            cursor.execute(_sqlite_trigger_sql("bi", "INSERT", ""))
+            cursor.execute(
+                _sqlite_trigger_sql(
+                    "bu", "UPDATE OF voiture_id, debut, fin, statut", "AND id <> NEW.id"
+                )
+            )
+    return True
+
+
+def uninstall_availability_backend(connection) -> None:
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"ALTER TABLE {TABLE} DROP CONSTRAINT IF EXISTS {CONSTRAINT_NAME}"
+            )
+        elif connection.vendor == "sqlite":
+            cursor.execute(f"DROP TRIGGER IF EXISTS {TRIGGER_PREFIX}_bi")
+            cursor.execute(f"DROP TRIGGER IF EXISTS {TRIGGER_PREFIX}_bu")
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import hashlib
+import html
+from dataclasses import dataclass
+from functools import lru_cache
+
+# À incrémenter quand le gabarit change : nouvelles empreintes, donc nouvelles URLs.
+SVG_VERSION = 1
+STATIC_DIR = "brand-logos"
+
+
+@dataclass(frozen=True)
+class FallbackSvg:
+    content: bytes
+    digest: str
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+
+def _brand_initials(name: str) -> str:
+    cleaned = " ".join((name or "").strip().split())
+    if not cleaned:
+        return "?"
+    parts = [p for p in cleaned.replace("-", " ").split(" ") if p]
+    if len(parts) == 1:
+        return parts[0][:2].upper()
+    return (parts[0][:1] + parts[1][:1]).upper()
+
+
+def _brand_colors(key: str) -> tuple[str, str]:
+    digest = hashlib.sha256((key or "").encode("utf-8")).hexdigest()
+    # Couleurs cohérentes par marque (mais sans liste hardcodée).
+    hue = int(digest[:6], 16) % 360
+    hue2 = (hue + 24) % 360
+    return (f"hsl({hue} 82% 50%)", f"hsl({hue2} 86% 58%)")
+
+
+def display_name(nom: str) -> str:
+    return (nom or "").strip() or "Marque"
+
+
+def digest(nom: str) -> str:
+    """Empreinte du SVG d'une marque : il ne dépend que de son nom (et du gabarit)."""
+    raw = f"{SVG_VERSION}:{display_name(nom)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def static_path(digest: str) -> str:
+    """Chemin (relatif aux fichiers statiques) du SVG pré-généré par generate_brand_svgs."""
+    return f"{STATIC_DIR}/{digest}.svg"
+
+
+def _body(name: str, gradient_id: str) -> str:
+    initials = _brand_initials(name)
+    c1, c2 = _brand_colors(name)
+    return f"""  <defs>
+    <linearGradient id="{gradient_id}" x1="0" y1="0" x2="1" y2="1">
+      <stop offset="0" stop-color="{c1}"/>
+      <stop offset="1" stop-color="{c2}"/>
+    </linearGradient>
+  </defs>
+  <rect x="0.5" y="0.5" width="159" height="79" rx="16" fill="url(#{gradient_id})" stroke="rgba(15,23,42,0.10)"/>
+  <text x="80" y="48" text-anchor="middle" font-family="Inter,system-ui,-apple-system,'Segoe UI',Roboto,Arial,sans-serif"
+        font-size="30" font-weight="700" fill="rgba(255,255,255,0.96)" letter-spacing="0.5">{html.escape(initials)}</text>
+"""
+
+
+@lru_cache(maxsize=1024)
+def fallback_svg(nom: str) -> FallbackSvg:
+    """Logo de repli (initiales sur dégradé) d'une marque, généré une fois par nom et par processus."""
+    name = display_name(nom)
+    svg = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<svg xmlns="http://www.w3.org/2000/svg" width="160" height="80" viewBox="0 0 160 80" '
+        f'role="img" aria-label="{html.escape(name)}">\n'
+        f"{_body(name, 'g')}"
+        "</svg>\n"
+    )
+    return FallbackSvg(content=svg.encode("utf-8"), digest=digest(nom))
+
+
+def symbol(nom: str, symbol_id: str) -> str:
+    """Le même logo en <symbol> (planche SVG), avec un identifiant de dégradé propre au symbole."""
+    name = display_name(nom)
+    return (
+        f'<symbol id="{symbol_id}" viewBox="0 0 160 80" aria-label="{html.escape(name)}">\n'
+        f"{_body(name, f'{symbol_id}-g')}"
+        "</symbol>\n"
+    )
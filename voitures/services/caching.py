@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import threading
+from collections import Counter
+from typing import Any, Callable, Iterable
+
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db.models import Model, QuerySet
+
+# Modèles dont la version invalide les entrées qui en dépendent (voir voitures/signals.py).
+VERSIONED_MODELS = ("voitures.marque", "voitures.modele", "voitures.voiture", "voitures.avis")
+
+_MISSING = object()
+_stats_lock = threading.Lock()
+_stats: Counter[str] = Counter()
+
+
+def local_cache():
+    """Tier local : mémoire du processus, très rapide, non partagé."""
+    return caches["local"]
+
+
+def shared_cache():
+    """Tier partagé entre processus (Redis ou fichiers, voir CACHES)."""
+    return caches["default"]
+
+
+def hot_cache():
+    """
+    Tier des clés écrites à chaque requête (anti-doublon des vues) : le partagé s'il tient
+    en mémoire (Redis), le local sinon — FileBasedCache parcourt tout son dossier à chaque
+    écriture dès que MAX_ENTRIES est dépassé.
+    """
+    shared = shared_cache()
+    return local_cache() if isinstance(shared, FileBasedCache) else shared
+
+
+def _label(model: type[Model] | str) -> str:
+    return model if isinstance(model, str) else model._meta.label_lower
+
+
+def _version_key(model: type[Model] | str) -> str:
+    return f"version:{_label(model)}"
+
+
+def model_version(model: type[Model] | str) -> int:
+    key = _version_key(model)
+    version = shared_cache().get(key)
+    if version is None:
+        shared_cache().add(key, 1, None)
+        version = shared_cache().get(key) or 1
+    return version
+
+
+def bump(model: type[Model] | str) -> None:
+    """Incrémente la version du modèle : toutes les clés qui en dépendent deviennent inatteignables."""
+    key = _version_key(model)
+    try:
+        shared_cache().incr(key)
+    except ValueError:
+        shared_cache().set(key, 2, None)
+
+
+def _record(event: str) -> None:
+    with _stats_lock:
+        _stats[event] += 1
+
+
+def stats() -> dict[str, Any]:
+    """Compteurs du processus courant : hits local/partagé, misses et taux de hit."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    hits = snapshot.get("local_hit", 0) + snapshot.get("shared_hit", 0)
+    total = hits + snapshot.get("miss", 0)
+    snapshot["hit_ratio"] = round(hits / total, 4) if total else None
+    snapshot["versions"] = {label: model_version(label) for label in VERSIONED_MODELS}
+    return snapshot
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+def make_key(prefix: str, parts: Iterable[Any] = (), models: Iterable[type[Model] | str] = ()) -> str:
+    versions = ".".join(f"{_label(m)}={model_version(m)}" for m in models)
+    digest = hashlib.sha1(repr((tuple(parts), versions)).encode("utf-8")).hexdigest()
+    return f"c:{prefix}:{digest}"
+
+
+def get_or_set(key: str, compute: Callable[[], Any], *, timeout: int = 300, local_timeout: int = 30) -> Any:
+    value = local_cache().get(key, _MISSING)
+    if value is not _MISSING:
+        _record("local_hit")
+        return value
+
+    value = shared_cache().get(key, _MISSING)
+    if value is not _MISSING:
+        _record("shared_hit")
+        local_cache().set(key, value, min(local_timeout, timeout))
+        return value
+
+    _record("miss")
+    value = compute()
+    if isinstance(value, QuerySet):
+        # Jamais de QuerySet paresseux en cache : on stocke le résultat évalué.
+        value = list(value)
+    shared_cache().set(key, value, timeout)
+    local_cache().set(key, value, min(local_timeout, timeout))
+    return value
+
+
+def cached(
+    prefix: str,
+    *,
+    models: Iterable[type[Model] | str] = (),
+    timeout: int = 300,
+    local_timeout: int = 30,
+    key: Callable[..., Any] | None = None,
+):
+    """
+    Met en cache le résultat d'une fonction (queryset évalué, fragment HTML, dict...).
+
+    La clé combine `prefix`, les arguments (ou `key(*args, **kwargs)` s'ils ne sont pas
+    stables via repr) et la version de chaque modèle de `models`.
+
+        @cached("marques:toutes", models=[Marque])
+        def marques_triees():
+            return Marque.objects.order_by("nom")
+    """
+    models = tuple(models)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            parts = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            cache_key = make_key(prefix, (parts,), models)
+            return get_or_set(
+                cache_key, lambda: func(*args, **kwargs), timeout=timeout, local_timeout=local_timeout
+            )
+
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
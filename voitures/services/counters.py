@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from django.db import transaction as db_transaction
+from django.db.models import Count, F, Q, QuerySet
+from django.db.models.functions import Greatest
+
+from voitures.models import Marque, Modele, Voiture
+from voitures.services import caching, homepage
+
+# Colonne de compteur par statut d'annonce (nb_voitures compte toutes les annonces).
+STATUT_FIELDS = {
+    "disponible": "nb_disponibles",
+    "reservee": "nb_reservees",
+    "vendue": "nb_vendues",
+}
+COUNTER_FIELDS = ("nb_voitures", *STATUT_FIELDS.values())
+# Champs de Voiture dont dépendent les compteurs (instantané pris au chargement).
+TRACKED_FIELDS = ("modele_id", "est_vendue", "est_reservee")
+
+
+def statut(est_vendue: bool, est_reservee: bool) -> str:
+    if est_vendue:
+        return "vendue"
+    if est_reservee:
+        return "reservee"
+    return "disponible"
+
+
+def etat(modele_id: int, est_vendue: bool, est_reservee: bool) -> tuple[int, str]:
+    """Ce qui compte pour les compteurs : (modele_id, statut)."""
+    return modele_id, statut(est_vendue, est_reservee)
+
+
+def _shift(field: str, n: int):
+    # Colonnes positives (CHECK >= 0 sous PostgreSQL) : un compteur qui a dérivé jusqu'à 0
+    # reste à 0 au lieu de faire échouer l'écriture de l'utilisateur ; rebuild_counters corrige.
+    return F(field) + n if n > 0 else Greatest(F(field) + n, 0)
+
+
+def _apply(deltas: dict[int, Counter]) -> None:
+    """Applique des deltas {modele_id: Counter(champ=delta)} aux modèles et à leurs marques."""
+    deltas = {modele_id: d for modele_id, d in deltas.items() if any(d.values())}
+    if not deltas:
+        return
+    marque_ids = dict(Modele.objects.filter(id__in=deltas).values_list("id", "marque_id"))
+    par_marque: dict[int, Counter] = defaultdict(Counter)
+    for modele_id, delta in deltas.items():
+        changes = {field: _shift(field, n) for field, n in delta.items() if n}
+        Modele.objects.filter(id=modele_id).update(**changes)
+        if modele_id in marque_ids:
+            par_marque[marque_ids[modele_id]].update(delta)
+    for marque_id, delta in par_marque.items():
+        changes = {field: _shift(field, n) for field, n in delta.items() if n}
+        if changes:
+            Marque.objects.filter(id=marque_id).update(**changes)
+
+
+def _delta(deltas: dict[int, Counter], state: tuple[int, str] | None, sign: int) -> None:
+    if state is None:
+        return
+    modele_id, current = state
+    deltas[modele_id]["nb_voitures"] += sign
+    deltas[modele_id][STATUT_FIELDS[current]] += sign
+
+
+def record_change(before: tuple[int, str] | None, after: tuple[int, str] | None) -> None:
+    """
+    Création (before=None), changement de statut/modèle ou suppression (after=None).
+    À appeler dans la transaction de l'écriture : les compteurs suivent son sort.
+    """
+    if before == after:
+        return
+    deltas: dict[int, Counter] = defaultdict(Counter)
+    _delta(deltas, before, -1)
+    _delta(deltas, after, +1)
+    _apply(deltas)
+
+
+def move_modele(modele_id: int, old_marque_id: int, new_marque_id: int) -> None:
+    """Un modèle change de marque : ses compteurs passent de l'ancienne à la nouvelle."""
+    modele = Modele.objects.filter(id=modele_id).values(*COUNTER_FIELDS).first()
+    if modele is None or old_marque_id == new_marque_id:
+        return
+    Marque.objects.filter(id=old_marque_id).update(**{f: _shift(f, -modele[f]) for f in COUNTER_FIELDS})
+    Marque.objects.filter(id=new_marque_id).update(**{f: F(f) + modele[f] for f in COUNTER_FIELDS})
+
+
+def _statut_changed() -> None:
+    # Un update de queryset ne passe pas par post_save : caches des annonces (facettes,
+    # listes) et accueil invalidés ici, après le commit.
+    def run():
+        caching.bump(Voiture)
+        homepage.invalidate()
+
+    db_transaction.on_commit(run)
+
+
+def mark_reserved(voiture_id: int) -> bool:
+    """
+    Verrouille la voiture (SELECT ... FOR UPDATE, jusqu'à la fin de la transaction), la
+    passe à « réservée » et ajuste les compteurs si elle ne l'était pas. Le verrou est
+    pris même si elle l'était déjà : les vérifications qui suivent dans la transaction
+    de l'appelant sont sérialisées avec les annulations et les demandes d'achat.
+    Retourne False si la voiture n'existe pas ou est vendue.
+    """
+    with db_transaction.atomic():
+        row = (
+            Voiture.objects.select_for_update()
+            .filter(id=voiture_id, est_vendue=False)
+            .values_list("modele_id", "est_reservee")
+            .first()
+        )
+        if row is None:
+            return False
+        modele_id, est_reservee = row
+        if not est_reservee:
+            Voiture.objects.filter(id=voiture_id).update(est_reservee=True)
+            _apply({modele_id: Counter(nb_disponibles=-1, nb_reservees=1)})
+            _statut_changed()
+        return True
+
+
+def unreserve(queryset: QuerySet) -> int:
+    """
+    `queryset.update(est_reservee=False)` en maintenant les compteurs (un update de
+    queryset ne déclenche pas les signaux). Les voitures candidates sont verrouillées
+    avant que `queryset` soit évalué : une réservation ou une demande d'achat en cours
+    de création sur l'une d'elles est validée (et donc vue par ses filtres) d'abord.
+    """
+    with db_transaction.atomic():
+        candidates = queryset.filter(est_reservee=True).values("id")
+        locked = list(
+            Voiture.objects.select_for_update().filter(id__in=candidates).values_list("id", flat=True)
+        )
+        if not locked:
+            return 0
+        rows = list(
+            queryset.filter(id__in=locked, est_reservee=True).values_list("id", "modele_id", "est_vendue")
+        )
+        if not rows:
+            return 0
+        updated = Voiture.objects.filter(id__in=[r[0] for r in rows]).update(est_reservee=False)
+        deltas: dict[int, Counter] = defaultdict(Counter)
+        for _id, modele_id, est_vendue in rows:
+            if not est_vendue:
+                deltas[modele_id]["nb_reservees"] -= 1
+                deltas[modele_id]["nb_disponibles"] += 1
+        _apply(deltas)
+        _statut_changed()
+    return updated
+
+
+def _expected(model, prefix: str) -> QuerySet:
+    voitures = f"{prefix}voitures"
+    return model.objects.annotate(
+        attendu_total=Count(voitures),
+        attendu_vendues=Count(voitures, filter=Q(**{f"{voitures}__est_vendue": True})),
+        attendu_reservees=Count(
+            voitures,
+            filter=Q(**{f"{voitures}__est_vendue": False, f"{voitures}__est_reservee": True}),
+        ),
+    )
+
+
+def _values(obj) -> dict[str, int]:
+    return {
+        "nb_voitures": obj.attendu_total,
+        "nb_vendues": obj.attendu_vendues,
+        "nb_reservees": obj.attendu_reservees,
+        "nb_disponibles": obj.attendu_total - obj.attendu_vendues - obj.attendu_reservees,
+    }
+
+
+def _diverges(obj) -> bool:
+    return any(getattr(obj, field) != value for field, value in _values(obj).items())
+
+
+def rebuild(*, dry_run: bool = False) -> dict[str, int]:
+    """
+    Recalcule les compteurs depuis les annonces et corrige les lignes divergentes.
+    Chaque ligne est verrouillée puis recomptée avant correction (les écritures
+    concurrentes ne sont pas perdues). Retourne le nombre de marques/modèles corrigés.
+    """
+    fixed = {"marques": 0, "modeles": 0}
+    for model, prefix, label in ((Modele, "", "modeles"), (Marque, "modeles__", "marques")):
+        suspects = [obj.id for obj in _expected(model, prefix).order_by("id") if _diverges(obj)]
+        for obj_id in suspects:
+            with db_transaction.atomic():
+                list(model.objects.select_for_update().filter(id=obj_id).values_list("id", flat=True))
+                obj = _expected(model, prefix).filter(id=obj_id).first()
+                if obj is None or not _diverges(obj):
+                    continue
+                fixed[label] += 1
+                if not dry_run:
+                    model.objects.filter(id=obj_id).update(**_values(obj))
+    return fixed
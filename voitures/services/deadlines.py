@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from django.db import connections
+from django.db import transaction as db_transaction
+from django.db.models import QuerySet
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def expire_due(queryset: QuerySet, *, new_status: str, batch_size: int = DEFAULT_BATCH_SIZE) -> tuple[int, set[int]]:
+    """
+    Passe au statut `new_status` les lignes échues de `queryset` par lots.
+
+    PostgreSQL et SQLite >= 3.35 : un seul `UPDATE ... RETURNING voiture_id` par lot,
+    sans tri pour rester sur l'index (statut, expires_at). Les conditions de `queryset`
+    sont réappliquées à chaque ligne modifiée : une ligne qui a changé de statut
+    entre-temps n'est ni modifiée ni comptée. Ailleurs, le lot est lu sous verrou
+    (SELECT ... FOR UPDATE) puis mis à jour dans la même transaction.
+
+    Retourne le nombre de lignes modifiées et les voitures de ces lignes seulement.
+    Le queryset doit filtrer sur le statut source pour que chaque lot avance (les
+    lignes modifiées n'y correspondent plus).
+    """
+    connection = connections[queryset.db]
+    queryset = queryset.order_by()
+    if connection.features.can_return_columns_from_insert and len(queryset.query.alias_map) == 1:
+        return _expire_returning(queryset, connection, new_status, batch_size)
+    return _expire_locked(queryset, new_status, batch_size)
+
+
+def _expire_returning(queryset: QuerySet, connection, new_status: str, batch_size: int) -> tuple[int, set[int]]:
+    qn = connection.ops.quote_name
+    query = queryset.query
+    where_sql, where_params = query.get_compiler(connection=connection).compile(query.where)
+    batch = queryset.values_list("id", flat=True)[:batch_size].query
+    ids_sql, ids_params = batch.get_compiler(connection=connection).as_sql()
+    sql = (
+        f"UPDATE {qn(queryset.model._meta.db_table)} SET {qn('statut')} = %s "
+        f"WHERE {qn('id')} IN ({ids_sql}) AND ({where_sql}) RETURNING {qn('voiture_id')}"
+    )
+    params = [new_status, *ids_params, *where_params]
+
+    updated = 0
+    car_ids: set[int] = set()
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        updated += len(rows)
+        car_ids.update(voiture_id for (voiture_id,) in rows)
+        if len(rows) < batch_size:
+            break
+    return updated, car_ids
+
+
+def _expire_locked(queryset: QuerySet, new_status: str, batch_size: int) -> tuple[int, set[int]]:
+    updated = 0
+    car_ids: set[int] = set()
+    while True:
+        with db_transaction.atomic(using=queryset.db):
+            rows = list(queryset.select_for_update().values_list("id", "voiture_id")[:batch_size])
+            if not rows:
+                break
+            updated += queryset.filter(id__in=[row_id for row_id, _ in rows]).update(statut=new_status)
+        car_ids.update(voiture_id for _, voiture_id in rows)
+        if len(rows) < batch_size:
+            break
+    return updated, car_ids
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from voitures.services import reservations, transactions
+
+
+@dataclass(frozen=True)
+class SweepResult:
+    purchase_requests: int
+    pending_reservations: int
+    finished_reservations: int
+
+    @property
+    def total(self) -> int:
+        return self.purchase_requests + self.pending_reservations + self.finished_reservations
+
+
+_lock = threading.Lock()
+_last_sweep_at: float | None = None
+
+
+def get_sweep_interval_seconds() -> int:
+    val = getattr(settings, "EXPIRY_SWEEP_INTERVAL_SECONDS", 60)
+    try:
+        return max(int(val), 1)
+    except (TypeError, ValueError):
+        return 60
+
+
+def run_expiry_sweep() -> SweepResult:
+    """
+    Exécute toutes les expirations (demandes d'achat, réservations en attente,
+    réservations terminées) et mémorise l'heure du passage pour ce processus.
+    """
+    global _last_sweep_at
+
+    result = SweepResult(
+        purchase_requests=transactions.expire_stale_purchase_requests(),
+        pending_reservations=reservations.expire_stale_pending(),
+        finished_reservations=reservations.expire_finished_reservations(),
+    )
+    with _lock:
+        _last_sweep_at = time.monotonic()
+    return result
+
+
+def sweep_if_due(*, interval: int | None = None) -> SweepResult | None:
+    """
+    Lance un passage d'expiration si le dernier date de plus de `interval` secondes
+    dans ce processus. Retourne None si le passage n'était pas dû.
+    """
+    global _last_sweep_at
+
+    interval = interval if interval is not None else get_sweep_interval_seconds()
+    now = time.monotonic()
+    with _lock:
+        if _last_sweep_at is not None and now - _last_sweep_at < interval:
+            return None
+        # On réserve le créneau avant de relâcher le verrou pour éviter
+        # que plusieurs threads du même worker lancent le passage en parallèle.
+        _last_sweep_at = now
+    return run_expiry_sweep()
+
+
+def reset_sweep_guard() -> None:
+    global _last_sweep_at
+    with _lock:
+        _last_sweep_at = None
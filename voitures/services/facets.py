@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import hashlib
+from collections import Counter
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Mapping
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db.models import Count, Max, Min, QuerySet, Sum
+
+from voitures.models import Marque, Modele, Voiture
+from voitures.services import caching, search
+
+# Paramètres GET qui modifient l'ensemble filtré (tri et page exclus).
+FILTER_PARAMS = (
+    "q",
+    "marque",
+    "carburant",
+    "transmission",
+    "etat",
+    "couleur",
+    "prix_min",
+    "prix_max",
+    "annee_min",
+    "annee_max",
+    "statut",
+)
+YEAR_BUCKET = 5
+
+CARBURANT_LABELS = dict(Modele.TYPE_CARBURANT)
+TRANSMISSION_LABELS = dict(Modele.TRANSMISSION)
+ETAT_LABELS = dict(Voiture.ETAT_CHOICES)
+COULEUR_LABELS = dict(Voiture.COULEUR_CHOICES)
+
+
+@dataclass(frozen=True)
+class FacetBucket:
+    value: str | int
+    label: str
+    count: int
+    end: int | None = None
+
+
+@dataclass
+class Facets:
+    total: int = 0
+    prix_min: Decimal | None = None
+    prix_moyen: Decimal | None = None
+    prix_max: Decimal | None = None
+    marques: list[FacetBucket] = field(default_factory=list)
+    carburants: list[FacetBucket] = field(default_factory=list)
+    transmissions: list[FacetBucket] = field(default_factory=list)
+    etats: list[FacetBucket] = field(default_factory=list)
+    couleurs: list[FacetBucket] = field(default_factory=list)
+    annees: list[FacetBucket] = field(default_factory=list)
+
+    def marque_counts(self) -> dict[int, int]:
+        return {int(bucket.value): bucket.count for bucket in self.marques}
+
+
+def _int(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(frozen=True)
+class Selection:
+    """
+    Filtres portant sur une facette. Ils ne sont pas appliqués au queryset passé à
+    `compute_facets` : chaque facette est comptée avec les filtres des autres
+    seulement (facettes disjonctives), pour que les autres valeurs gardent le nombre
+    de résultats qu'elles donneraient si on les choisissait à la place.
+    """
+
+    marque: int | None = None
+    carburant: str | None = None
+    transmission: str | None = None
+    etat: str | None = None
+    couleur: str | None = None
+    annee_min: int | None = None
+    annee_max: int | None = None
+
+    @classmethod
+    def from_params(cls, params: Mapping[str, str]) -> "Selection":
+        """Sélection lue dans les paramètres GET ; une valeur inconnue est ignorée."""
+
+        def choice(name: str, labels: Mapping) -> str | None:
+            value = params.get(name) or None
+            return value if value in labels else None
+
+        return cls(
+            marque=_int(params.get("marque")),
+            carburant=choice("carburant", CARBURANT_LABELS),
+            transmission=choice("transmission", TRANSMISSION_LABELS),
+            etat=choice("etat", ETAT_LABELS),
+            couleur=choice("couleur", COULEUR_LABELS),
+            annee_min=_int(params.get("annee_min")),
+            annee_max=_int(params.get("annee_max")),
+        )
+
+    def apply(self, queryset: QuerySet) -> QuerySet:
+        if self.marque is not None:
+            queryset = queryset.filter(modele__marque_id=self.marque)
+        if self.carburant:
+            queryset = queryset.filter(modele__type_carburant=self.carburant)
+        if self.transmission:
+            queryset = queryset.filter(modele__transmission=self.transmission)
+        if self.etat:
+            queryset = queryset.filter(etat=self.etat)
+        if self.couleur:
+            queryset = queryset.filter(couleur=self.couleur)
+        if self.annee_min is not None:
+            queryset = queryset.filter(annee__gte=self.annee_min)
+        if self.annee_max is not None:
+            queryset = queryset.filter(annee__lte=self.annee_max)
+        return queryset
+
+    def matches(self, row: Mapping) -> dict[str, bool]:
+        """Pour une ligne groupée : la ligne passe-t-elle le filtre de chaque facette ?"""
+        annee = row["annee"]
+        return {
+            "marques": self.marque is None or row["modele__marque_id"] == self.marque,
+            "carburants": self.carburant is None or row["modele__type_carburant"] == self.carburant,
+            "transmissions": self.transmission is None or row["modele__transmission"] == self.transmission,
+            "etats": self.etat is None or row["etat"] == self.etat,
+            "couleurs": self.couleur is None or row["couleur"] == self.couleur,
+            "annees": (self.annee_min is None or (annee is not None and annee >= self.annee_min))
+            and (self.annee_max is None or (annee is not None and annee <= self.annee_max)),
+        }
+
+
+def filter_key(params: Mapping[str, str]) -> str:
+    """Clé de cache stable pour une combinaison de filtres (ordre et casse de `q` ignorés)."""
+    normalized: list[tuple[str, str]] = []
+    for name in FILTER_PARAMS:
+        value = (params.get(name) or "").strip()
+        if name == "q":
+            value = " ".join(search.search_terms(value))
+        if value:
+            normalized.append((name, value))
+    digest = hashlib.sha1(urlencode(normalized).encode("utf-8")).hexdigest()
+    return f"facettes:{digest}"
+
+
+def _buckets(counter: Counter, labels: Mapping) -> list[FacetBucket]:
+    buckets = [
+        FacetBucket(value=value, label=labels.get(value, str(value)), count=count)
+        for value, count in counter.items()
+        if value is not None and count
+    ]
+    buckets.sort(key=lambda b: (-b.count, b.label))
+    return buckets
+
+
+def compute_facets(queryset: QuerySet, selection: Selection = Selection()) -> Facets:
+    """
+    Une seule requête groupée sur (marque, carburant, transmission, état, couleur,
+    année) avec COUNT/MIN/MAX/SUM du prix, sur `queryset` sans les filtres de
+    `selection` ; chaque facette est ensuite obtenue en sommant en Python les groupes
+    qui passent les filtres des autres facettes. Total et prix ne comptent que les
+    groupes qui passent tous les filtres.
+    """
+    rows = (
+        queryset.order_by()
+        .values(
+            "modele__marque_id",
+            "modele__marque__nom",
+            "modele__type_carburant",
+            "modele__transmission",
+            "etat",
+            "couleur",
+            "annee",
+        )
+        .annotate(n=Count("id"), prix_min=Min("prix"), prix_max=Max("prix"), prix_somme=Sum("prix"))
+    )
+
+    facets = Facets()
+    counters: dict[str, Counter] = {
+        name: Counter() for name in ("marques", "carburants", "transmissions", "etats", "couleurs", "annees")
+    }
+    marque_noms: dict[int, str] = {}
+    prix_somme = Decimal("0")
+
+    for row in rows:
+        n = row["n"]
+        marque_noms[row["modele__marque_id"]] = row["modele__marque__nom"]
+        matches = selection.matches(row)
+        failed = [name for name, ok in matches.items() if not ok]
+        if len(failed) > 1:
+            continue
+        values = {
+            "marques": row["modele__marque_id"],
+            "carburants": row["modele__type_carburant"],
+            "transmissions": row["modele__transmission"],
+            "etats": row["etat"],
+            "couleurs": row["couleur"],
+            "annees": None if row["annee"] is None else row["annee"] // YEAR_BUCKET * YEAR_BUCKET,
+        }
+        if failed:
+            # Exclue par une seule facette : ne compte que pour celle-ci.
+            counters[failed[0]][values[failed[0]]] += n
+            continue
+
+        for name, value in values.items():
+            counters[name][value] += n
+        facets.total += n
+        prix_somme += row["prix_somme"] or 0
+        if facets.prix_min is None or row["prix_min"] < facets.prix_min:
+            facets.prix_min = row["prix_min"]
+        if facets.prix_max is None or row["prix_max"] > facets.prix_max:
+            facets.prix_max = row["prix_max"]
+
+    if facets.total:
+        facets.prix_moyen = prix_somme / facets.total
+
+    facets.marques = _buckets(counters["marques"], marque_noms)
+    facets.carburants = _buckets(counters["carburants"], CARBURANT_LABELS)
+    facets.transmissions = _buckets(counters["transmissions"], TRANSMISSION_LABELS)
+    facets.etats = _buckets(counters["etats"], ETAT_LABELS)
+    facets.couleurs = _buckets(counters["couleurs"], COULEUR_LABELS)
+    facets.annees = [
+        FacetBucket(
+            value=start,
+            label=f"{start}–{start + YEAR_BUCKET - 1}",
+            count=count,
+            end=start + YEAR_BUCKET - 1,
+        )
+        for start, count in sorted(counters["annees"].items(), reverse=True)
+        if start is not None and count
+    ]
+    return facets
+
+
+def get_facets(queryset: QuerySet, params: Mapping[str, str], selection: Selection = Selection()) -> Facets:
+    """
+    Facettes de `queryset` (filtré hors facettes) pour `selection`, en cache sous la clé
+    des filtres `params` et les versions de Voiture/Marque/Modele (toute modification
+    d'annonce les invalide).
+    """
+    timeout = int(getattr(settings, "FACETS_CACHE_SECONDS", 60) or 0)
+    if timeout <= 0:
+        return compute_facets(queryset, selection)
+
+    key = caching.make_key("facettes", [filter_key(params)], models=(Voiture, Marque, Modele))
+    return caching.get_or_set(key, lambda: compute_facets(queryset, selection), timeout=timeout)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from voitures.models import Marque, Voiture
+
+SNAPSHOT_KEY = "accueil:snapshot"
+LOCK_KEY = "accueil:snapshot:lock"
+# Incrémentée (incr, atomique) à chaque changement ; l'instantané retient celle qu'il a lue.
+GENERATION_KEY = "accueil:snapshot:generation"
+LOCK_SECONDS = 30
+# Sans instantané, intervalle entre deux lectures du cache en attendant le détenteur du verrou.
+WAIT_INTERVAL = 0.05
+
+
+def _seconds(name: str, default: int) -> int:
+    try:
+        return max(int(getattr(settings, name, default)), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+def build_snapshot() -> dict:
+    """Contexte complet de la page d'accueil, entièrement évalué (listes)."""
+    disponibles = Voiture.objects.filter(est_vendue=False).select_related("modele__marque")
+    recentes = list(disponibles.order_by("-date_ajout")[:12])
+    return {
+        "voitures_recentes": recentes[:6],
+        "voitures_promo": list(disponibles.order_by("prix")[:6]),
+        "marques_populaires": list(Marque.objects.order_by("-nb_voitures", "nom")[:8]),
+        "marques": list(Marque.objects.all().order_by("nom")),
+        "voitures_vedette": recentes,
+        "total_voitures": disponibles.count(),
+    }
+
+
+def _generation() -> int:
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, None)
+        generation = cache.get(GENERATION_KEY) or 1
+    return generation
+
+
+def _store(data: dict, generation: int) -> dict:
+    fresh = _seconds("HOMEPAGE_SNAPSHOT_SECONDS", 300)
+    stale = _seconds("HOMEPAGE_STALE_SECONDS", 600)
+    entry = {"data": data, "fresh_until": time.time() + fresh, "generation": generation}
+    cache.set(SNAPSHOT_KEY, entry, fresh + stale)
+    return entry
+
+
+def rebuild() -> dict:
+    # Génération lue avant la construction : un changement pendant celle-ci la rend périmée.
+    generation = _generation()
+    return _store(build_snapshot(), generation)["data"]
+
+
+def get_snapshot() -> dict:
+    """
+    Contexte de l'accueil depuis le cache.
+
+    Frais : servi tel quel. Périmé (fenêtre HOMEPAGE_STALE_SECONDS, ou construit avant
+    la dernière invalidation) : une seule requête, celle qui obtient le verrou,
+    reconstruit ; les autres continuent de servir l'ancienne version.
+    Absent (cache vidé, déploiement) : le détenteur du verrou le construit, les autres
+    l'attendent (au plus LOCK_SECONDS) au lieu de lancer chacune les mêmes requêtes.
+    """
+    entry = cache.get(SNAPSHOT_KEY)
+    if (
+        entry is not None
+        and entry["fresh_until"] > time.time()
+        and entry.get("generation") == _generation()
+    ):
+        return entry["data"]
+
+    if not cache.add(LOCK_KEY, 1, LOCK_SECONDS):
+        if entry is not None:
+            return entry["data"]
+        return _wait_for_snapshot()
+
+    return _rebuild_locked()
+
+
+def _rebuild_locked() -> dict:
+    try:
+        return rebuild()
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _wait_for_snapshot() -> dict:
+    deadline = time.monotonic() + LOCK_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(SNAPSHOT_KEY)
+        if entry is not None:
+            return entry["data"]
+        if cache.add(LOCK_KEY, 1, LOCK_SECONDS):
+            # Le détenteur a échoué sans rien stocker : on reconstruit à sa place.
+            return _rebuild_locked()
+    # Reconstruction anormalement longue : cette requête ne l'attend pas davantage.
+    return build_snapshot()
+
+
+def invalidate() -> None:
+    """
+    Rend l'instantané périmé sans le supprimer (servi le temps d'une reconstruction).
+    Un simple incr : pas de lecture-modification-écriture qu'une reconstruction
+    concurrente pourrait écraser.
+    """
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 2, None)
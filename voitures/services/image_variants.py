@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import io
+import logging
+import posixpath
+import threading
+from contextlib import contextmanager
+
+from django.core.files.storage import default_storage
+from django.db import transaction as db_transaction
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from voitures.services import media_files
+
+logger = logging.getLogger(__name__)
+
+# Largeurs servies dans les srcset (jamais d'agrandissement au-delà de l'original).
+WIDTHS = (320, 640, 1280)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+VARIANT_DIR = "variants"
+# Dossiers d'upload des photos d'annonces (Voiture.image_principale, ImageVoiture.image).
+SOURCE_PREFIXES = ("voitures/",)
+
+# Un verrou par photo source, le temps de la générer : deux demandes de la même photo
+# n'encodent qu'une fois, celles d'autres photos ne s'attendent pas.
+_locks_guard = threading.Lock()
+_locks: dict[str, list] = {}
+
+
+def is_source(name: str) -> bool:
+    """Chemin de photo d'annonce acceptable (pas de sortie du dossier média)."""
+    if not name or name.startswith("/") or "\\" in name:
+        return False
+    return posixpath.normpath(name) == name and name.startswith(SOURCE_PREFIXES)
+
+
+def variant_name(name: str, width: int, fmt: str) -> str:
+    stem, _ext = posixpath.splitext(name)
+    return f"{VARIANT_DIR}/{width}/{stem}.{fmt}"
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    pil_format, _content_type, options = FORMATS[fmt]
+    out = io.BytesIO()
+    image.save(out, format=pil_format, **options)
+    return out.getvalue()
+
+
+@contextmanager
+def _source_lock(name: str):
+    with _locks_guard:
+        entry = _locks.setdefault(name, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _locks[name]
+
+
+def generate(name: str, *, force: bool = False) -> int:
+    """
+    Déclinaisons de la photo `name` pour chaque largeur et chaque format. Une largeur
+    supérieure à l'original reçoit l'original réencodé (pas d'agrandissement).
+    Retourne le nombre de fichiers écrits.
+    """
+    if not is_source(name):
+        return 0
+    with _source_lock(name):
+        return _generate(name, force)
+
+
+def _generate(name: str, force: bool) -> int:
+    missing = [
+        (width, fmt)
+        for width in WIDTHS
+        for fmt in FORMATS
+        if force or not default_storage.exists(variant_name(name, width, fmt))
+    ]
+    if not missing:
+        return 0
+
+    with default_storage.open(name, "rb") as fh:
+        source = Image.open(io.BytesIO(fh.read()))
+        source.load()
+    source = ImageOps.exif_transpose(source).convert("RGB")
+
+    written = 0
+    for width in sorted({w for w, _fmt in missing}):
+        if width < source.width:
+            height = max(1, round(source.height * width / source.width))
+            resized = source.resize((width, height), Image.Resampling.LANCZOS)
+        else:
+            resized = source
+        for fmt in FORMATS:
+            if (width, fmt) in missing:
+                media_files.overwrite(variant_name(name, width, fmt), _encode(resized, fmt))
+                written += 1
+    return written
+
+
+def ensure(name: str, width: int, fmt: str) -> str | None:
+    """Nom de la déclinaison demandée, générée à la première demande. None si la photo n'existe pas."""
+    variant = variant_name(name, width, fmt)
+    if default_storage.exists(variant):
+        return variant
+    if not default_storage.exists(name):
+        return None
+    # Sous le verrou de la photo : une demande concurrente a peut-être déjà tout généré.
+    generate(name)
+    return variant
+
+
+def invalidate(name: str) -> None:
+    """Photo réécrite sous le même nom : ses déclinaisons seront régénérées à la demande."""
+    if not is_source(name):
+        return
+    for width in WIDTHS:
+        for fmt in FORMATS:
+            variant = variant_name(name, width, fmt)
+            if default_storage.exists(variant):
+                default_storage.delete(variant)
+
+
+def generate_on_commit(name: str) -> None:
+    """Après un upload : déclinaisons générées une fois l'annonce enregistrée."""
+
+    def run():
+        try:
+            generate(name, force=True)
+        except Exception:
+            logger.exception("Déclinaisons de %s impossibles", name)
+
+    if is_source(name):
+        db_transaction.on_commit(run)
+
+
+def srcset(name: str) -> str:
+    """Attribut srcset (le format, WebP ou JPEG, est négocié par la vue selon Accept)."""
+    if not is_source(name):
+        return ""
+    return ", ".join(
+        f"{reverse('image_variant', args=[width, name])} {width}w" for width in WIDTHS
+    )
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Sequence
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Model, Q, QuerySet
+
+from voitures.services import caching
+
+SALT = "voitures.keyset"
+
+
+@dataclass
+class CursorPage:
+    """
+    Page obtenue par « seek » (WHERE clé > dernière clé) au lieu d'un OFFSET :
+    le coût d'une page profonde est celui de la première.
+    """
+
+    object_list: list = field(default_factory=list)
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+    count: int | None = None
+    per_page: int = 0
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.prev_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+
+def _with_tiebreak(ordering: Sequence[str]) -> list[str]:
+    ordering = list(ordering)
+    if not any(name.lstrip("-") in {"id", "pk"} for name in ordering):
+        descending = ordering[0].startswith("-") if ordering else False
+        ordering.append("-id" if descending else "id")
+    return ordering
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _decode_value(queryset: QuerySet, name: str, value: Any) -> Any:
+    try:
+        return queryset.model._meta.get_field(name).to_python(value)
+    except FieldDoesNotExist:
+        # Annotation (ex: search_rank) : valeur JSON native.
+        return value
+
+
+def _row_key(obj: Any, ordering: Sequence[str]) -> list[Any]:
+    return [_encode_value(getattr(obj, name.lstrip("-"))) for name in ordering]
+
+
+def _make_cursor(obj: Any, ordering: Sequence[str], direction: str, salt: str) -> str:
+    payload = {"o": list(ordering), "k": _row_key(obj, ordering), "d": direction}
+    return signing.dumps(payload, salt=salt, compress=True)
+
+
+def _read_cursor(token: str | None, ordering: Sequence[str], salt: str) -> dict | None:
+    if not token:
+        return None
+    try:
+        payload = signing.loads(token, salt=salt)
+    except signing.BadSignature:
+        return None
+    # Un curseur émis pour un autre tri est ignoré (retour à la première page).
+    if not isinstance(payload, dict) or payload.get("o") != list(ordering):
+        return None
+    if payload.get("d") not in {"n", "p"} or len(payload.get("k") or []) != len(ordering):
+        return None
+    return payload
+
+
+def _seek_filter(
+    queryset: QuerySet, ordering: Sequence[str], key: Sequence[Any], *, backwards: bool
+) -> Q:
+    """(a > x) OR (a = x AND b > y) OR ... selon le sens de chaque clé."""
+    condition = Q()
+    equal = Q()
+    for name, raw in zip(ordering, key):
+        field_name = name.lstrip("-")
+        descending = name.startswith("-")
+        if backwards:
+            descending = not descending
+        value = _decode_value(queryset, field_name, raw)
+        lookup = "lt" if descending else "gt"
+        condition |= equal & Q(**{f"{field_name}__{lookup}": value})
+        equal &= Q(**{field_name: value})
+    return condition
+
+
+def _reverse(ordering: Sequence[str]) -> list[str]:
+    return [name[1:] if name.startswith("-") else f"-{name}" for name in ordering]
+
+
+def paginate(
+    queryset: QuerySet,
+    *,
+    ordering: Sequence[str],
+    cursor: str | None = None,
+    per_page: int = 12,
+    count: int | Callable[[], int] | None = None,
+    salt: str = SALT,
+) -> CursorPage:
+    """
+    Pagine `queryset` par curseur sur `ordering` (+ id en départage).
+    Les champs de tri doivent être non nuls ; `count` (entier ou callable) est
+    simplement transmis à la page pour l'affichage du total.
+    """
+    ordering = _with_tiebreak(ordering)
+    try:
+        payload = _read_cursor(cursor, ordering, salt)
+        backwards = bool(payload and payload["d"] == "p")
+        qs = queryset
+        if payload:
+            qs = qs.filter(_seek_filter(queryset, ordering, payload["k"], backwards=backwards))
+    except (ValidationError, TypeError, ValueError):
+        payload, backwards, qs = None, False, queryset
+
+    qs = qs.order_by(*(_reverse(ordering) if backwards else ordering))
+    rows = list(qs[: per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    page = CursorPage(object_list=rows, per_page=per_page)
+    if rows:
+        # En arrière, la page suivante existe toujours (celle d'où l'on vient) ;
+        # en avant, c'est la page précédente qui existe dès qu'un curseur est fourni.
+        has_next = backwards or has_more
+        has_prev = has_more if backwards else payload is not None
+        if has_next:
+            page.next_cursor = _make_cursor(rows[-1], ordering, "n", salt)
+        if has_prev:
+            page.prev_cursor = _make_cursor(rows[0], ordering, "p", salt)
+    page.count = count() if callable(count) else count
+    return page
+
+
+def cached_count(
+    queryset: QuerySet, key: str, *, models: Sequence[type[Model] | str] = (), timeout: int = 60
+) -> int:
+    """
+    COUNT(*) mis en cache `timeout` secondes au plus (total affiché avec la pagination).
+
+    La clé suit la requête SQL et la version (caching.bump) du modèle compté et de
+    `models` : une écriture sur l'un d'eux rend le total en cache inatteignable.
+    """
+    queryset = queryset.order_by()
+    cache_key = caching.make_key(f"count:{key}", (str(queryset.query),), (queryset.model, *models))
+    return caching.get_or_set(cache_key, queryset.count, timeout=timeout)
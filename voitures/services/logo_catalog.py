@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.conf import settings
+
+EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".svg"}
+# Noms de fichiers du catalogue mal orthographiés -> clé de la marque.
+ALIASES = {
+    "bwm": "bmw",
+    "pegeo": "peugeot",
+    "mercedes_benz": "mercedesbenz",
+    "mercedesbenzlogo": "mercedesbenz",
+}
+
+
+@dataclass(frozen=True)
+class LogoFile:
+    path: Path
+    size: int
+    mtime_ns: int
+    etag: str
+
+
+@dataclass(frozen=True)
+class _Index:
+    directory: Path
+    mtime_ns: int
+    entries: dict[str, LogoFile]
+
+
+_index: _Index | None = None
+_lock = threading.Lock()
+
+
+def normalize_key(value: str) -> str:
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    value = value.lower()
+    key = "".join(ch for ch in value if ch.isalnum())
+    return ALIASES.get(key, key)
+
+
+def catalog_dir() -> Path:
+    return Path(getattr(settings, "BRAND_LOGO_CATALOG_DIR", settings.BASE_DIR / "logo"))
+
+
+def _file_etag(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(64 * 1024), b""):
+            digest.update(chunk)
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def _build(directory: Path, mtime_ns: int) -> _Index:
+    entries: dict[str, LogoFile] = {}
+    # Ordre alphabétique : à clé égale, le premier fichier l'emporte (comme l'ancien scan).
+    for path in sorted(directory.iterdir(), key=lambda p: p.name.lower()):
+        if path.suffix.lower() not in EXTENSIONS or not path.is_file():
+            continue
+        key = normalize_key(path.stem)
+        if not key or key in entries:
+            continue
+        stat = path.stat()
+        entries[key] = LogoFile(path=path, size=stat.st_size, mtime_ns=stat.st_mtime_ns, etag=_file_etag(path))
+    return _Index(directory=directory, mtime_ns=mtime_ns, entries=entries)
+
+
+def _current_index(directory: Path) -> _Index | None:
+    global _index
+    try:
+        mtime_ns = directory.stat().st_mtime_ns
+    except OSError:
+        return None
+    index = _index
+    if index is None or index.directory != directory or index.mtime_ns != mtime_ns:
+        with _lock:
+            index = _index
+            if index is None or index.directory != directory or index.mtime_ns != mtime_ns:
+                index = _index = _build(directory, mtime_ns)
+    return index
+
+
+def invalidate() -> None:
+    global _index
+    _index = None
+
+
+def find(marque_name: str) -> LogoFile | None:
+    """
+    Logo du catalogue (dossier ./logo par défaut) pour une marque, depuis un index construit
+    une fois par processus. L'index est reconstruit quand le dossier change (mtime) ou
+    quand le fichier trouvé a été remplacé sur place.
+    """
+    wanted = normalize_key(marque_name)
+    if not wanted:
+        return None
+    index = _current_index(catalog_dir())
+    entry = index.entries.get(wanted) if index else None
+    if entry is None:
+        return None
+    try:
+        stat = os.stat(entry.path)
+    except OSError:
+        invalidate()
+        return None
+    if (stat.st_size, stat.st_mtime_ns) != (entry.size, entry.mtime_ns):
+        invalidate()
+        index = _current_index(catalog_dir())
+        return index.entries.get(wanted) if index else None
+    return entry
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import json
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db import transaction as db_transaction
+from PIL import Image
+
+from voitures.models import Marque
+from voitures.services import brand_svg, caching, logo_catalog, media_files
+
+logger = logging.getLogger(__name__)
+
+# À incrémenter quand la composition change (nouvelle signature, donc nouveaux fichiers).
+SPRITE_VERSION = 1
+SPRITE_DIR = "brand-sprite"
+TILE_W, TILE_H = 160, 80
+PADDING = 8
+COLUMNS = 8
+RASTER_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif"}
+CONTENT_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "svg": "image/svg+xml",
+}
+
+# Manifeste de la dernière planche composée : servi tant que la suivante n'est pas prête.
+PUBLISHED_NAME = f"{SPRITE_DIR}/current.json"
+# Planches remplacées conservées : une page ou une feuille de style en cache peut encore y renvoyer.
+KEEP_PREVIOUS = 1
+_FILE_RE = re.compile(r"^logos-(?P<sig>[0-9a-f]{16})\.(?P<ext>[a-z]+)$")
+
+_build_lock = threading.Lock()
+_schedule_lock = threading.Lock()
+_builder: threading.Thread | None = None
+_requested = False
+
+
+@dataclass(frozen=True)
+class _Source:
+    marque_id: int
+    nom: str
+    # Fichier uploadé (nom dans le stockage) ou chemin du catalogue ; None = SVG de repli.
+    upload: str | None
+    catalog: str | None
+    token: str
+
+
+def _sources() -> list[_Source]:
+    sources = []
+    for marque_id, nom, logo in Marque.objects.order_by("id").values_list("id", "nom", "logo"):
+        if logo and PurePosixPath(logo).suffix.lower() in RASTER_EXTENSIONS:
+            sources.append(_Source(marque_id, nom, logo, None, f"upload:{logo}"))
+            continue
+        found = logo_catalog.find(nom or "")
+        if found and found.path.suffix.lower() in RASTER_EXTENSIONS:
+            sources.append(_Source(marque_id, nom, None, str(found.path), f"catalog:{found.etag}"))
+        else:
+            sources.append(_Source(marque_id, nom, None, None, f"svg:{brand_svg.digest(nom)}"))
+    return sources
+
+
+def signature(sources: list[_Source]) -> str:
+    """Empreinte des logos composés : change avec une marque, un upload ou un fichier du catalogue."""
+    raw = "\n".join(f"{s.marque_id}:{s.nom}:{s.token}" for s in sources)
+    return hashlib.sha256(f"{SPRITE_VERSION}\n{raw}".encode("utf-8")).hexdigest()[:16]
+
+
+def file_name(sig: str, ext: str) -> str:
+    return f"{SPRITE_DIR}/logos-{sig}.{ext}"
+
+
+def _open_raster(source: _Source) -> Image.Image:
+    if source.upload:
+        with default_storage.open(source.upload, "rb") as fh:
+            image = Image.open(io.BytesIO(fh.read()))
+    else:
+        image = Image.open(source.catalog)
+    image.load()
+    return image.convert("RGBA")
+
+
+def _tile(image: Image.Image) -> Image.Image:
+    image.thumbnail((TILE_W - 2 * PADDING, TILE_H - 2 * PADDING))
+    tile = Image.new("RGBA", (TILE_W, TILE_H), (0, 0, 0, 0))
+    tile.paste(image, ((TILE_W - image.width) // 2, (TILE_H - image.height) // 2), image)
+    return tile
+
+
+def _compose(sig: str, sources: list[_Source]) -> dict:
+    tiles: list[tuple[_Source, Image.Image]] = []
+    for source in sources:
+        if source.upload or source.catalog:
+            try:
+                tiles.append((source, _tile(_open_raster(source))))
+            except Exception:
+                # Fichier illisible ou absent : la marque garde son SVG de repli.
+                logger.warning("Logo illisible pour la marque %s", source.marque_id, exc_info=True)
+
+    columns = max(1, min(COLUMNS, len(tiles)))
+    rows = max(1, -(-len(tiles) // columns))
+    sheet = Image.new("RGBA", (columns * TILE_W, rows * TILE_H), (0, 0, 0, 0))
+    logos: dict[str, list[int]] = {}
+    symbols = []
+    in_sheet = set()
+    for index, (source, tile) in enumerate(tiles):
+        x, y = (index % columns) * TILE_W, (index // columns) * TILE_H
+        sheet.paste(tile, (x, y))
+        logos[str(source.marque_id)] = [x, y]
+        in_sheet.add(source.marque_id)
+        png = io.BytesIO()
+        tile.save(png, format="PNG", optimize=True)
+        data = base64.b64encode(png.getvalue()).decode("ascii")
+        symbols.append(
+            f'<symbol id="marque-{source.marque_id}" viewBox="0 0 {TILE_W} {TILE_H}">'
+            f'<image width="{TILE_W}" height="{TILE_H}" href="data:image/png;base64,{data}"/></symbol>\n'
+        )
+    for source in sources:
+        if source.marque_id not in in_sheet:
+            symbols.append(brand_svg.symbol(source.nom, f"marque-{source.marque_id}"))
+
+    png = io.BytesIO()
+    sheet.save(png, format="PNG", optimize=True)
+    webp = io.BytesIO()
+    sheet.save(webp, format="WEBP", lossless=True, method=6)
+    svg = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<svg xmlns="http://www.w3.org/2000/svg" style="display:none">\n'
+        + "".join(symbols)
+        + "</svg>\n"
+    )
+    manifest = {
+        "signature": sig,
+        "tile": [TILE_W, TILE_H],
+        "size": [sheet.width, sheet.height],
+        "logos": logos,
+        "symbols": [f"marque-{s.marque_id}" for s in sources],
+    }
+    for ext, content in (("png", png.getvalue()), ("webp", webp.getvalue()), ("svg", svg.encode("utf-8"))):
+        media_files.overwrite(file_name(sig, ext), content)
+    media_files.overwrite(file_name(sig, "json"), json.dumps(manifest).encode("utf-8"))
+    return manifest
+
+
+def _load(name: str) -> dict:
+    with default_storage.open(name, "rb") as fh:
+        return json.loads(fh.read())
+
+
+def _publish(current: dict) -> None:
+    media_files.overwrite(PUBLISHED_NAME, json.dumps(current).encode("utf-8"))
+    key = _published_key()
+    caching.shared_cache().delete(key)
+    caching.local_cache().delete(key)
+
+
+def prune(keep: int = KEEP_PREVIOUS) -> int:
+    """
+    Supprime les fichiers des planches remplacées, hormis la courante et les `keep`
+    plus récentes. Retourne le nombre de fichiers supprimés.
+    """
+    current = published()
+    try:
+        _dirs, files = default_storage.listdir(SPRITE_DIR)
+    except FileNotFoundError:
+        return 0
+    by_sig: dict[str, list[str]] = {}
+    for name in files:
+        match = _FILE_RE.match(name)
+        if match:
+            by_sig.setdefault(match["sig"], []).append(f"{SPRITE_DIR}/{name}")
+    older = [sig for sig in by_sig if not current or sig != current["signature"]]
+    older.sort(
+        key=lambda sig: max(default_storage.get_modified_time(name) for name in by_sig[sig]),
+        reverse=True,
+    )
+    removed = 0
+    for sig in older[keep:]:
+        for name in by_sig[sig]:
+            default_storage.delete(name)
+            removed += 1
+    return removed
+
+
+def build(*, force: bool = False) -> dict:
+    """
+    Compose la planche des logos actuels ({signature, tile, size, logos: {marque_id: [x, y]},
+    symbols}) si sa signature n'existe pas encore dans le stockage, la publie (voir
+    `published`) puis supprime les planches remplacées.
+    """
+    sources = _sources()
+    sig = signature(sources)
+    name = file_name(sig, "json")
+    with _build_lock:
+        if not force and default_storage.exists(name):
+            current = _load(name)
+        else:
+            current = _compose(sig, sources)
+        _publish(current)
+        prune()
+    return current
+
+
+def _build_loop() -> None:
+    global _builder, _requested
+
+    while True:
+        with _schedule_lock:
+            if not _requested:
+                _builder = None
+                return
+            _requested = False
+        try:
+            build()
+        except Exception:
+            logger.exception("Composition de la planche des logos impossible")
+        finally:
+            connection.close()
+
+
+def schedule_build() -> None:
+    """
+    Recompose la planche dans un thread du processus : aucune requête n'attend Pillow.
+    Les demandes qui arrivent pendant une composition sont regroupées en une seule suivante.
+    """
+    global _builder, _requested
+
+    with _schedule_lock:
+        _requested = True
+        if _builder is not None:
+            return
+        _builder = threading.Thread(target=_build_loop, name="logo-sprite-build", daemon=True)
+        _builder.start()
+
+
+def schedule_build_on_commit() -> None:
+    """Après l'enregistrement d'une marque : recomposition une fois la transaction validée."""
+    db_transaction.on_commit(schedule_build)
+
+
+def _published_key() -> str:
+    return caching.make_key("logo_sprite:publie")
+
+
+def published() -> dict | None:
+    """
+    Manifeste de la dernière planche composée (éventuellement antérieure aux derniers
+    changements de marques, le temps que la suivante soit prête), sans jamais la composer :
+    le rendu d'une page n'attend pas Pillow. None si aucune planche n'a encore été composée.
+    """
+
+    def lookup():
+        if not default_storage.exists(PUBLISHED_NAME):
+            return None
+        return _load(PUBLISHED_NAME)
+
+    return caching.get_or_set(_published_key(), lookup, timeout=300)
+
+
+def read(sig: str, ext: str) -> bytes | None:
+    """Contenu d'un fichier de planche ; None s'il n'existe pas (ou plus)."""
+    name = file_name(sig, ext)
+    if not default_storage.exists(name):
+        return None
+    with default_storage.open(name, "rb") as fh:
+        return fh.read()
+
+
+def stylesheet(current: dict, image_url) -> str:
+    """
+    CSS de la planche : `.brand-sprite.brand-sprite-<id>`, mise à l'échelle par la
+    variable `--brand-sprite-scale` (1 = tuile de 160×80).
+    """
+    sig = current["signature"]
+    width, height = current["size"]
+    png, webp = image_url(sig, "png"), image_url(sig, "webp")
+    lines = [
+        ".brand-sprite{--brand-sprite-scale:1;display:inline-block;vertical-align:middle;"
+        f"width:calc({TILE_W}px * var(--brand-sprite-scale));height:calc({TILE_H}px * var(--brand-sprite-scale));"
+        f"background-image:url({png});"
+        f'background-image:image-set(url({webp}) type("image/webp"),url({png}) type("image/png"));'
+        f"background-size:calc({width}px * var(--brand-sprite-scale)) calc({height}px * var(--brand-sprite-scale));"
+        "background-repeat:no-repeat}",
+    ]
+    for marque_id, (x, y) in current["logos"].items():
+        lines.append(
+            f".brand-sprite-{marque_id}{{background-position:"
+            f"calc(-{x}px * var(--brand-sprite-scale)) calc(-{y}px * var(--brand-sprite-scale))}}"
+        )
+    return "\n".join(lines) + "\n"
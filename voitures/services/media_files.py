@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+
+def _umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Lu une fois à l'import : os.umask() n'est pas sûr entre threads.
+_DEFAULT_MODE = 0o666 & ~_umask()
+
+
+def overwrite(name: str, content: bytes) -> str:
+    """
+    Écrit `content` exactement sous `name` dans le stockage média, en remplaçant le
+    fichier existant (sinon le stockage enregistrerait une copie sous un autre nom).
+
+    Le remplacement est atomique : un lecteur voit l'ancien contenu ou le nouveau,
+    jamais un fichier absent ou partiel, et un échec d'écriture laisse l'ancien en
+    place. Sur disque, le contenu est écrit dans un fichier temporaire du même
+    dossier puis renommé (os.replace). Les stockages objet qui écrasent d'eux-mêmes
+    (S3 avec file_overwrite...) remplacent l'objet en une seule écriture.
+    """
+    try:
+        path = default_storage.path(name)
+    except NotImplementedError:
+        path = None
+    if path is not None:
+        _replace_file(path, content, getattr(default_storage, "file_permissions_mode", None))
+        return name
+    if default_storage.exists(name) and default_storage.get_available_name(name) != name:
+        # Stockage sans renommage qui n'écrase pas : seul cas où le fichier manque un instant.
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(content))
+
+
+def _replace_file(path: str, content: bytes, mode: int | None) -> None:
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(content)
+            fh.flush()
+            os.fsync(fh.fileno())
+        # mkstemp crée en 0600 : on applique les mêmes droits qu'un save() du stockage.
+        os.chmod(tmp_path, mode if mode is not None else _DEFAULT_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from heapq import merge
+from itertools import islice
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Max
+
+from voitures.models import Notification, NotificationGlobale, NotificationGlobaleLecture
+
+# Id de la dernière notification globale : une diffusion ne touche que cette clé.
+LATEST_BROADCAST_KEY = "notif:globales:derniere"
+
+
+def _key(user_id: int) -> str:
+    """Compteur des notifications personnelles non lues."""
+    return f"notif:non_lues:{user_id}"
+
+
+def _broadcast_key(user_id: int) -> str:
+    """(id de la dernière globale comptée, globales non lues jusqu'à elle)."""
+    return f"notif:globales:non_lues:{user_id}"
+
+
+def _timeout() -> int:
+    # Borne la dérive éventuelle du compteur (caches non partagés entre processus).
+    return int(getattr(settings, "NOTIFICATIONS_UNREAD_CACHE_SECONDS", 300) or 300)
+
+
+def _broadcasts_for(user):
+    """Notifications globales visibles par `user` : publiées depuis son inscription, hors les siennes."""
+    return NotificationGlobale.objects.filter(date_creation__gte=user.date_joined).exclude(auteur=user)
+
+
+def _watermark(user) -> int:
+    lecture = NotificationGlobaleLecture.objects.filter(utilisateur=user).values_list(
+        "derniere_lue_id", flat=True
+    ).first()
+    return lecture or 0
+
+
+def _latest_broadcast_id() -> int:
+    latest = cache.get(LATEST_BROADCAST_KEY)
+    if latest is None:
+        latest = NotificationGlobale.objects.aggregate(last=Max("id"))["last"] or 0
+        cache.add(LATEST_BROADCAST_KEY, latest, None)
+    return latest
+
+
+def _unread_broadcasts(user) -> int:
+    """
+    Globales non lues, recomptées seulement au-delà de la dernière globale déjà comptée
+    pour cet utilisateur (au départ : son filigrane). Une diffusion n'invalide rien.
+    """
+    latest = _latest_broadcast_id()
+    state = cache.get(_broadcast_key(user.pk))
+    if state is None:
+        counted_up_to, unread = _watermark(user), 0
+    else:
+        counted_up_to, unread = state
+    if state is None or latest > counted_up_to:
+        unread += _broadcasts_for(user).filter(id__gt=counted_up_to, id__lte=latest).count()
+        cache.set(_broadcast_key(user.pk), (max(latest, counted_up_to), unread), _timeout())
+    return unread
+
+
+def unread_count(user) -> int:
+    """
+    Non lues = notifications personnelles non lues + notifications globales au-delà
+    du filigrane. Les deux termes sont en cache séparément.
+    """
+    key = _key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(utilisateur_id=user.pk, lu=False).count()
+        cache.set(key, count, _timeout())
+    return count + _unread_broadcasts(user)
+
+
+def increment_unread(user_ids: Iterable[int], amount: int = 1) -> None:
+    """Après une insertion : incrémente les compteurs présents (les absents seront recalculés)."""
+    for user_id in set(user_ids):
+        try:
+            cache.incr(_key(user_id), amount)
+        except ValueError:
+            pass
+
+
+def reset_unread(user_id: int) -> None:
+    cache.set(_key(user_id), 0, _timeout())
+
+
+def lazy_unread_count(user):
+    """Callable mémoïsé : les templates l'appellent seulement s'ils lisent la variable."""
+    result: list[int] = []
+
+    def _count() -> int:
+        if not result:
+            result.append(unread_count(user))
+        return result[0]
+
+    return _count
+
+
+def broadcast(*, type: str, titre: str, contenu: str = "", url: str = "", auteur=None) -> NotificationGlobale:
+    """Publie une notification pour tous les utilisateurs : une seule ligne, coût constant."""
+    notification = NotificationGlobale.objects.create(
+        type=type, titre=titre, contenu=contenu, url=url, auteur=auteur
+    )
+    # Après le commit : un lecteur ne compte jamais une globale qu'il ne voit pas encore.
+    db_transaction.on_commit(lambda: _publish_latest(notification.id))
+    return notification
+
+
+def _publish_latest(notification_id: int) -> None:
+    if (cache.get(LATEST_BROADCAST_KEY) or 0) < notification_id:
+        cache.set(LATEST_BROADCAST_KEY, notification_id, None)
+
+
+def feed(user, limit: int = 200) -> list:
+    """Fil unifié (personnelles + globales) trié par date décroissante."""
+    personnelles = Notification.objects.filter(utilisateur=user).order_by("-date_creation")[:limit]
+    globales = _broadcasts_for(user).order_by("-date_creation")[:limit]
+    items = merge(personnelles, globales, key=lambda n: n.date_creation, reverse=True)
+    return list(islice(items, limit))
+
+
+def mark_all_read(user) -> None:
+    Notification.objects.filter(utilisateur=user, lu=False).update(lu=True)
+    last_id = _broadcasts_for(user).aggregate(last=Max("id"))["last"]
+    if last_id:
+        NotificationGlobaleLecture.objects.update_or_create(
+            utilisateur=user, defaults={"derniere_lue_id": last_id}
+        )
+    reset_unread(user.pk)
+    cache.set(_broadcast_key(user.pk), (last_id or 0, 0), _timeout())
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Iterable
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db import transaction as db_transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from voitures.models import Notification, OutboxNotification
+from voitures.services import notifications as notif_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+MAX_BACKOFF_SECONDS = 3600
+
+
+@dataclass
+class DrainResult:
+    delivered: int = 0
+    retried: int = 0
+    failed: int = 0
+
+    @property
+    def processed(self) -> int:
+        return self.delivered + self.retried + self.failed
+
+
+def _setting_int(name: str, default: int) -> int:
+    try:
+        return max(int(getattr(settings, name, default)), 1)
+    except (TypeError, ValueError):
+        return default
+
+
+def enqueue(users: Iterable, *, type: str, titre: str, contenu: str = "", url: str = "") -> int:
+    """
+    Ajoute une notification par destinataire (utilisateur ou id) à la file d'envoi.
+    À appeler dans la transaction du changement métier : rien n'est envoyé si elle
+    est annulée. Les comptes inactifs sont filtrés à la livraison.
+    """
+    rows = [
+        OutboxNotification(
+            utilisateur_id=getattr(user, "pk", user), type=type, titre=titre, contenu=contenu, url=url
+        )
+        for user in users
+        if user
+    ]
+    if rows:
+        OutboxNotification.objects.bulk_create(rows)
+    return len(rows)
+
+
+def enqueue_staff(*, type: str, titre: str, contenu: str = "", url: str = "") -> None:
+    """Une seule ligne pour toute l'équipe : la liste du staff est résolue par le worker."""
+    OutboxNotification.objects.create(
+        audience="staff", type=type, titre=titre, contenu=contenu, url=url
+    )
+
+
+def _recipient_key(event: OutboxNotification) -> str:
+    return "staff" if event.audience == "staff" else f"u{event.utilisateur_id}"
+
+
+def _build_notifications(event: OutboxNotification, staff: list[User]) -> list[Notification]:
+    if event.audience == "staff":
+        recipients = staff
+    else:
+        recipients = [event.utilisateur] if event.utilisateur and event.utilisateur.is_active else []
+    return [
+        Notification(
+            utilisateur=user, type=event.type, titre=event.titre, contenu=event.contenu, url=event.url
+        )
+        for user in recipients
+    ]
+
+
+def _deliver(events: list[OutboxNotification], staff: list[User]) -> None:
+    notifications = [n for event in events for n in _build_notifications(event, staff)]
+    with db_transaction.atomic():
+        if notifications:
+            Notification.objects.bulk_create(notifications)
+        OutboxNotification.objects.filter(id__in=[e.id for e in events]).update(
+            statut="livree", date_traitement=timezone.now()
+        )
+    user_ids = [n.utilisateur_id for n in notifications]
+    db_transaction.on_commit(lambda: notif_service.increment_unread(user_ids))
+
+
+def _record_failure(event: OutboxNotification, exc: Exception, max_attempts: int) -> str:
+    attempts = event.tentatives + 1
+    statut = "echec" if attempts >= max_attempts else "en_attente"
+    delay = min(5 * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+    OutboxNotification.objects.filter(id=event.id).update(
+        tentatives=attempts,
+        statut=statut,
+        prochain_essai=timezone.now() + timedelta(seconds=delay),
+        derniere_erreur=repr(exc)[:2000],
+    )
+    return statut
+
+
+def _claim_batch(batch_size: int, now) -> list[OutboxNotification]:
+    # Ligne bloquée : elle-même ou une ligne plus ancienne du même destinataire attend
+    # son nouvel essai. Exclue de la requête, sinon un lot plein de destinataires en
+    # backoff masquerait indéfiniment tous les autres.
+    waiting = OutboxNotification.objects.filter(
+        statut="en_attente", prochain_essai__gt=now, id__lte=OuterRef("id"), audience=OuterRef("audience")
+    ).filter(Q(audience="staff") | Q(utilisateur_id=OuterRef("utilisateur_id")))
+    qs = (
+        OutboxNotification.objects.filter(statut="en_attente")
+        .exclude(Exists(waiting))
+        .select_related("utilisateur")
+        .order_by("id")
+    )
+    if not connection.features.has_select_for_update_skip_locked:
+        return list(qs[:batch_size])
+    # Plusieurs workers : chacun prend des lignes différentes, puis laisse les
+    # destinataires dont une ligne plus ancienne est déjà aux mains d'un autre.
+    qs = qs.select_for_update(skip_locked=True, of=("self",))
+    return _without_recipients_in_progress(list(qs[:batch_size]))
+
+
+def _recipient_filter(event: OutboxNotification) -> Q:
+    if event.audience == "staff":
+        return Q(audience="staff")
+    return Q(audience=event.audience, utilisateur_id=event.utilisateur_id)
+
+
+def _without_recipients_in_progress(batch: list[OutboxNotification]) -> list[OutboxNotification]:
+    """
+    Retire du lot les destinataires qui ont une ligne en attente plus ancienne hors du
+    lot : verrouillée (SKIP LOCKED) par un autre worker qui ne l'a pas encore validée.
+    Les lignes d'un destinataire ne sont ainsi jamais livrées par deux workers à la fois,
+    ce qui préserve l'ordre par destinataire. Les lignes écartées restent verrouillées
+    jusqu'à la fin de la transaction, puis seront reprises dans l'ordre.
+    """
+    first: dict[str, OutboxNotification] = {}
+    for event in batch:
+        first.setdefault(_recipient_key(event), event)
+    if not first:
+        return batch
+    older = Q()
+    for event in first.values():
+        older |= _recipient_filter(event) & Q(id__lt=event.id)
+    busy = {
+        "staff" if audience == "staff" else f"u{utilisateur_id}"
+        for audience, utilisateur_id in OutboxNotification.objects.filter(statut="en_attente")
+        .filter(older)
+        .values_list("audience", "utilisateur_id")
+    }
+    return [event for event in batch if _recipient_key(event) not in busy]
+
+
+def drain(*, batch_size: int | None = None, max_attempts: int | None = None) -> DrainResult:
+    """
+    Livre un lot de notifications en attente, dans l'ordre des ids.
+
+    L'ordre est garanti par destinataire, y compris avec plusieurs workers : une ligne
+    en attente de nouvel essai (ou en échec dans ce lot, ou prise par un autre worker)
+    bloque les lignes suivantes du même destinataire. Le lot
+    est inséré en une fois ; en cas d'erreur, chaque événement est réessayé seul
+    pour isoler le fautif, qui repasse plus tard (backoff exponentiel) puis passe en
+    « echec » après OUTBOX_MAX_ATTEMPTS tentatives.
+    """
+    batch_size = batch_size or _setting_int("OUTBOX_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    max_attempts = max_attempts or _setting_int("OUTBOX_MAX_ATTEMPTS", 5)
+    result = DrainResult()
+    now = timezone.now()
+
+    with db_transaction.atomic():
+        batch = _claim_batch(batch_size, now)
+        if not batch:
+            return result
+
+        blocked: set[str] = set()
+        due: list[OutboxNotification] = []
+        for event in batch:
+            key = _recipient_key(event)
+            if key in blocked:
+                continue
+            if event.prochain_essai > now:
+                blocked.add(key)
+                continue
+            due.append(event)
+        if not due:
+            return result
+
+        staff = []
+        if any(event.audience == "staff" for event in due):
+            staff = list(User.objects.filter(is_staff=True, is_active=True))
+
+        try:
+            _deliver(due, staff)
+            result.delivered = len(due)
+            return result
+        except Exception:
+            logger.exception("Échec de la livraison groupée de %s notifications", len(due))
+
+        failed_keys: set[str] = set()
+        for event in due:
+            key = _recipient_key(event)
+            if key in failed_keys:
+                continue
+            try:
+                _deliver([event], staff)
+                result.delivered += 1
+            except Exception as exc:
+                failed_keys.add(key)
+                if _record_failure(event, exc, max_attempts) == "echec":
+                    result.failed += 1
+                else:
+                    result.retried += 1
+    return result
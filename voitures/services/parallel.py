@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+import django
+
+# Tâches en attente par processus : borne la mémoire quel que soit le nombre d'éléments.
+IN_FLIGHT_PER_WORKER = 4
+
+
+def ordered_map(
+    func: Callable, items: Iterable, workers: int, *, in_flight_per_worker: int = IN_FLIGHT_PER_WORKER
+) -> Iterator:
+    """
+    `map` ordonné, parallèle si workers > 1. `func` doit être une fonction de module
+    (sérialisable) qui ne touche pas à la base ; au plus workers * in_flight_per_worker
+    éléments sont en attente à la fois, `items` est consommé au fil de l'eau.
+    """
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    pending: deque = deque()
+    # « spawn » : aucune connexion à la base héritée. L'initialiseur doit être importable
+    # avant Django (les modules des tâches importent les modèles), d'où django.setup directement.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as executor:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= workers * in_flight_per_worker:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
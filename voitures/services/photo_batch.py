@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+
+from voitures.models import Voiture
+from voitures.services import caching, homepage, image_variants
+
+# Voitures mises à jour par requête (bulk_update) et entre deux points de reprise.
+BATCH_SIZE = 500
+CHECKPOINT_DIR = ".checkpoints"
+
+
+def default_checkpoint(command: str) -> Path:
+    return Path(settings.MEDIA_ROOT) / CHECKPOINT_DIR / f"{command}.json"
+
+
+class Checkpoint:
+    """Dernière voiture traitée par une commande, pour reprendre un lot interrompu (--resume)."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+
+    def load(self) -> int | None:
+        try:
+            return int(json.loads(self.path.read_text(encoding="utf-8"))["last_id"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, last_id: int) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"last_id": last_id}), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+class PhotoUpdater:
+    """
+    Regroupe les nouvelles photos principales et les écrit par lots avec bulk_update,
+    dans l'ordre croissant des voitures. Après chaque lot : point de reprise, puis
+    `progress(done, total, rate)`. bulk_update ne déclenche pas post_save : le cache
+    et l'accueil sont invalidés ici, les déclinaisons des photos réécrites supprimées.
+    """
+
+    def __init__(
+        self,
+        *,
+        total: int,
+        checkpoint: Checkpoint | None = None,
+        batch_size: int = BATCH_SIZE,
+        progress: Callable[[int, int, float], None] | None = None,
+    ) -> None:
+        self.total = total
+        self.checkpoint = checkpoint
+        self.batch_size = max(1, batch_size)
+        self.progress = progress
+        self.done = 0
+        self._pending: dict[int, str] = {}
+        self._started = time.monotonic()
+
+    def add(self, voiture_id: int, name: str) -> None:
+        self._pending[voiture_id] = name
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        rows = [Voiture(pk=voiture_id, image_principale=name) for voiture_id, name in self._pending.items()]
+        with db_transaction.atomic():
+            Voiture.objects.bulk_update(rows, ["image_principale"])
+        caching.bump(Voiture)
+        homepage.invalidate()
+        for name in set(self._pending.values()):
+            image_variants.invalidate(name)
+        if self.checkpoint is not None:
+            self.checkpoint.save(max(self._pending))
+        self.done += len(self._pending)
+        self._pending.clear()
+        if self.progress is not None:
+            elapsed = time.monotonic() - self._started
+            self.progress(self.done, self.total, self.done / elapsed if elapsed > 0 else 0.0)
+
+    def close(self) -> None:
+        """Dernier lot ; le point de reprise n'a plus lieu d'être une fois tout écrit."""
+        self.flush()
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
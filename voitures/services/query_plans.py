@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db import transaction as db_transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from voitures.models import Message, Notification, OutboxNotification, Reservation, Transaction, Voiture
+
+SUPPORTED_VENDORS = ("postgresql", "sqlite")
+
+_PG_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+# SQLite : « SCAN table » sans « USING ... INDEX » = parcours complet de la table.
+_SQLITE_SCAN = re.compile(r"\bSCAN (\w+)(.*)$")
+
+
+@dataclass
+class PlanCheck:
+    name: str
+    plan: str
+    sequential_scans: list[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.sequential_scans
+
+
+def hot_queries(user: User, voiture: Voiture) -> list[tuple[str, QuerySet]]:
+    """
+    Requêtes des vues et workers les plus sollicités, avec un utilisateur et une annonce
+    réels. `.order_by()` reproduit les count()/exists()/update() des vues (sans tri).
+    """
+    now = timezone.now()
+    disponibles = Voiture.objects.filter(est_vendue=False)
+    actives = ["en_attente", "acceptee"]
+    return [
+        ("catalogue : plus récentes", disponibles.order_by("-date_ajout", "-id")[:13]),
+        ("catalogue : prix croissant", disponibles.order_by("prix", "id")[:13]),
+        ("accueil : promotions", disponibles.order_by("prix")[:6]),
+        ("mes_voitures", Voiture.objects.filter(vendeur=user).order_by("-date_ajout")),
+        ("mes_achats", Transaction.objects.filter(acheteur=user).order_by("-date_transaction")),
+        ("mes_ventes", Transaction.objects.filter(vendeur=user).order_by("-date_transaction")),
+        (
+            "dashboard : transactions en attente",
+            Transaction.objects.filter(statut="en_attente").order_by("-date_transaction")[:10],
+        ),
+        (
+            "demande d'achat en cours",
+            Transaction.objects.filter(voiture=voiture, statut="en_attente").order_by(),
+        ),
+        (
+            "expiration : demandes d'achat échues",
+            Transaction.objects.filter(statut="en_attente", expires_at__lte=now),
+        ),
+        (
+            "mes_reservations",
+            Reservation.objects.filter(client=user).order_by("-date_creation", "-id")[:13],
+        ),
+        (
+            "chevauchement de réservations",
+            Reservation.objects.filter(
+                voiture=voiture, statut__in=actives, debut__lt=now + timedelta(days=1), fin__gt=now
+            ).order_by(),
+        ),
+        (
+            "expiration : réservations échues",
+            Reservation.objects.filter(statut="en_attente", expires_at__lte=now),
+        ),
+        ("notifications : non lues", Notification.objects.filter(utilisateur=user, lu=False).order_by()),
+        ("notifications : fil", Notification.objects.filter(utilisateur=user).order_by("-date_creation")[:200]),
+        ("messages reçus", Message.objects.filter(destinataire=user).order_by("-date_envoi")),
+        ("messages envoyés", Message.objects.filter(expediteur=user).order_by("-date_envoi")),
+        ("messages non lus", Message.objects.filter(destinataire=user, lu=False).order_by()),
+        (
+            "outbox : lot en attente",
+            OutboxNotification.objects.filter(statut="en_attente").order_by("id")[:200],
+        ),
+    ]
+
+
+def sequential_scans(plan: str, vendor: str) -> list[str]:
+    if vendor == "postgresql":
+        return _PG_SEQ_SCAN.findall(plan)
+    scans = []
+    for line in plan.splitlines():
+        match = _SQLITE_SCAN.search(line)
+        if match and "USING" not in match.group(2) and "VIRTUAL TABLE" not in match.group(2):
+            scans.append(match.group(1))
+    return scans
+
+
+def check(queries: list[tuple[str, QuerySet]], *, allowed: set[str] = frozenset()) -> list[PlanCheck]:
+    """
+    EXPLAIN de chaque requête. Sous PostgreSQL, `enable_seqscan` est désactivé le
+    temps du contrôle : sur une base peu peuplée, le planificateur préfère toujours un
+    parcours séquentiel, on vérifie donc qu'un chemin indexé existe.
+    """
+    vendor = connection.vendor
+    results = []
+    with db_transaction.atomic():
+        if vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        for name, queryset in queries:
+            plan = queryset.explain()
+            scans = [table for table in sequential_scans(plan, vendor) if table not in allowed]
+            results.append(PlanCheck(name=name, plan=plan, sequential_scans=scans))
+    return results
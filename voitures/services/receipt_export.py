@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import zipfile
+from datetime import date, datetime, time as dtime, timedelta
+from functools import partial
+from typing import BinaryIO, Iterable, Iterator
+
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from voitures.models import Transaction
+from voitures.services.parallel import ordered_map
+from voitures.services.receipt_store import IMMUTABLE_STATUSES, ROLES, filename
+from voitures.services.receipts import RECEIPT_FONTS, build_transaction_receipt, render_receipt_page
+from voitures.services.simple_pdf import ChunkSink, iter_pdf_pages, write_pages
+
+FORMATS = ("zip", "pdf")
+# Lignes lues par aller-retour avec la base (iterator()).
+CHUNK_SIZE = 200
+
+
+def receipts_in_range(start: date, end: date) -> QuerySet:
+    """Ventes confirmées/terminées dont la demande date de [start, end] (jours inclus)."""
+    debut = timezone.make_aware(datetime.combine(start, dtime.min))
+    fin = timezone.make_aware(datetime.combine(end + timedelta(days=1), dtime.min))
+    return (
+        Transaction.objects.filter(
+            statut__in=IMMUTABLE_STATUSES, date_transaction__gte=debut, date_transaction__lt=fin
+        )
+        .select_related("voiture__modele__marque", "acheteur", "vendeur")
+        .order_by("date_transaction", "id")
+    )
+
+
+def export_filename(start: date, end: date, fmt: str) -> str:
+    return f"recus_{start.isoformat()}_{end.isoformat()}.{fmt}"
+
+
+def _render_file(transaction: Transaction, role: str) -> tuple[str, bytes]:
+    return filename(transaction, role), build_transaction_receipt(transaction=transaction, role=role)
+
+
+def _render_page(transaction: Transaction, role: str) -> bytes:
+    return render_receipt_page(transaction=transaction, role=role)
+
+
+def _files(transactions: Iterable[Transaction], role: str, workers: int, count: list) -> Iterator[tuple[str, bytes]]:
+    for item in ordered_map(partial(_render_file, role=role), transactions, workers):
+        count[0] += 1
+        yield item
+
+
+def _pages(transactions: Iterable[Transaction], role: str, workers: int, count: list) -> Iterator[bytes]:
+    for page in ordered_map(partial(_render_page, role=role), transactions, workers):
+        count[0] += 1
+        yield page
+
+
+def _zip_archive(sink: BinaryIO) -> zipfile.ZipFile:
+    return zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED)
+
+
+def _zip_chunks(transactions: Iterable[Transaction], role: str, workers: int, count: list) -> Iterator[bytes]:
+    sink = ChunkSink()
+    with _zip_archive(sink) as archive:
+        for name, content in _files(transactions, role, workers, count):
+            archive.writestr(name, content)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _pdf_chunks(transactions: Iterable[Transaction], role: str, workers: int, count: list) -> Iterator[bytes]:
+    yield from iter_pdf_pages(_pages(transactions, role, workers, count), fonts=RECEIPT_FONTS, compress=True)
+
+
+def _transactions(start: date, end: date, fmt: str, role: str) -> Iterator[Transaction]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu: {fmt}")
+    if role not in ROLES:
+        raise ValueError(f"Rôle inconnu: {role}")
+    return receipts_in_range(start, end).iterator(chunk_size=CHUNK_SIZE)
+
+
+def stream_export(
+    start: date, end: date, *, fmt: str = "zip", role: str = "vendeur", workers: int = 1, count: list | None = None
+) -> Iterator[bytes]:
+    """
+    Reçus des ventes de l'intervalle, produits par morceaux : archive ZIP (un PDF par
+    vente) ou PDF multi-pages (une page par vente). `count[0]` compte les reçus émis.
+    """
+    count = count if count is not None else [0]
+    transactions = _transactions(start, end, fmt, role)
+    chunks = _zip_chunks if fmt == "zip" else _pdf_chunks
+    for chunk in chunks(transactions, role, workers, count):
+        if chunk:
+            yield chunk
+
+
+def export(
+    sink: BinaryIO, start: date, end: date, *, fmt: str = "zip", role: str = "vendeur", workers: int = 1
+) -> int:
+    """Écrit l'export dans le fichier `sink` ; retourne le nombre de reçus exportés."""
+    count = [0]
+    transactions = _transactions(start, end, fmt, role)
+    if fmt == "pdf":
+        write_pages(sink, _pages(transactions, role, workers, count), fonts=RECEIPT_FONTS, compress=True)
+    else:
+        with _zip_archive(sink) as archive:
+            for name, content in _files(transactions, role, workers, count):
+                archive.writestr(name, content)
+    return count[0]
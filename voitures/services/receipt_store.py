@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+
+from voitures.models import Transaction
+from voitures.services.receipts import build_transaction_receipt
+
+ROLES = ("acheteur", "vendeur")
+# Statuts définitifs : le reçu ne change plus, on le garde en cache.
+IMMUTABLE_STATUSES = ("confirmee", "terminee")
+# À incrémenter quand la mise en page de receipts.py change (nouvelles clés, nouveaux ETags).
+RENDER_VERSION = 3
+
+
+@dataclass(frozen=True)
+class StoredReceipt:
+    content: bytes
+    etag: str
+    filename: str
+
+
+def _timeout() -> int:
+    return int(getattr(settings, "RECEIPT_CACHE_SECONDS", 30 * 24 * 3600) or 0)
+
+
+def content_key(transaction: Transaction, role: str) -> str:
+    """Empreinte de tout ce qui détermine le PDF : transaction, rôle, statut, dernière mise à jour."""
+    updated = transaction.date_mise_a_jour.isoformat() if transaction.date_mise_a_jour else ""
+    raw = f"{RENDER_VERSION}:{transaction.id}:{role}:{transaction.statut}:{updated}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def etag(transaction: Transaction, role: str) -> str:
+    """ETag fort : calculé sans générer le PDF (suffit pour répondre 304)."""
+    return f'"{content_key(transaction, role)[:32]}"'
+
+
+def filename(transaction: Transaction, role: str) -> str:
+    return f"recu_transaction_{transaction.id}_{role}.pdf"
+
+
+def _cache_key(transaction: Transaction, role: str) -> str:
+    return f"recu:{content_key(transaction, role)}"
+
+
+def get_receipt(transaction: Transaction, role: str) -> StoredReceipt:
+    """
+    Reçu PDF de `transaction` pour `role`. Les reçus définitifs (confirmée/terminée)
+    sont lus dans le cache et générés une seule fois ; les autres sont générés à la demande.
+    """
+    if role not in ROLES:
+        raise ValueError(f"Rôle inconnu: {role}")
+
+    cacheable = transaction.statut in IMMUTABLE_STATUSES and _timeout() > 0
+    content = cache.get(_cache_key(transaction, role)) if cacheable else None
+    if content is None:
+        content = build_transaction_receipt(transaction=transaction, role=role)
+        if cacheable:
+            cache.set(_cache_key(transaction, role), content, _timeout())
+    return StoredReceipt(content=content, etag=etag(transaction, role), filename=filename(transaction, role))
+
+
+def warm(transaction_id: int) -> int:
+    """Génère à l'avance les reçus acheteur et vendeur (après confirmation d'une vente)."""
+    transaction = (
+        Transaction.objects.select_related("voiture__modele__marque", "acheteur", "vendeur")
+        .filter(id=transaction_id, statut__in=IMMUTABLE_STATUSES)
+        .first()
+    )
+    if transaction is None:
+        return 0
+    for role in ROLES:
+        get_receipt(transaction, role)
+    return len(ROLES)
@@ -5,7 +5,7 @@ from decimal import Decimal, InvalidOperation
 from django.utils import timezone
 
 from voitures.models import Transaction
-from voitures.services.simple_pdf import PdfCanvas, build_one_page_pdf, estimate_text_width
+from voitures.services.simple_pdf import PdfCanvas, build_one_page_pdf, estimate_text_width, truncate_to_width
 
 
 def _user_label(user) -> str:
@@ -53,15 +53,6 @@ def _format_fcfa(amount) -> str:
     return f"{sign}{grouped},{frac_part} FCFA"
 
 
-def _truncate(text: str, max_chars: int) -> str:
-    text = (text or "").strip()
-    if len(text) <= max_chars:
-        return text
-    if max_chars <= 1:
-        return "…"
-    return text[: max_chars - 1].rstrip() + "…"
-
-
 def _draw_text_right(
     canvas: PdfCanvas,
     *,
@@ -90,17 +81,34 @@ def _draw_text_center(
     canvas.text(x_center - (width / 2.0), y, text, font=font, size=size, color=color)
 
 
+# Polices Base14 référencées par la mise en page (nom de ressource -> BaseFont).
+RECEIPT_FONTS = {"F1": "Helvetica", "F2": "Helvetica-Bold", "F3": "Courier"}
+
+
 def build_transaction_receipt(*, transaction: Transaction, role: str) -> bytes:
+    doc = build_one_page_pdf(
+        content_stream=render_receipt_page(transaction=transaction, role=role),
+        filename=f"recu_transaction_{transaction.id}_{role}.pdf",
+        fonts=RECEIPT_FONTS,
+        compress=True,
+    )
+    return doc.content
+
+
+def render_receipt_page(*, transaction: Transaction, role: str) -> bytes:
+    """Content stream de la page du reçu (sans enveloppe PDF), réutilisable dans un export multi-pages."""
     voiture = transaction.voiture
     modele = getattr(voiture, "modele", None)
     marque = getattr(modele, "marque", None)
 
-    confirmation = transaction.date_confirmation or transaction.date_mise_a_jour or transaction.date_transaction
+    confirmation = (
+        getattr(transaction, "date_confirmation", None)
+        or transaction.date_mise_a_jour
+        or transaction.date_transaction
+    )
     if timezone.is_naive(confirmation):
         confirmation = timezone.make_aware(confirmation)
 
-    filename = f"recu_transaction_{transaction.id}_{role}.pdf"
-
     tz = timezone.get_current_timezone()
     confirmation_str = confirmation.astimezone(tz).strftime("%d/%m/%Y %H:%M")
     statut = (transaction.get_statut_display_fr() or "").strip() or "—"
@@ -219,10 +227,11 @@ def build_transaction_receipt(*, transaction: Transaction, role: str) -> bytes:
     canvas.text(left_x + 14.0, section_y - 20.0, "ACHETEUR", font="F2", size=10.0, color=MUTED)
     canvas.text(right_x + 14.0, section_y - 20.0, "VENDEUR", font="F2", size=10.0, color=MUTED)
 
-    buyer_name = _truncate(_user_name(transaction.acheteur), 38)
-    buyer_contact = _truncate(_user_contact(transaction.acheteur), 44)
-    seller_name = _truncate(_user_name(transaction.vendeur), 38)
-    seller_contact = _truncate(_user_contact(transaction.vendeur), 44)
+    text_w = col_w - 28.0
+    buyer_name = truncate_to_width(_user_name(transaction.acheteur), text_w, font="F2", size=12.0)
+    buyer_contact = truncate_to_width(_user_contact(transaction.acheteur), text_w, font="F1", size=10.5)
+    seller_name = truncate_to_width(_user_name(transaction.vendeur), text_w, font="F2", size=12.0)
+    seller_contact = truncate_to_width(_user_contact(transaction.vendeur), text_w, font="F1", size=10.5)
 
     canvas.text(left_x + 14.0, section_y - 42.0, buyer_name, font="F2", size=12.0, color=TEXT)
     canvas.text(left_x + 14.0, section_y - 62.0, buyer_contact, font="F1", size=10.5, color=TEXT)
@@ -281,11 +290,12 @@ def build_transaction_receipt(*, transaction: Transaction, role: str) -> bytes:
         canvas.line(table_x, y_row_top - row_h, table_x + W, y_row_top - row_h)
         canvas.restore()
 
-        canvas.text(table_x + 12.0, y_row_top - 17.0, _truncate(label, 26), font="F1", size=10.0, color=MUTED)
+        label = truncate_to_width(label, label_w - 24.0, font="F1", size=10.0)
+        canvas.text(table_x + 12.0, y_row_top - 17.0, label, font="F1", size=10.0, color=MUTED)
         canvas.text(
             table_x + label_w + 12.0,
             y_row_top - 17.0,
-            _truncate(value, 54),
+            truncate_to_width(value, W - label_w - 24.0, font="F2", size=10.5),
             font="F2",
             size=10.5,
             color=TEXT,
@@ -330,9 +340,4 @@ def build_transaction_receipt(*, transaction: Transaction, role: str) -> bytes:
         color=MUTED,
     )
 
-    doc = build_one_page_pdf(
-        content_stream=canvas.stream(),
-        filename=filename,
-        fonts={"F1": "Helvetica", "F2": "Helvetica-Bold", "F3": "Courier"},
-    )
-    return doc.content
+    return canvas.stream()
@@ -1,79 +1,118 @@
 from __future__ import annotations
 
-from datetime import timedelta
+from collections import defaultdict
 
-from django.conf import settings
+from django.db import IntegrityError
 from django.db import transaction as db_transaction
 from django.utils import timezone
 
-from voitures.models import Reservation, Voiture
-
-
-def _ttl_hours() -> int:
-    val = getattr(settings, "RESERVATION_TTL_HOURS", 24) or 24
-    try:
-        return max(int(val), 1)
-    except (TypeError, ValueError):
-        return 24
+from voitures.models import Reservation, Transaction, Voiture
+from voitures.services import availability, caching, counters
+from voitures.services.deadlines import DEFAULT_BATCH_SIZE, expire_due
 
 
 def expire_finished_reservations() -> int:
     """Marque terminées les réservations passées et libère la voiture."""
-    now = timezone.now()
     finished = Reservation.objects.filter(
-        statut__in=["en_attente", "acceptee"], fin__lt=now
+        statut__in=["en_attente", "acceptee"], fin__lt=timezone.now()
     )
-    ids = list(finished.values_list("id", flat=True))
-    count = finished.update(statut="terminee")
-    if ids:
-        car_ids = Reservation.objects.filter(id__in=ids).values_list("voiture_id", flat=True)
-        Voiture.objects.filter(id__in=car_ids, est_reservee=True).update(est_reservee=False)
+    count, car_ids = expire_due(finished, new_status="terminee")
+    _release(car_ids)
     return count
 
 
 def expire_stale_pending() -> int:
-    """Annule les réservations en attente trop anciennes (TTL)."""
-    cutoff = timezone.now() - timedelta(hours=_ttl_hours())
-    stale = Reservation.objects.filter(statut="en_attente", date_creation__lt=cutoff)
-    ids = list(stale.values_list("id", flat=True))
-    count = stale.update(statut="annulee")
-    if ids:
-        car_ids = Reservation.objects.filter(id__in=ids).values_list("voiture_id", flat=True)
-        Voiture.objects.filter(id__in=car_ids, est_reservee=True).update(est_reservee=False)
+    """Annule les réservations en attente dont l'échéance (`expires_at`) est dépassée."""
+    stale = Reservation.objects.filter(statut="en_attente", expires_at__lte=timezone.now())
+    count, car_ids = expire_due(stale, new_status="annulee")
+    _release(car_ids)
     return count
 
 
-def create_reservation(*, voiture_id: int, client, debut, fin, type: str, note: str, signature: str) -> Reservation:
-    expire_finished_reservations()
-    expire_stale_pending()
+def cancel_overlapping(*, dry_run: bool = False) -> list[int]:
+    """
+    Annule, voiture par voiture et de la plus ancienne à la plus récente, chaque
+    réservation active qui chevauche une réservation conservée : la plus récente de
+    chaque conflit. Dans une chaîne A-B-C où seuls A-B et B-C se chevauchent, seule B
+    est annulée. Permet ensuite d'installer la garde (voir availability).
+    Retourne les ids des réservations annulées (à annuler avec `dry_run`).
+    """
+    conflicted = availability.overlapping_reservations().values("voiture_id")
+    rows = (
+        Reservation.objects.filter(statut__in=availability.ACTIVE_STATUSES, voiture_id__in=conflicted)
+        .order_by("voiture_id", "id")
+        .values_list("id", "voiture_id", "debut", "fin")
+    )
+    kept: dict[int, list[tuple]] = defaultdict(list)
+    cancelled: list[int] = []
+    car_ids: set[int] = set()
+    for reservation_id, voiture_id, debut, fin in rows.iterator(chunk_size=DEFAULT_BATCH_SIZE):
+        if any(k_debut < fin and k_fin > debut for k_debut, k_fin in kept[voiture_id]):
+            cancelled.append(reservation_id)
+            car_ids.add(voiture_id)
+        else:
+            kept[voiture_id].append((debut, fin))
+    if dry_run:
+        return cancelled
+
+    with db_transaction.atomic():
+        for start in range(0, len(cancelled), DEFAULT_BATCH_SIZE):
+            batch = cancelled[start : start + DEFAULT_BATCH_SIZE]
+            Reservation.objects.filter(id__in=batch, statut__in=availability.ACTIVE_STATUSES).update(
+                statut="annulee"
+            )
+        _release(car_ids)
+    return cancelled
+
+
+def _release(car_ids: set[int]) -> None:
+    """Libère les voitures qui n'ont plus ni réservation active ni demande d'achat en attente."""
+    if not car_ids:
+        return
+    # Changements de statut en masse (sans signal) : totaux en cache à recalculer.
+    caching.bump(Reservation)
+    counters.unreserve(
+        Voiture.objects.filter(id__in=car_ids)
+        .exclude(reservations__statut__in=availability.ACTIVE_STATUSES)
+        .exclude(transaction__statut="en_attente")
+    )
+    availability.touch(car_ids)
 
+
+def create_reservation(*, voiture_id: int, client, debut, fin, type: str, note: str, signature: str) -> Reservation:
+    """
+    Réserve [debut, fin) en une tentative d'insertion : le chevauchement est refusé par
+    la base (voir services/availability.py). Si le conflit vient d'une réservation
+    échue pas encore balayée, elle est libérée et l'insertion retentée une fois.
+    """
     if debut >= fin:
         raise ValueError("Créneau invalide (début >= fin)")
 
     with db_transaction.atomic():
-        car = Voiture.objects.select_for_update().get(id=voiture_id, est_vendue=False)
+        # Verrou sur la voiture jusqu'au commit, qu'elle soit déjà réservée ou non :
+        # sérialise avec les demandes d'achat et les annulations (qui la libéreraient).
+        if not counters.mark_reserved(voiture_id):
+            raise Voiture.DoesNotExist("Voiture introuvable ou déjà vendue")
 
         # Conflits avec transactions d'achat
-        if car.est_reservee:
-            raise ValueError("Cette voiture est déjà réservée")
-
-        if Reservation.overlaps(voiture_id=car.id, start=debut, end=fin):
-            raise ValueError("Ce créneau est indisponible")
-
-        res = Reservation.objects.create(
-            voiture=car,
-            client=client,
-            type=type,
-            debut=debut,
-            fin=fin,
-            note=note,
-            signature=signature,
-        )
-
-        car.est_reservee = True
-        car.save(update_fields=["est_reservee"])
-
-    return res
+        if Transaction.objects.filter(voiture_id=voiture_id, statut="en_attente").exists():
+            raise ValueError("Cette voiture fait l'objet d'une demande d'achat")
+
+        for attempt in range(2):
+            try:
+                with db_transaction.atomic():
+                    return Reservation.objects.create(
+                        voiture_id=voiture_id,
+                        client=client,
+                        type=type,
+                        debut=debut,
+                        fin=fin,
+                        note=note,
+                        signature=signature,
+                    )
+            except IntegrityError:
+                if attempt or not availability.release_expired_overlaps(voiture_id, debut, fin):
+                    raise ValueError("Ce créneau est indisponible") from None
 
 
 def update_status(*, reservation_id: int, user, new_status: str) -> Reservation:
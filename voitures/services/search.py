@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import unicodedata
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, QuerySet, Value
+from django.db.models.expressions import RawSQL
+
+from voitures.models import Voiture
+
+MAX_TERMS = 8
+FTS_TABLE = "voitures_voiture_fts"
+PG_INDEX = "voiture_search_gin"
+
+_fts_ready: dict[str, bool] = {}
+
+
+def fold_text(value: str) -> str:
+    """Minuscules, sans accents, ponctuation remplacée par des espaces (même pliage que `_normalize_key`)."""
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    value = "".join(ch if ch.isalnum() else " " for ch in value.lower())
+    return " ".join(value.split())
+
+
+def compose_document(*parts: str) -> str:
+    """Document de recherche : concaténation pliée des champs indexés."""
+    return fold_text(" ".join(p for p in parts if p))
+
+
+def build_search_document(voiture: Voiture) -> str:
+    modele = voiture.modele
+    return compose_document(
+        modele.marque.nom,
+        modele.nom,
+        voiture.get_couleur_display(),
+        modele.get_type_carburant_display(),
+        modele.get_transmission_display(),
+        voiture.description,
+    )
+
+
+def refresh_documents(queryset: QuerySet, *, batch_size: int = 500) -> int:
+    """Recalcule `search_document` (ex: après renommage d'une marque ou d'un modèle)."""
+    updated = 0
+    batch: list[Voiture] = []
+    for voiture in queryset.select_related("modele__marque").order_by().iterator(chunk_size=batch_size):
+        document = build_search_document(voiture)
+        if document != voiture.search_document:
+            voiture.search_document = document
+            batch.append(voiture)
+        if len(batch) >= batch_size:
+            updated += Voiture.objects.bulk_update(batch, ["search_document"])
+            batch = []
+    if batch:
+        updated += Voiture.objects.bulk_update(batch, ["search_document"])
+    return updated
+
+
+def search_terms(q: str) -> list[str]:
+    terms: list[str] = []
+    for term in fold_text(q).split():
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+
+def install_search_backend(connection) -> None:
+    """
+    Crée l'index plein texte propre au moteur (idempotent) :
+    - PostgreSQL : index GIN sur to_tsvector('simple', search_document) ;
+    - SQLite : table FTS5 « external content » + triggers de synchronisation.
+    Les triggers SQLite disparaissent quand Django reconstruit la table, d'où l'appel
+    après chaque migrate (signal post_migrate).
+    """
+    table = Voiture._meta.db_table
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON {table} "
+                "USING GIN (to_tsvector('simple', search_document))"
+            )
+        return
+
+    if connection.vendor != "sqlite":
+        return
+
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"search_document, content='{table}', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document); END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) "
+        "VALUES ('delete', old.id, old.search_document); END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_document ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) "
+        "VALUES ('delete', old.id, old.search_document); "
+        f"INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document); END",
+    ]
+    try:
+        with connection.cursor() as cursor:
+            created = FTS_TABLE not in connection.introspection.table_names(cursor)
+            for sql in statements:
+                cursor.execute(sql)
+            if created:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    except Exception:
+        # SQLite compilé sans FTS5 : la recherche retombe sur search_document LIKE.
+        _fts_ready[connection.alias] = False
+        return
+    _fts_ready[connection.alias] = True
+
+
+def rebuild_fts(connection) -> None:
+    if connection.vendor == "sqlite" and _sqlite_fts_available(connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _sqlite_fts_available(connection) -> bool:
+    if connection.alias not in _fts_ready:
+        with connection.cursor() as cursor:
+            _fts_ready[connection.alias] = FTS_TABLE in connection.introspection.table_names(cursor)
+    return _fts_ready[connection.alias]
+
+
+def apply_search(queryset: QuerySet, q: str) -> QuerySet:
+    """
+    Filtre `queryset` sur les termes de `q` (préfixes, tous requis) et annote
+    `search_rank` (plus grand = plus pertinent).
+    """
+    terms = search_terms(q)
+    if not terms:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    connection = connections[queryset.db]
+    table = Voiture._meta.db_table
+
+    if connection.vendor == "postgresql":
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        vector = f"to_tsvector('simple', {table}.search_document)"
+        return queryset.filter(
+            RawSQL(f"{vector} @@ to_tsquery('simple', %s)", (tsquery,), output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(
+                f"ts_rank({vector}, to_tsquery('simple', %s))", (tsquery,), output_field=FloatField()
+            )
+        )
+
+    if connection.vendor == "sqlite" and _sqlite_fts_available(connection):
+        match = " ".join(f'"{term}"*' for term in terms)
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,))
+        ).annotate(
+            search_rank=RawSQL(
+                f"(SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id)",
+                (match,),
+                output_field=FloatField(),
+            )
+        )
+
+    for term in terms:
+        queryset = queryset.filter(search_document__contains=term)
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
@@ -1,6 +1,11 @@
 from __future__ import annotations
 
+import io
+import zlib
 from dataclasses import dataclass
+from typing import BinaryIO, Iterable, Iterator
+
+from voitures.services.pdf_font_metrics import WIDTHS
 
 
 def _pdf_escape(text: str) -> str:
@@ -94,99 +99,222 @@ class PdfCanvas:
         self._ops.append(b"ET")
 
 
+# Noms de ressources utilisés par les documents de l'application (voir receipts.RECEIPT_FONTS).
+_FONT_ALIASES = {"F1": "Helvetica", "F2": "Helvetica-Bold", "F3": "Courier"}
+
+
+def _font_widths(font: str) -> tuple[int, ...]:
+    base = _FONT_ALIASES.get(font.upper(), font)
+    return WIDTHS.get(base) or WIDTHS["Helvetica"]
+
+
+def _encode(text: str) -> bytes:
+    # Même encodage que _pdf_string : un octet par caractère affiché.
+    return (text or "").replace("\r", "").encode("cp1252", errors="replace")
+
+
 def estimate_text_width(text: str, *, font: str, size: float) -> float:
     """
-    Estimation simple (sans métriques). Suffisant pour aligner proprement à droite/centrer.
+    Largeur du texte en points, d'après les chasses AFM de la police (nom de ressource
+    F1/F2/F3 ou BaseFont). Pas de crénage, comme le rendu Tj.
     """
     if not text:
         return 0.0
-    if font.upper() in {"F3", "COURIER"}:
-        return len(text) * 0.6 * size
-
-    narrow = set(" .,:;!|iIl1'’`")
-    wide = set("MW@#%&")
-    total = 0.0
-    for ch in text:
-        if ch in narrow:
-            total += 0.28
-        elif ch in wide:
-            total += 0.78
-        elif ch == " ":
-            total += 0.28
-        else:
-            total += 0.56
-    return total * size
+    widths = _font_widths(font)
+    return sum(map(widths.__getitem__, _encode(text))) * size / 1000.0
+
+
+def truncate_to_width(text: str, max_width: float, *, font: str, size: float, ellipsis: str = "…") -> str:
+    """Tronque `text` (avec `ellipsis`) pour qu'il tienne dans `max_width` points."""
+    text = (text or "").replace("\r", "").strip()
+    if size <= 0 or estimate_text_width(text, font=font, size=size) <= max_width:
+        return text
+    budget = (max_width - estimate_text_width(ellipsis, font=font, size=size)) * 1000.0 / size
+    widths = _font_widths(font)
+    used = 0
+    cut = 0
+    for code in _encode(text):
+        used += widths[code]
+        if used > budget:
+            break
+        cut += 1
+    return text[:cut].rstrip() + ellipsis
+
+
+def wrap_text(text: str, max_width: float, *, font: str, size: float) -> list[str]:
+    """Découpe `text` en lignes de `max_width` points au plus (coupure aux espaces)."""
+    lines: list[str] = []
+    current = ""
+    for word in (text or "").split():
+        candidate = f"{current} {word}" if current else word
+        if estimate_text_width(candidate, font=font, size=size) <= max_width:
+            current = candidate
+            continue
+        if current:
+            lines.append(current)
+        current = truncate_to_width(word, max_width, font=font, size=size)
+    if current:
+        lines.append(current)
+    return lines
 
 
-def build_one_page_pdf(*, content_stream: bytes, filename: str, fonts: dict[str, str]) -> PdfDocument:
+class PdfWriter:
     """
-    Construit un PDF 1 page avec un content stream et des polices Type1 (Base14).
-    `fonts` mappe un nom de ressource (ex: F1) vers un BaseFont (ex: Helvetica).
+    Écriture d'un PDF multi-pages au fil de l'eau dans `sink` (fichier, réponse HTTP, pipe ;
+    pas besoin qu'il soit positionnable). Chaque page est écrite dès son ajout ; seuls les
+    offsets de la table xref et les numéros des pages restent en mémoire.
+
+    Les content streams sont compressés (FlateDecode) si `compress` est vrai.
     """
-    objects: list[bytes] = []
-
-    def add(obj: bytes) -> int:
-        objects.append(obj)
-        return len(objects)
-
-    # Réservation des 3 premiers objets (Catalog / Pages / Page)
-    # Les références seront insérées après création des fonts/contents.
-    add(b"<< /Type /Catalog /Pages 2 0 R >>")  # 1
-    add(b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>")  # 2
-    add(b"")  # 3 placeholder /Page
-
-    font_obj_nums: dict[str, int] = {}
-    for res_name, base_font in fonts.items():
-        font_obj_nums[res_name] = add(
-            (
-                f"<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} "
-                f"/Encoding /WinAnsiEncoding >>"
-            ).encode("ascii")
+
+    def __init__(
+        self,
+        sink: BinaryIO,
+        *,
+        fonts: dict[str, str],
+        compress: bool = False,
+        media_box: tuple[float, float] = (612.0, 792.0),
+    ) -> None:
+        self._sink = sink
+        self._compress = compress
+        self._written = 0
+        self._offsets: list[int] = [0]
+        self._kids: list[int] = []
+        self._closed = False
+        width, height = media_box
+
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        # 1 = Catalog, 2 = Pages : l'arbre des pages est écrit à la fermeture.
+        self._add_object(b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._offsets.append(0)
+        font_entries = []
+        for res_name, base_font in fonts.items():
+            num = self._add_object(
+                (
+                    f"<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} "
+                    f"/Encoding /WinAnsiEncoding >>"
+                ).encode("ascii")
+            )
+            font_entries.append(f"/{res_name} {num} 0 R")
+        self._page_dict = (
+            f"/Type /Page /Parent 2 0 R /MediaBox [0 0 {_fmt_num(width)} {_fmt_num(height)}] "
+            f"/Resources << /Font << {' '.join(font_entries)} >> >>"
         )
 
-    contents_obj_num = add(b"")  # placeholder; stream géré à l'écriture
-
-    # Page object (références connues maintenant)
-    font_entries = " ".join(f"/{k} {v} 0 R" for k, v in font_obj_nums.items())
-    page_obj = (
-        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
-        f"/Resources << /Font << {font_entries} >> >> "
-        f"/Contents {contents_obj_num} 0 R >>"
-    ).encode("ascii")
-    objects[2] = page_obj
-
-    pdf_parts: list[bytes] = [b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"]
-    offsets: list[int] = [0]
-
-    for index, obj in enumerate(objects, start=1):
-        offsets.append(sum(len(p) for p in pdf_parts))
-        if index == contents_obj_num:
-            pdf_parts.append(f"{index} 0 obj\n".encode("ascii"))
-            pdf_parts.append(b"<< /Length " + str(len(content_stream)).encode("ascii") + b" >>\n")
-            pdf_parts.append(b"stream\n")
-            pdf_parts.append(content_stream)
-            if not content_stream.endswith(b"\n"):
-                pdf_parts.append(b"\n")
-            pdf_parts.append(b"endstream\nendobj\n")
-            continue
+    @property
+    def page_count(self) -> int:
+        return len(self._kids)
+
+    @property
+    def size(self) -> int:
+        """Octets écrits jusqu'ici."""
+        return self._written
+
+    def _write(self, data: bytes) -> None:
+        self._sink.write(data)
+        self._written += len(data)
+
+    def _write_object(self, num: int, body: bytes) -> None:
+        self._offsets[num] = self._written
+        self._write(f"{num} 0 obj\n".encode("ascii") + body + b"\nendobj\n")
+
+    def _add_object(self, body: bytes) -> int:
+        self._offsets.append(0)
+        num = len(self._offsets) - 1
+        self._write_object(num, body)
+        return num
+
+    def add_page(self, content_stream: bytes) -> int:
+        """Écrit une page (content stream brut) ; retourne son numéro (à partir de 1)."""
+        if self._closed:
+            raise ValueError("PdfWriter déjà fermé")
+        if self._compress:
+            data = zlib.compress(content_stream, 6)
+            header = f"<< /Length {len(data)} /Filter /FlateDecode >>"
+        else:
+            data = content_stream if content_stream.endswith(b"\n") else content_stream + b"\n"
+            header = f"<< /Length {len(data)} >>"
+        contents = self._add_object(header.encode("ascii") + b"\nstream\n" + data + b"\nendstream")
+        page = self._add_object(f"<< {self._page_dict} /Contents {contents} 0 R >>".encode("ascii"))
+        self._kids.append(page)
+        return len(self._kids)
+
+    def close(self) -> None:
+        """Écrit l'arbre des pages, la table xref et le trailer. Idempotent."""
+        if self._closed:
+            return
+        self._closed = True
+        kids = " ".join(f"{num} 0 R" for num in self._kids)
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._kids)} >>".encode("ascii"))
+
+        xref_offset = self._written
+        size = len(self._offsets)
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        lines.extend(f"{offset:010d} 00000 n \n" for offset in self._offsets[1:])
+        lines.append(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        self._write("".join(lines).encode("ascii"))
+
+    def __enter__(self) -> "PdfWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+
+
+class ChunkSink:
+    """
+    Fichier en écriture seule vidé à mesure (PdfWriter, zipfile...) : `drain()` rend ce
+    qui a été écrit depuis le dernier appel, pour produire une réponse par morceaux.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
 
-        pdf_parts.append(f"{index} 0 obj\n".encode("ascii"))
-        pdf_parts.append(obj)
-        pdf_parts.append(b"\nendobj\n")
-
-    xref_offset = sum(len(p) for p in pdf_parts)
-    pdf_parts.append(b"xref\n")
-    pdf_parts.append(f"0 {len(objects) + 1}\n".encode("ascii"))
-    pdf_parts.append(b"0000000000 65535 f \n")
-    for off in offsets[1:]:
-        pdf_parts.append(f"{off:010d} 00000 n \n".encode("ascii"))
-    pdf_parts.append(b"trailer\n")
-    pdf_parts.append(f"<< /Size {len(objects) + 1} /Root 1 0 R >>\n".encode("ascii"))
-    pdf_parts.append(b"startxref\n")
-    pdf_parts.append(f"{xref_offset}\n".encode("ascii"))
-    pdf_parts.append(b"%%EOF\n")
-
-    return PdfDocument(content=b"".join(pdf_parts), filename=filename)
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def build_one_page_pdf(
+    *, content_stream: bytes, filename: str, fonts: dict[str, str], compress: bool = False
+) -> PdfDocument:
+    """
+    Construit un PDF 1 page avec un content stream et des polices Type1 (Base14).
+    `fonts` mappe un nom de ressource (ex: F1) vers un BaseFont (ex: Helvetica).
+    """
+    sink = io.BytesIO()
+    with PdfWriter(sink, fonts=fonts, compress=compress) as writer:
+        writer.add_page(content_stream)
+    return PdfDocument(content=sink.getvalue(), filename=filename)
+
+
+def iter_pdf_pages(pages: Iterable[bytes], *, fonts: dict[str, str], compress: bool = False) -> Iterator[bytes]:
+    """PDF multi-pages produit par morceaux (un par page) : pour une réponse en streaming."""
+    sink = ChunkSink()
+    with PdfWriter(sink, fonts=fonts, compress=compress) as writer:
+        yield sink.drain()
+        for content_stream in pages:
+            writer.add_page(content_stream)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def write_pages(sink: BinaryIO, pages: Iterable[bytes], *, fonts: dict[str, str], compress: bool = False) -> int:
+    """Écrit un PDF multi-pages dans un fichier ; retourne le nombre de pages."""
+    with PdfWriter(sink, fonts=fonts, compress=compress) as writer:
+        for content_stream in pages:
+            writer.add_page(content_stream)
+    return writer.page_count
 
 
 def build_simple_text_pdf(*, title: str, lines: list[str], filename: str) -> PdfDocument:
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import logging
 from dataclasses import dataclass
 from datetime import timedelta
 
@@ -10,6 +11,10 @@ from django.db.models import Q
 from django.utils import timezone
 
 from voitures.models import Transaction, Voiture
+from voitures.services import counters, receipt_store
+from voitures.services.deadlines import expire_due
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass(frozen=True)
@@ -33,23 +38,22 @@ def get_reservation_ttl_hours() -> int:
 
 def expire_stale_purchase_requests(*, ttl_hours: int | None = None) -> int:
     """
-    Annule automatiquement les transactions 'en_attente' trop anciennes et libère
-    les voitures réservées qui n'ont plus de demande active.
+    Annule automatiquement les transactions 'en_attente' échues (`expires_at` dépassé)
+    et libère les voitures réservées qui n'ont plus de demande active.
+    `ttl_hours` force un délai calculé depuis `date_transaction` (usage manuel).
     """
-    ttl = ttl_hours if ttl_hours is not None else get_reservation_ttl_hours()
-    cutoff = timezone.now() - timedelta(hours=ttl)
-
-    stale = Transaction.objects.filter(statut="en_attente", date_transaction__lt=cutoff)
-    if not stale.exists():
-        return 0
+    if ttl_hours is None:
+        due = Transaction.objects.filter(statut="en_attente", expires_at__lte=timezone.now())
+    else:
+        cutoff = timezone.now() - timedelta(hours=max(int(ttl_hours), 1))
+        due = Transaction.objects.filter(statut="en_attente", date_transaction__lt=cutoff)
 
-    car_ids = list(stale.values_list("voiture_id", flat=True).distinct())
-    updated = stale.update(statut="annulee")
+    updated, car_ids = expire_due(due, new_status="annulee")
 
     if car_ids:
-        Voiture.objects.filter(id__in=car_ids, est_reservee=True).exclude(
-            transaction__statut="en_attente"
-        ).update(est_reservee=False)
+        counters.unreserve(
+            Voiture.objects.filter(id__in=car_ids).exclude(transaction__statut="en_attente")
+        )
 
     return updated
 
@@ -64,8 +68,6 @@ def get_pending_transaction_for_user(*, voiture: Voiture, user: User) -> Transac
 
 
 def create_purchase_request(*, voiture_id: int, buyer: User) -> PurchaseRequestResult:
-    expire_stale_purchase_requests()
-
     with db_transaction.atomic():
         locked_voiture = Voiture.objects.select_for_update().select_related("vendeur").get(id=voiture_id)
 
@@ -96,8 +98,6 @@ def create_purchase_request(*, voiture_id: int, buyer: User) -> PurchaseRequestR
 
 
 def cancel_purchase_request(*, transaction_id: int, buyer: User) -> Transaction:
-    expire_stale_purchase_requests()
-
     trx = Transaction.objects.select_related("voiture", "vendeur").get(
         id=transaction_id, acheteur=buyer, statut="en_attente"
     )
@@ -114,8 +114,6 @@ def cancel_purchase_request(*, transaction_id: int, buyer: User) -> Transaction:
 
 
 def refuse_purchase_request(*, transaction_id: int, seller: User) -> Transaction:
-    expire_stale_purchase_requests()
-
     trx = Transaction.objects.select_related("voiture", "acheteur").get(
         id=transaction_id, vendeur=seller, statut="en_attente"
     )
@@ -132,8 +130,6 @@ def refuse_purchase_request(*, transaction_id: int, seller: User) -> Transaction
 
 
 def confirm_sale(*, transaction_id: int, seller: User) -> Transaction:
-    expire_stale_purchase_requests()
-
     trx = Transaction.objects.select_related("voiture", "acheteur").get(
         id=transaction_id, vendeur=seller, statut="en_attente"
     )
@@ -149,7 +145,15 @@ def confirm_sale(*, transaction_id: int, seller: User) -> Transaction:
         Transaction.objects.filter(voiture=locked, statut="en_attente").exclude(id=trx.id).update(
             statut="annulee"
         )
+        # Reçus définitifs générés dès la validation : le premier téléchargement sort du cache.
+        db_transaction.on_commit(lambda: _warm_receipts(trx.id))
 
     trx.refresh_from_db()
     return trx
 
+
+def _warm_receipts(transaction_id: int) -> None:
+    try:
+        receipt_store.warm(transaction_id)
+    except Exception:
+        logger.exception("Préchauffage des reçus de la transaction %s impossible", transaction_id)
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from voitures.models import Voiture
+from voitures.services import caching
+
+logger = logging.getLogger(__name__)
+
+_BOT_RE = re.compile(
+    r"bot|crawl|spider|slurp|preview|headless|lighthouse|facebookexternalhit|"
+    r"curl|wget|python-requests|httpclient|scrapy",
+    re.IGNORECASE,
+)
+
+_lock = threading.Lock()
+_buffer: Counter[int] = Counter()
+_flusher: threading.Thread | None = None
+
+
+def _setting_int(name: str, default: int) -> int:
+    try:
+        return max(int(getattr(settings, name, default)), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+def is_bot(request) -> bool:
+    user_agent = request.META.get("HTTP_USER_AGENT", "") or ""
+    return not user_agent.strip() or bool(_BOT_RE.search(user_agent))
+
+
+def _visitor_key(request) -> str:
+    session = getattr(request, "session", None)
+    session_key = getattr(session, "session_key", None) if session is not None else None
+    if session_key:
+        raw = f"s:{session_key}"
+    else:
+        raw = f"a:{request.META.get('REMOTE_ADDR', '')}|{request.META.get('HTTP_USER_AGENT', '')}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def record_view(request, voiture_id: int) -> bool:
+    """
+    Comptabilise une vue en mémoire (aucune écriture en base).
+    Ignore les robots et un même visiteur pendant VIEW_COUNTER_DEDUP_SECONDS.
+    """
+    if is_bot(request):
+        return False
+
+    dedup_seconds = _setting_int("VIEW_COUNTER_DEDUP_SECONDS", 1800)
+    dedup_key = f"vue:{voiture_id}:{_visitor_key(request)}"
+    if dedup_seconds and not caching.hot_cache().add(dedup_key, 1, dedup_seconds):
+        return False
+
+    with _lock:
+        _buffer[voiture_id] += 1
+    if _setting_int("VIEW_COUNTER_FLUSH_SECONDS", 30):
+        _ensure_flusher()
+    else:
+        # Sans thread d'écriture : la vue est écrite tout de suite.
+        flush_views()
+    return True
+
+
+def pending_views() -> dict[int, int]:
+    with _lock:
+        return dict(_buffer)
+
+
+def flush_views() -> int:
+    """
+    Écrit les vues accumulées : un `UPDATE ... SET vue = vue + n` par valeur de n.
+    Retourne le nombre de vues écrites ; en cas d'erreur elles sont remises en attente.
+    """
+    with _lock:
+        if not _buffer:
+            return 0
+        pending = dict(_buffer)
+        _buffer.clear()
+
+    by_increment: dict[int, list[int]] = defaultdict(list)
+    for voiture_id, hits in pending.items():
+        by_increment[hits].append(voiture_id)
+
+    try:
+        for hits, ids in by_increment.items():
+            Voiture.objects.filter(id__in=ids).update(vue=F("vue") + hits)
+    except Exception:
+        with _lock:
+            _buffer.update(pending)
+        raise
+    return sum(pending.values())
+
+
+def _flush_loop(interval: int) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            flush_views()
+        except Exception:
+            logger.exception("Échec de l'écriture des compteurs de vues")
+        finally:
+            connection.close()
+
+
+def _flush_at_exit() -> None:
+    try:
+        flush_views()
+    except Exception:
+        logger.exception("Échec de l'écriture des compteurs de vues à l'arrêt")
+
+
+# Quel que soit l'intervalle : ce qui reste dans le tampon est écrit à l'arrêt du processus.
+atexit.register(_flush_at_exit)
+
+
+def _ensure_flusher() -> None:
+    """Démarre (une fois par processus) le thread qui vide le tampon périodiquement."""
+    global _flusher
+
+    interval = _setting_int("VIEW_COUNTER_FLUSH_SECONDS", 30)
+    if not interval or _flusher is not None:
+        return
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(
+            target=_flush_loop, args=(interval,), name="view-counter-flush", daemon=True
+        )
+        _flusher.start()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import logging
+
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import F
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from voitures.models import Avis, Favori, Marque, Modele, Reservation, Voiture
+from voitures.services import availability, caching, counters, homepage, logo_sprite, search
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Favori)
+def favori_created(sender, instance: Favori, created: bool, **kwargs):
+    if created:
+        Voiture.objects.filter(id=instance.voiture_id).update(nb_favoris=F("nb_favoris") + 1)
+
+
+@receiver(post_delete, sender=Favori)
+def favori_deleted(sender, instance: Favori, **kwargs):
+    Voiture.objects.filter(id=instance.voiture_id, nb_favoris__gt=0).update(
+        nb_favoris=F("nb_favoris") - 1
+    )
+
+
+def _search_fields_changed(update_fields, fields: set[str]) -> bool:
+    return update_fields is None or bool(fields & set(update_fields))
+
+
+@receiver(post_save, sender=Marque)
+def marque_saved(sender, instance: Marque, created: bool, update_fields=None, **kwargs):
+    homepage.invalidate()
+    if not created and _search_fields_changed(update_fields, {"nom"}):
+        search.refresh_documents(Voiture.objects.filter(modele__marque=instance))
+
+
+@receiver(post_save, sender=Modele)
+def modele_saved(sender, instance: Modele, created: bool, update_fields=None, **kwargs):
+    homepage.invalidate()
+    old_marque_id = getattr(instance, "_marque_initiale", None)
+    if not created and old_marque_id is not None and old_marque_id != instance.marque_id:
+        counters.move_modele(instance.id, old_marque_id, instance.marque_id)
+    instance._marque_initiale = instance.marque_id
+    if not created and _search_fields_changed(
+        update_fields, {"nom", "marque", "type_carburant", "transmission"}
+    ):
+        search.refresh_documents(Voiture.objects.filter(modele=instance))
+
+
+@receiver(pre_save, sender=Voiture)
+def voiture_pre_save(sender, instance: Voiture, raw: bool = False, **kwargs):
+    # Instance construite hors from_db (pk connu) : état de référence lu en base.
+    if raw or instance.pk is None or hasattr(instance, "_compteurs_initial"):
+        return
+    instance._compteurs_initial = (
+        Voiture.objects.filter(pk=instance.pk).values_list(*counters.TRACKED_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=Voiture)
+def voiture_counters_saved(sender, instance: Voiture, created: bool, raw: bool = False, update_fields=None, **kwargs):
+    if raw:
+        return
+    before = None if created else getattr(instance, "_compteurs_initial", None)
+    if not created and before is None:
+        return
+    after = tuple(
+        getattr(instance, attname)
+        if before is None or update_fields is None
+        or attname in update_fields or attname.removesuffix("_id") in update_fields
+        else before[i]
+        for i, attname in enumerate(counters.TRACKED_FIELDS)
+    )
+    counters.record_change(counters.etat(*before) if before else None, counters.etat(*after))
+    instance._compteurs_initial = after
+
+
+@receiver(pre_delete, sender=Voiture)
+def voiture_pre_delete(sender, instance: Voiture, **kwargs):
+    # L'instance supprimée peut être périmée (vendue entre-temps) : état relu en base.
+    instance._compteurs_initial = (
+        Voiture.objects.filter(pk=instance.pk).values_list(*counters.TRACKED_FIELDS).first()
+    )
+
+
+@receiver(post_delete, sender=Voiture)
+def voiture_counters_deleted(sender, instance: Voiture, **kwargs):
+    before = getattr(instance, "_compteurs_initial", None)
+    if before is not None:
+        counters.record_change(counters.etat(*before), None)
+
+
+@receiver(post_save, sender=Voiture)
+@receiver(post_delete, sender=Voiture)
+@receiver(post_delete, sender=Marque)
+@receiver(post_delete, sender=Modele)
+def invalidate_homepage(sender, **kwargs):
+    # Création, vente, réservation ou suppression d'annonce : l'accueil est à reconstruire.
+    homepage.invalidate()
+
+
+@receiver(post_save, sender=Marque)
+@receiver(post_delete, sender=Marque)
+@receiver(post_save, sender=Modele)
+@receiver(post_delete, sender=Modele)
+@receiver(post_save, sender=Voiture)
+@receiver(post_delete, sender=Voiture)
+@receiver(post_save, sender=Avis)
+@receiver(post_delete, sender=Avis)
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def bump_cache_version(sender, **kwargs):
+    caching.bump(sender)
+
+
+@receiver(post_save, sender=Marque)
+@receiver(post_delete, sender=Marque)
+def rebuild_logo_sprite(sender, **kwargs):
+    # Nom ou logo changé : nouvelle planche, l'actuelle reste servie en attendant.
+    logo_sprite.schedule_build_on_commit()
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def reservation_changed(sender, instance: Reservation, **kwargs):
+    # Calendrier de disponibilités (ETag/Last-Modified) de la voiture à invalider.
+    availability.touch([instance.voiture_id])
+
+
+SEARCH_MIGRATION = ("voitures", "0011_voiture_search_document")
+OVERLAP_GUARD_MIGRATION = ("voitures", "0016_reservation_overlap_guard")
+
+
+@receiver(post_migrate)
+def install_db_backends(sender, app_config=None, using="default", **kwargs):
+    # Sous SQLite, une reconstruction de table par une migration supprime les triggers
+    # (index FTS, garde anti-chevauchement des réservations). Seulement si la migration
+    # qui les a créés est appliquée : un migrate vers une version antérieure les a retirés.
+    if app_config is None or app_config.label != "voitures":
+        return
+    connection = connections[using]
+    applied = MigrationRecorder(connection).applied_migrations()
+    if SEARCH_MIGRATION in applied:
+        search.install_search_backend(connection)
+    if OVERLAP_GUARD_MIGRATION in applied and not availability.install_availability_backend(connection):
+        logger.warning(
+            "Garde anti-chevauchement des réservations non installée : des réservations actives "
+            "se chevauchent (python manage.py cancel_overlapping_reservations --dry-run)."
+        )
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.html import format_html
+
+from voitures.services import brand_svg, logo_sprite
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def _pregenerated(path: str) -> bool:
+    # Fixé au déploiement (collectstatic) : vérifié une fois par processus.
+    return staticfiles_storage.exists(path)
+
+
+@register.simple_tag
+def marque_logo_svg_url(marque) -> str:
+    """
+    URL versionnée du logo SVG de repli : fichier statique pré-généré si disponible
+    (servi par whitenoise), sinon la vue `marque_logo_svg_versioned`.
+    """
+    digest = brand_svg.digest(marque.nom)
+    path = brand_svg.static_path(digest)
+    if _pregenerated(path):
+        return static(path)
+    return reverse("marque_logo_svg_versioned", args=[marque.id, digest])
+
+
+@register.simple_tag(takes_context=True)
+def marque_logo_sprite(context, marque, scale=1, fallback_url=None):
+    """
+    Logo d'une marque depuis la planche (une seule image pour toute la page, voir
+    `logos_sprite_css`). Marque sans logo : SVG de repli versionné. Planche pas encore
+    composée : image `fallback_url` (par défaut ce même SVG). Le manifeste vient du
+    contexte (`logo_sprite`, lu une fois par page), à défaut du cache.
+    """
+    current = context.get("logo_sprite")
+    if current is None:
+        current = logo_sprite.published()
+    if current and str(marque.id) in current["logos"]:
+        return format_html(
+            '<span class="brand-sprite brand-sprite-{}" style="--brand-sprite-scale:{}" role="img" aria-label="{}"></span>',
+            marque.id,
+            scale,
+            marque.nom,
+        )
+    if (current and f"marque-{marque.id}" in current["symbols"]) or not fallback_url:
+        # Marque de la planche sans logo image : SVG de repli, immutable. Une marque plus
+        # récente que la planche garde `fallback_url` jusqu'à la suivante.
+        fallback_url = marque_logo_svg_url(marque)
+    return format_html(
+        '<img src="{}" alt="{}" height="{}" loading="lazy">',
+        fallback_url,
+        marque.nom,
+        int(logo_sprite.TILE_H * float(scale)),
+    )
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from django import template
+
+from voitures.services import image_variants
+
+register = template.Library()
+
+
+@register.filter(name="srcset")
+def srcset(image) -> str:
+    """
+    srcset d'une photo d'annonce (ImageField ou nom de fichier) aux largeurs
+    320/640/1280 : `<img src="{{ f.url }}" srcset="{{ f|srcset }}" sizes="…">`.
+    Vide pour une photo hors du dossier des annonces : le navigateur garde `src`.
+    """
+    name = getattr(image, "name", image) or ""
+    return image_variants.srcset(str(name))
@@ -1,10 +1,96 @@
 from __future__ import annotations
 
-from django.contrib.auth.models import User
-from django.test import TestCase
+from datetime import timedelta
+import json
+import time
+import zlib
+import zipfile
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Avis,
+    Favori,
+    Marque,
+    Modele,
+    Notification,
+    OutboxNotification,
+    Reservation,
+    Transaction,
+    Voiture,
+)
+from .services import (
+    availability,
+    brand_svg,
+    caching,
+    counters,
+    expiry,
+    facets,
+    homepage,
+    image_variants,
+    keyset,
+    logo_catalog,
+    logo_sprite,
+    media_files,
+    notifications,
+    outbox,
+    photo_batch,
+    receipt_export,
+    receipt_store,
+    reservations,
+    search,
+    simple_pdf,
+    transactions,
+    view_counter,
+)
+
+# Mémoire locale pour les deux niveaux de cache, quel que soit le lanceur (manage.py test,
+# pytest...) : jamais le cache fichiers ni le Redis de l'environnement.
+TEST_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "vente-voitures-tests-shared",
+        "TIMEOUT": 300,
+    },
+    "local": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "vente-voitures-tests-local",
+        "TIMEOUT": 60,
+        "OPTIONS": {"MAX_ENTRIES": 2000},
+    },
+}
+_test_caches = override_settings(CACHES=TEST_CACHES)
+
+
+def setUpModule():
+    _test_caches.enable()
+
 
-from .models import Marque, Modele, Transaction, Voiture
+def tearDownModule():
+    _test_caches.disable()
+
+
+# Les tests qui rendent des pages n'ont pas de manifest collectstatic.
+PLAIN_STATIC_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+def clear_caches():
+    # Les deux niveaux : le cache local survit aux rollbacks de la base entre tests.
+    cache.clear()
+    caches["local"].clear()
 
 
 class TransactionFlowTests(TestCase):
@@ -69,6 +155,1317 @@ class TransactionFlowTests(TestCase):
         self.assertEqual(resp.status_code, 405)
 
 
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class ExpiryWorkerTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user(username="seller", password="Seller123!")
+        buyer = User.objects.create_user(username="buyer", password="Buyer123!")
+        marque = Marque.objects.create(nom="Peugeot", pays="France", date_creation="2000-01-01")
+        modele = Modele.objects.create(marque=marque, nom="208", annee_lancement=2012)
+        self.voiture = Voiture.objects.create(
+            modele=modele,
+            prix="8000.00",
+            annee=2019,
+            couleur="bleu",
+            etat="occasion",
+            description="Test",
+            vendeur=seller,
+            est_reservee=True,
+        )
+        self.trx = Transaction.objects.create(
+            voiture=self.voiture, acheteur=buyer, vendeur=seller, prix_final=self.voiture.prix
+        )
+        Transaction.objects.filter(id=self.trx.id).update(
+            date_transaction=timezone.now() - timedelta(hours=48),
+            expires_at=timezone.now() - timedelta(hours=24),
+        )
+        expiry.reset_sweep_guard()
+
+    def test_public_pages_do_not_expire_transactions(self):
+        self.client.get(reverse("accueil"))
+        self.client.get(reverse("liste_voitures"))
+        self.trx.refresh_from_db()
+        self.assertEqual(self.trx.statut, "en_attente")
+
+    def test_worker_once_expires_stale_requests(self):
+        call_command("run_expiry_worker", "--once", stdout=StringIO())
+        self.trx.refresh_from_db()
+        self.voiture.refresh_from_db()
+        self.assertEqual(self.trx.statut, "annulee")
+        self.assertFalse(self.voiture.est_reservee)
+
+    def test_pending_transaction_gets_deadline(self):
+        trx = Transaction.objects.create(
+            voiture=self.voiture,
+            acheteur=self.trx.acheteur,
+            vendeur=self.trx.vendeur,
+            prix_final=self.voiture.prix,
+        )
+        self.assertIsNotNone(trx.expires_at)
+        self.assertGreater(trx.expires_at, timezone.now())
+        self.assertEqual(transactions.expire_stale_purchase_requests(), 1)
+        trx.refresh_from_db()
+        self.assertEqual(trx.statut, "en_attente")
+
+    def test_expire_due_is_one_update_per_batch_returning_changed_cars(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from .services.deadlines import expire_due
+
+        due = Transaction.objects.filter(statut="en_attente", expires_at__lte=timezone.now())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(expire_due(due, new_status="annulee"), (1, {self.voiture.id}))
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0]["sql"].startswith("UPDATE"))
+        self.assertIn("RETURNING", queries[0]["sql"])
+        # Déjà annulée : ni modifiée ni renvoyée.
+        self.assertEqual(expire_due(due, new_status="annulee"), (0, set()))
+
+        Transaction.objects.filter(id=self.trx.id).update(statut="en_attente")
+        with mock.patch.object(connection.features, "can_return_columns_from_insert", False):
+            self.assertEqual(expire_due(due, new_status="annulee"), (1, {self.voiture.id}))
+
+    def test_sweep_guard_runs_once_per_interval(self):
+        self.assertIsNotNone(expiry.sweep_if_due(interval=3600))
+        self.assertIsNone(expiry.sweep_if_due(interval=3600))
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES, VIEW_COUNTER_FLUSH_SECONDS=3600)
+class ViewCounterTests(TestCase):
+    BROWSER_UA = "Mozilla/5.0 (X11; Linux x86_64) Firefox/120.0"
+
+    def setUp(self):
+        clear_caches()
+        view_counter.flush_views()
+        seller = User.objects.create_user(username="seller", password="Seller123!")
+        marque = Marque.objects.create(nom="Toyota", pays="Japon", date_creation="2000-01-01")
+        modele = Modele.objects.create(marque=marque, nom="Yaris", annee_lancement=2011)
+        self.voiture = Voiture.objects.create(
+            modele=modele,
+            prix="9000.00",
+            annee=2021,
+            couleur="rouge",
+            etat="occasion",
+            description="Test",
+            vendeur=seller,
+        )
+        self.url = reverse("detail_voiture", args=[self.voiture.id])
+
+    def test_detail_page_buffers_views_without_writing(self):
+        self.client.get(self.url, HTTP_USER_AGENT=self.BROWSER_UA)
+        self.client.get(self.url, HTTP_USER_AGENT=self.BROWSER_UA)
+        self.client.get(self.url, HTTP_USER_AGENT="Googlebot/2.1")
+
+        self.voiture.refresh_from_db()
+        self.assertEqual(self.voiture.vue, 0)
+        self.assertEqual(view_counter.pending_views(), {self.voiture.id: 1})
+
+        self.assertEqual(view_counter.flush_views(), 1)
+        self.voiture.refresh_from_db()
+        self.assertEqual(self.voiture.vue, 1)
+        self.assertEqual(view_counter.pending_views(), {})
+
+    @override_settings(VIEW_COUNTER_FLUSH_SECONDS=0)
+    def test_without_flush_interval_views_are_written_immediately(self):
+        self.client.get(self.url, HTTP_USER_AGENT=self.BROWSER_UA)
+        self.voiture.refresh_from_db()
+        self.assertEqual(self.voiture.vue, 1)
+        self.assertEqual(view_counter.pending_views(), {})
+
+    def test_dedup_keys_stay_out_of_the_file_cache(self):
+        with TemporaryDirectory() as cache_dir:
+            file_caches = {
+                **TEST_CACHES,
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": cache_dir,
+                },
+            }
+            with override_settings(CACHES=file_caches):
+                request = RequestFactory().get(self.url, HTTP_USER_AGENT=self.BROWSER_UA)
+                self.assertTrue(view_counter.record_view(request, self.voiture.id))
+                self.assertFalse(view_counter.record_view(request, self.voiture.id))
+                self.assertEqual(list(Path(cache_dir).iterdir()), [])
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class FavoriListingTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username="seller", password="Seller123!")
+        self.buyer = User.objects.create_user(username="buyer", password="Buyer123!")
+        marque = Marque.objects.create(nom="Citroën", pays="France", date_creation="2000-01-01")
+        modele = Modele.objects.create(marque=marque, nom="C3", annee_lancement=2009)
+        self.liked, self.other = [
+            Voiture.objects.create(
+                modele=modele,
+                prix=prix,
+                annee=2018,
+                couleur="blanc",
+                etat="occasion",
+                description="Test",
+                vendeur=self.seller,
+            )
+            for prix in ("7000.00", "7500.00")
+        ]
+
+    def test_listing_flags_user_favourites_and_counts(self):
+        fav = Favori.objects.create(utilisateur=self.buyer, voiture=self.liked)
+        self.client.force_login(self.buyer)
+        resp = self.client.get(reverse("liste_voitures"))
+        flags = {v.id: (v.est_favori, v.nb_favoris) for v in resp.context["voitures"]}
+        self.assertEqual(flags[self.liked.id], (True, 1))
+        self.assertEqual(flags[self.other.id], (False, 0))
+
+        fav.delete()
+        self.liked.refresh_from_db()
+        self.assertEqual(self.liked.nb_favoris, 0)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        seller = User.objects.create_user(username="seller", password="Seller123!")
+        citroen = Marque.objects.create(nom="Citroën", pays="France", date_creation="2000-01-01")
+        renault = Marque.objects.create(nom="Renault", pays="France", date_creation="2000-01-01")
+        self.c3 = Voiture.objects.create(
+            modele=Modele.objects.create(marque=citroen, nom="C3", annee_lancement=2009),
+            prix="7000.00",
+            annee=2018,
+            couleur="blanc",
+            etat="occasion",
+            description="Citadine économique, première main",
+            vendeur=seller,
+        )
+        self.clio = Voiture.objects.create(
+            modele=Modele.objects.create(
+                marque=renault, nom="Clio", annee_lancement=2012, type_carburant="diesel"
+            ),
+            prix="8000.00",
+            annee=2019,
+            couleur="rouge",
+            etat="occasion",
+            description="Entretien à jour",
+            vendeur=seller,
+        )
+
+    def _ids(self, q):
+        return list(search.apply_search(Voiture.objects.all(), q).values_list("id", flat=True))
+
+    def test_search_is_accent_insensitive_and_prefix_based(self):
+        self.assertEqual(search.fold_text("Citroën Économique!"), "citroen economique")
+        self.assertEqual(self._ids("citroen"), [self.c3.id])
+        self.assertEqual(self._ids("ECONO"), [self.c3.id])
+        self.assertEqual(self._ids("cli dies"), [self.clio.id])
+        self.assertEqual(self._ids("clio blanc"), [])
+
+    def test_document_follows_brand_rename(self):
+        marque = self.clio.modele.marque
+        marque.nom = "Alpine"
+        marque.save()
+        self.assertEqual(self._ids("alpine"), [self.clio.id])
+        self.assertEqual(self._ids("renault"), [])
+
+    def test_document_is_rebuilt_only_when_its_fields_change(self):
+        voiture = Voiture.objects.get(id=self.c3.id)
+        with mock.patch.object(search, "build_search_document", wraps=search.build_search_document) as build:
+            voiture.prix = "6500.00"
+            voiture.save()
+            voiture.save(update_fields=["prix"])
+            build.assert_not_called()
+            voiture.description = "Toit ouvrant"
+            voiture.save(update_fields=["description"])
+            build.assert_called_once()
+        self.assertEqual(self._ids("toit"), [self.c3.id])
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class FacetTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        seller = User.objects.create_user(username="seller", password="Seller123!")
+        marque = Marque.objects.create(nom="Peugeot", pays="France", date_creation="2000-01-01")
+        essence = Modele.objects.create(marque=marque, nom="208", annee_lancement=2012)
+        diesel = Modele.objects.create(
+            marque=marque, nom="308", annee_lancement=2013, type_carburant="diesel"
+        )
+        for modele, prix, annee, couleur in (
+            (essence, "6000.00", 2016, "blanc"),
+            (essence, "8000.00", 2019, "noir"),
+            (diesel, "10000.00", 2021, "blanc"),
+        ):
+            Voiture.objects.create(
+                modele=modele,
+                prix=prix,
+                annee=annee,
+                couleur=couleur,
+                etat="occasion",
+                description="Test",
+                vendeur=seller,
+            )
+
+    def test_facets_are_computed_in_one_query(self):
+        with self.assertNumQueries(1):
+            result = facets.compute_facets(Voiture.objects.all())
+        self.assertEqual(result.total, 3)
+        self.assertEqual((result.prix_min, result.prix_moyen, result.prix_max), (6000, 8000, 10000))
+        self.assertEqual({b.value: b.count for b in result.carburants}, {"essence": 2, "diesel": 1})
+        self.assertEqual({b.value: b.count for b in result.couleurs}, {"blanc": 2, "noir": 1})
+        self.assertEqual([(b.value, b.count) for b in result.annees], [(2020, 1), (2015, 2)])
+
+    def test_each_facet_is_counted_without_its_own_filter(self):
+        renault = Marque.objects.create(nom="Renault", pays="France", date_creation="2000-01-01")
+        clio = Modele.objects.create(marque=renault, nom="Clio", annee_lancement=2012)
+        Voiture.objects.create(
+            modele=clio,
+            prix="7000.00",
+            annee=2018,
+            couleur="noir",
+            etat="occasion",
+            description="Test",
+            vendeur=User.objects.get(username="seller"),
+        )
+        peugeot = Marque.objects.get(nom="Peugeot")
+        selection = facets.Selection(marque=peugeot.id, couleur="blanc")
+
+        with self.assertNumQueries(1):
+            result = facets.compute_facets(Voiture.objects.all(), selection)
+        self.assertEqual(result.total, 2)
+        self.assertEqual((result.prix_min, result.prix_max), (6000, 10000))
+        # Marques comptées avec la couleur seule : Renault n'a pas de blanche.
+        self.assertEqual({b.label: b.count for b in result.marques}, {"Peugeot": 2})
+        # Couleurs comptées avec la marque seule : les autres couleurs gardent leur nombre.
+        self.assertEqual({b.value: b.count for b in result.couleurs}, {"blanc": 2, "noir": 1})
+        self.assertEqual({b.value: b.count for b in result.carburants}, {"essence": 1, "diesel": 1})
+
+        resp = self.client.get(reverse("liste_voitures"), {"marque": renault.id})
+        counts = {m.nom: m.nb_resultats for m in resp.context["marques"]}
+        self.assertEqual(counts, {"Peugeot": 3, "Renault": 1})
+        self.assertEqual(len(resp.context["voitures"]), 1)
+
+    def test_listing_exposes_filtered_counts(self):
+        resp = self.client.get(reverse("liste_voitures"), {"carburant": "essence"})
+        self.assertEqual(resp.context["facettes"].total, 2)
+        self.assertEqual(len(resp.context["voitures"]), 2)
+        self.assertEqual(resp.context["marques"][0].nb_resultats, 2)
+        self.assertEqual(
+            facets.filter_key({"q": " Peugeot  208", "sort": "prix_asc"}),
+            facets.filter_key({"q": "peugeot 208"}),
+        )
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        seller = User.objects.create_user(username="seller", password="Seller123!")
+        marque = Marque.objects.create(nom="Kia", pays="Corée", date_creation="2000-01-01")
+        modele = Modele.objects.create(marque=marque, nom="Picanto", annee_lancement=2004)
+        for prix in ("5000.00", "5000.00", "6000.00", "7000.00", "7000.00"):
+            Voiture.objects.create(
+                modele=modele,
+                prix=prix,
+                annee=2017,
+                couleur="gris",
+                etat="occasion",
+                description="Test",
+                vendeur=seller,
+            )
+
+    def test_cursor_walks_forward_and_back_without_gaps(self):
+        qs = Voiture.objects.all()
+        expected = list(qs.order_by("-prix", "-id").values_list("id", flat=True))
+
+        seen, cursor, pages = [], None, []
+        while True:
+            page = keyset.paginate(qs, ordering=["-prix"], cursor=cursor, per_page=2)
+            pages.append([v.id for v in page])
+            seen.extend(v.id for v in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+
+        back = keyset.paginate(qs, ordering=["-prix"], cursor=page.prev_cursor, per_page=2)
+        self.assertEqual([v.id for v in back], pages[-2])
+        self.assertTrue(back.has_next())
+
+        # Curseur émis pour un autre tri : retour à la première page.
+        other = keyset.paginate(qs, ordering=["prix"], cursor=cursor, per_page=2)
+        self.assertFalse(other.has_previous())
+
+    def test_cached_count_follows_model_versions(self):
+        qs = Voiture.objects.filter(est_vendue=False)
+        self.assertEqual(keyset.cached_count(qs, "test"), 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(keyset.cached_count(qs, "test"), 5)
+        # Même préfixe, autre requête : autre clé.
+        self.assertEqual(keyset.cached_count(qs.filter(prix__gt=5000), "test"), 3)
+
+        template = Voiture.objects.first()
+        template.pk = None
+        template.save()
+        self.assertEqual(keyset.cached_count(qs, "test"), 6)
+
+        # Écriture sans signal : seul un bump d'un modèle de `models` invalide le total.
+        self.assertEqual(keyset.cached_count(qs, "test", models=[Reservation]), 6)
+        Voiture.objects.filter(id=template.id).update(est_vendue=True)
+        self.assertEqual(keyset.cached_count(qs, "test", models=[Reservation]), 6)
+        caching.bump(Reservation)
+        self.assertEqual(keyset.cached_count(qs, "test", models=[Reservation]), 5)
+
+    def test_listing_uses_cursor_links(self):
+        template = Voiture.objects.first()
+        for _ in range(10):
+            template.pk = None
+            template.save()
+        resp = self.client.get(reverse("liste_voitures"), {"sort": "prix_asc"})
+        page = resp.context["voitures"]
+        self.assertEqual((len(page), page.count), (12, 15))
+        resp = self.client.get(
+            reverse("liste_voitures"), {"sort": "prix_asc", "cursor": page.next_cursor}
+        )
+        self.assertTrue(resp.context["voitures"].has_previous())
+        self.assertContains(resp, "data-infinite-next", count=0)
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class UnreadNotificationCountTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user(username="buyer", password="Buyer123!")
+
+    def test_counter_is_cached_incremented_and_reset(self):
+        from .views import _notify
+
+        lazy = notifications.lazy_unread_count(self.user)
+        self.assertEqual(lazy(), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(lazy(), 0)
+
+        _notify([self.user], type="message", titre="Nouveau message")
+        with self.captureOnCommitCallbacks(execute=True):
+            outbox.drain()
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications.unread_count(self.user), 1)
+
+        self.client.force_login(self.user)
+        self.client.get(reverse("notifications"))
+        self.assertFalse(Notification.objects.filter(utilisateur=self.user, lu=False).exists())
+        self.assertEqual(notifications.unread_count(self.user), 0)
+
+    def test_broadcast_is_one_row_merged_at_read_time(self):
+        author = User.objects.create_user(username="seller", password="Seller123!")
+        Notification.objects.create(utilisateur=self.user, type="message", titre="Perso")
+        self.assertEqual(notifications.unread_count(self.user), 1)
+
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True):
+            notifications.broadcast(type="new_listing", titre="Nouvelle voiture", auteur=author)
+        # Le compteur personnel reste en cache : seul le terme des globales est recompté.
+        with self.assertNumQueries(1):
+            self.assertEqual(notifications.unread_count(self.user), 2)
+        self.assertEqual(notifications.unread_count(author), 0)
+
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse("notifications"))
+        self.assertEqual([n.titre for n in resp.context["items"]], ["Nouvelle voiture", "Perso"])
+        self.assertEqual(notifications.unread_count(self.user), 0)
+        cache.clear()
+        self.assertEqual(notifications.unread_count(self.user), 0)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user(username="buyer", password="Buyer123!")
+        self.staff = User.objects.create_user(username="admin", password="Admin123!", is_staff=True)
+
+    def test_enqueue_is_rolled_back_with_the_domain_change(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                outbox.enqueue([self.user], type="message", titre="Perdu")
+                raise RuntimeError
+        self.assertFalse(OutboxNotification.objects.exists())
+
+    def test_recipient_held_by_another_worker_is_left_out_of_the_batch(self):
+        other = User.objects.create_user(username="other", password="Other123!")
+        outbox.enqueue([self.user], type="message", titre="Pris par un autre worker")
+        outbox.enqueue([self.user], type="message", titre="Suivant")
+        outbox.enqueue([other], type="message", titre="Autre destinataire")
+        outbox.enqueue_staff(type="sale_confirmed", titre="Staff")
+
+        # Premier message verrouillé ailleurs : SKIP LOCKED ne rend que les suivants.
+        claimed = list(OutboxNotification.objects.order_by("id"))[1:]
+        kept = outbox._without_recipients_in_progress(claimed)
+        self.assertEqual([e.titre for e in kept], ["Autre destinataire", "Staff"])
+
+    def test_drain_delivers_in_batch_and_retries_per_recipient_in_order(self):
+        outbox.enqueue([self.user], type="message", titre="Premier")
+        outbox.enqueue_staff(type="sale_confirmed", titre="Pour le staff")
+        outbox.enqueue([self.user.pk], type="message", titre="Second")
+
+        real_build = outbox._build_notifications
+
+        def flaky(event, staff):
+            if event.titre == "Premier":
+                raise RuntimeError("boom")
+            return real_build(event, staff)
+
+        with mock.patch.object(outbox, "_build_notifications", side_effect=flaky):
+            with self.assertLogs("voitures.services.outbox", "ERROR"):
+                result = outbox.drain()
+        self.assertEqual((result.delivered, result.retried), (1, 1))
+        self.assertEqual(
+            list(Notification.objects.values_list("utilisateur__username", "titre")),
+            [("admin", "Pour le staff")],
+        )
+
+        # « Second » attend que « Premier » soit livré (ordre par destinataire).
+        OutboxNotification.objects.filter(titre="Premier").update(prochain_essai=timezone.now())
+        self.assertEqual(outbox.drain().delivered, 2)
+        titres = list(
+            Notification.objects.filter(utilisateur=self.user).order_by("id").values_list("titre", flat=True)
+        )
+        self.assertEqual(titres, ["Premier", "Second"])
+
+    def test_recipients_in_backoff_do_not_starve_the_others(self):
+        other = User.objects.create_user(username="other", password="Other123!")
+        outbox.enqueue([self.user], type="message", titre="Bloqué 1")
+        outbox.enqueue([self.user], type="message", titre="Bloqué 2")
+        outbox.enqueue([other], type="message", titre="Pour other")
+        OutboxNotification.objects.filter(titre="Bloqué 1").update(
+            prochain_essai=timezone.now() + timedelta(hours=1)
+        )
+        self.assertEqual(outbox.drain(batch_size=2).delivered, 1)
+        self.assertEqual(list(Notification.objects.values_list("titre", flat=True)), ["Pour other"])
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class HomepageSnapshotTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.seller = User.objects.create_user(username="seller", password="Seller123!")
+        marque = Marque.objects.create(nom="Dacia", pays="Roumanie", date_creation="2000-01-01")
+        self.modele = Modele.objects.create(marque=marque, nom="Sandero", annee_lancement=2008)
+
+    def _publish(self):
+        return Voiture.objects.create(
+            modele=self.modele,
+            prix="6500.00",
+            annee=2020,
+            couleur="bleu",
+            etat="occasion",
+            description="Test",
+            vendeur=self.seller,
+        )
+
+    def test_homepage_is_served_from_snapshot(self):
+        self._publish()
+        self.client.get(reverse("accueil"))
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse("accueil"))
+        self.assertEqual(resp.context["total_voitures"], 1)
+
+    def test_invalidated_snapshot_is_served_stale_while_another_request_rebuilds(self):
+        homepage.rebuild()
+        self._publish()  # signal post_save : instantané marqué périmé
+
+        cache.add(homepage.LOCK_KEY, 1, 30)  # reconstruction en cours ailleurs
+        with self.assertNumQueries(0):
+            self.assertEqual(homepage.get_snapshot()["total_voitures"], 0)
+
+        cache.delete(homepage.LOCK_KEY)
+        self.assertEqual(homepage.get_snapshot()["total_voitures"], 1)
+
+    def test_invalidation_during_a_rebuild_is_not_lost(self):
+        real_build = homepage.build_snapshot
+
+        def racing_build():
+            data = real_build()
+            self._publish()  # invalidé pendant la construction
+            return data
+
+        with mock.patch.object(homepage, "build_snapshot", side_effect=racing_build):
+            self.assertEqual(homepage.get_snapshot()["total_voitures"], 0)
+        self.assertEqual(homepage.get_snapshot()["total_voitures"], 1)
+
+    def test_cold_cache_requests_wait_for_the_lock_holder(self):
+        import threading
+
+        cache.add(homepage.LOCK_KEY, 1, 30)  # première requête en train de construire
+        results = []
+        with mock.patch.object(homepage, "build_snapshot") as build:
+            waiters = [
+                threading.Thread(target=lambda: results.append(homepage.get_snapshot()))
+                for _ in range(3)
+            ]
+            for waiter in waiters:
+                waiter.start()
+            time.sleep(0.2)
+            self.assertEqual(results, [])
+
+            homepage._store({"total_voitures": 42}, homepage._generation())
+            cache.delete(homepage.LOCK_KEY)
+            for waiter in waiters:
+                waiter.join(5)
+        build.assert_not_called()
+        self.assertEqual([r["total_voitures"] for r in results], [42, 42, 42])
+
+    def test_waiters_take_over_when_the_lock_holder_fails(self):
+        cache.add(homepage.LOCK_KEY, 1, 30)
+        with mock.patch.object(homepage, "time", wraps=time) as clock:
+            clock.sleep.side_effect = lambda _s: cache.delete(homepage.LOCK_KEY)
+            self.assertEqual(homepage.get_snapshot()["total_voitures"], 0)
+        self.assertIsNotNone(cache.get(homepage.SNAPSHOT_KEY))
+
+    def test_queryset_reservation_changes_invalidate_the_snapshot(self):
+        voiture = self._publish()
+        self.assertFalse(homepage.get_snapshot()["voitures_recentes"][0].est_reservee)
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.mark_reserved(voiture.id)
+        self.assertTrue(homepage.get_snapshot()["voitures_recentes"][0].est_reservee)
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.unreserve(Voiture.objects.filter(id=voiture.id))
+        self.assertFalse(homepage.get_snapshot()["voitures_recentes"][0].est_reservee)
+
+
+class ListingCounterTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username="seller", password="Seller123!")
+        self.buyer = User.objects.create_user(username="buyer", password="Buyer123!")
+        self.marque = Marque.objects.create(nom="Peugeot", pays="France", date_creation="2000-01-01")
+        self.modele = Modele.objects.create(marque=self.marque, nom="208", annee_lancement=2012)
+
+    def _publish(self, **kwargs):
+        return Voiture.objects.create(
+            modele=self.modele,
+            prix="8000.00",
+            annee=2018,
+            couleur="rouge",
+            etat="occasion",
+            description="Test",
+            vendeur=self.seller,
+            **kwargs,
+        )
+
+    def _counts(self, obj):
+        obj.refresh_from_db()
+        return (obj.nb_voitures, obj.nb_disponibles, obj.nb_reservees, obj.nb_vendues)
+
+    def test_counters_follow_listing_lifecycle(self):
+        voiture = self._publish()
+        self._publish()
+        self.assertEqual(self._counts(self.marque), (2, 2, 0, 0))
+
+        result = transactions.create_purchase_request(voiture_id=voiture.id, buyer=self.buyer)
+        self.assertEqual(self._counts(self.modele), (2, 1, 1, 0))
+
+        transactions.confirm_sale(transaction_id=result.transaction.id, seller=self.seller)
+        self.assertEqual(self._counts(self.marque), (2, 1, 0, 1))
+
+        voiture.delete()
+        self.assertEqual(self._counts(self.marque), (1, 1, 0, 0))
+        self.assertEqual(self._counts(self.modele), (1, 1, 0, 0))
+
+    def test_decrement_of_drifted_counter_stays_at_zero(self):
+        voiture = self._publish()
+        Modele.objects.filter(id=self.modele.id).update(nb_voitures=0, nb_disponibles=0)
+        Marque.objects.filter(id=self.marque.id).update(nb_voitures=0, nb_disponibles=0)
+
+        voiture.delete()  # ne doit pas violer CHECK (>= 0) des colonnes positives
+        self.assertEqual(self._counts(self.modele), (0, 0, 0, 0))
+        self.assertEqual(self._counts(self.marque), (0, 0, 0, 0))
+
+        call_command("rebuild_counters", stdout=StringIO())
+        self.assertEqual(self._counts(self.marque), (0, 0, 0, 0))
+
+    def test_bulk_release_and_rebuild_command(self):
+        voiture = self._publish(est_reservee=True)
+        counters.unreserve(Voiture.objects.filter(id=voiture.id))
+        self.assertEqual(self._counts(self.marque), (1, 1, 0, 0))
+
+        Marque.objects.filter(id=self.marque.id).update(nb_voitures=7, nb_disponibles=0)
+        out = StringIO()
+        call_command("rebuild_counters", stdout=out)
+        self.assertIn("1 marque(s), 0 modèle(s)", out.getvalue())
+        self.assertEqual(self._counts(self.marque), (1, 1, 0, 0))
+
+
+class ReservationAvailabilityTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username="seller", password="Seller123!")
+        self.client_user = User.objects.create_user(username="client", password="Client123!")
+        marque = Marque.objects.create(nom="Toyota", pays="Japon", date_creation="2000-01-01")
+        self.voiture = Voiture.objects.create(
+            modele=Modele.objects.create(marque=marque, nom="Yaris", annee_lancement=1999),
+            prix="11000.00",
+            annee=2021,
+            couleur="gris",
+            etat="occasion",
+            description="Test",
+            vendeur=self.seller,
+        )
+        self.start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+
+    def _book(self, hours_from, hours_to):
+        return reservations.create_reservation(
+            voiture_id=self.voiture.id,
+            client=self.client_user,
+            debut=self.start + timedelta(hours=hours_from),
+            fin=self.start + timedelta(hours=hours_to),
+            type="essai",
+            note="",
+            signature="",
+        )
+
+    def test_database_rejects_overlapping_active_reservations(self):
+        self._book(0, 2)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Reservation.objects.create(
+                voiture=self.voiture,
+                client=self.client_user,
+                debut=self.start + timedelta(hours=1),
+                fin=self.start + timedelta(hours=3),
+            )
+        with self.assertRaisesMessage(ValueError, "indisponible"):
+            self._book(1, 3)
+
+        self._book(2, 4)  # bornes [début, fin) : créneau adjacent accepté
+        self.voiture.refresh_from_db()
+        self.assertTrue(self.voiture.est_reservee)
+
+    def test_expired_pending_reservation_is_released_on_conflict(self):
+        stale = self._book(0, 2)
+        Reservation.objects.filter(id=stale.id).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self._book(1, 3)
+        stale.refresh_from_db()
+        self.assertEqual(stale.statut, "annulee")
+
+    def test_expiring_one_reservation_keeps_car_reserved_by_another(self):
+        finished = self._book(0, 2)
+        accepted = self._book(3, 4)
+        reservations.update_status(reservation_id=accepted.id, user=self.seller, new_status="acceptee")
+        Reservation.objects.filter(id=finished.id).update(
+            debut=timezone.now() - timedelta(days=2), fin=timezone.now() - timedelta(days=1)
+        )
+
+        self.assertEqual(reservations.expire_finished_reservations(), 1)
+        self.voiture.refresh_from_db()
+        self.assertTrue(self.voiture.est_reservee)
+
+        Reservation.objects.filter(id=accepted.id).update(fin=timezone.now() - timedelta(hours=1))
+        self.assertEqual(reservations.expire_finished_reservations(), 1)
+        self.voiture.refresh_from_db()
+        self.assertFalse(self.voiture.est_reservee)
+
+    def test_existing_overlaps_are_reported_not_cancelled(self):
+        from django.db import connection
+
+        first = self._book(0, 2)
+        availability.uninstall_availability_backend(connection)
+        later, last = (
+            Reservation.objects.create(
+                voiture=self.voiture,
+                client=self.client_user,
+                debut=self.start + timedelta(hours=debut),
+                fin=self.start + timedelta(hours=fin),
+            )
+            for debut, fin in ((1, 3), (2, 4))  # chaîne : first-later et later-last
+        )
+
+        self.assertFalse(availability.install_availability_backend(connection))
+        later.refresh_from_db()
+        self.assertEqual(later.statut, "en_attente")
+
+        out = StringIO()
+        call_command("cancel_overlapping_reservations", "--dry-run", stdout=out)
+        self.assertIn(f"#{later.id}", out.getvalue())
+        self.assertNotIn(f"#{last.id}", out.getvalue())
+        call_command("cancel_overlapping_reservations", stdout=StringIO())
+        for res in (first, later, last):
+            res.refresh_from_db()
+        self.assertEqual(
+            (first.statut, later.statut, last.statut), ("en_attente", "annulee", "en_attente")
+        )
+
+        self.assertTrue(availability.install_availability_backend(connection))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Reservation.objects.create(
+                voiture=self.voiture,
+                client=self.client_user,
+                debut=self.start + timedelta(hours=1),
+                fin=self.start + timedelta(hours=3),
+            )
+
+    def test_free_slots(self):
+        self._book(2, 4)
+        self._book(6, 7)
+        self._book(8, 8.5)  # trou 7h-8h : sous min_duration
+        slots = availability.free_slots(
+            self.voiture.id,
+            (self.start, self.start + timedelta(hours=10)),
+            min_duration=timedelta(hours=1, minutes=30),
+        )
+        self.assertEqual(
+            [(s.debut - self.start, s.fin - self.start) for s in slots],
+            [
+                (timedelta(0), timedelta(hours=2)),
+                (timedelta(hours=4), timedelta(hours=6)),
+                (timedelta(hours=8, minutes=30), timedelta(hours=10)),
+            ],
+        )
+
+
+    def test_calendar_endpoint_revalidates_with_etag(self):
+        clear_caches()
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self._book(0, 2)
+        url = reverse("disponibilites_voiture", args=[self.voiture.id])
+        params = {"debut": self.start.date().isoformat()}
+
+        resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()["occupe"]), 1)
+        etag = resp["ETag"]
+
+        with self.assertNumQueries(0):
+            resp = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reservations.update_status(reservation_id=res.id, user=self.client_user, new_status="annulee")
+        resp = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["occupe"], [])
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        seller = User.objects.create_user(username="seller", password="Seller123!")
+        marque = Marque.objects.create(nom="Fiat", pays="Italie", date_creation="2000-01-01")
+        Voiture.objects.create(
+            modele=Modele.objects.create(marque=marque, nom="500", annee_lancement=2007),
+            prix="5000.00",
+            annee=2015,
+            couleur="blanc",
+            etat="occasion",
+            description="Test",
+            vendeur=seller,
+        )
+        out = StringIO()
+        call_command("check_query_plans", stdout=out)
+        self.assertIn("aucun parcours séquentiel", out.getvalue())
+
+    def test_sequential_scan_detection(self):
+        from .services import query_plans
+
+        plan = "2 0 0 SCAN voitures_voiture\n5 0 0 SCAN voitures_modele USING INDEX idx"
+        self.assertEqual(query_plans.sequential_scans(plan, "sqlite"), ["voitures_voiture"])
+        self.assertEqual(
+            query_plans.sequential_scans("Seq Scan on voitures_message  (cost=0.00..1.01)", "postgresql"),
+            ["voitures_message"],
+        )
+
+
+class CachingTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        caching.reset_stats()
+        self.seller = User.objects.create_user(username="seller", password="Seller123!")
+        marque = Marque.objects.create(nom="Skoda", pays="Tchéquie", date_creation="2000-01-01")
+        modele = Modele.objects.create(marque=marque, nom="Fabia", annee_lancement=1999)
+        self.voiture = Voiture.objects.create(
+            modele=modele,
+            prix="9000.00",
+            annee=2019,
+            couleur="blanc",
+            etat="occasion",
+            description="Test",
+            vendeur=self.seller,
+        )
+
+    def test_cached_function_hits_local_then_shared_tier(self):
+        calls = []
+
+        @caching.cached("test:double", models=[Voiture])
+        def double(x):
+            calls.append(x)
+            return x * 2
+
+        self.assertEqual(double(2), 4)
+        self.assertEqual(double(2), 4)
+        caches["local"].clear()
+        self.assertEqual(double(2), 4)
+        self.assertEqual(calls, [2])
+        stats = caching.stats()
+        self.assertEqual((stats["miss"], stats["local_hit"], stats["shared_hit"]), (1, 1, 1))
+
+    def test_model_save_invalidates_dependent_entries(self):
+        from .views import _avis_approuves
+
+        self.assertEqual(_avis_approuves(self.voiture.id), [])
+        buyer = User.objects.create_user(username="buyer", password="Buyer123!")
+        Avis.objects.create(voiture=self.voiture, utilisateur=buyer, note=5, commentaire="Top", approuve=True)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(_avis_approuves(self.voiture.id)), 1)
+        with self.assertNumQueries(0):
+            _avis_approuves(self.voiture.id)
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.client.force_login(self.seller)
+        self.assertEqual(self.client.get(reverse("cache_stats")).status_code, 403)
+
+        staff = User.objects.create_user(username="staff", password="Staff123!", is_staff=True)
+        self.client.force_login(staff)
+        resp = self.client.get(reverse("cache_stats"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("voitures.voiture", resp.json()["versions"])
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class ReceiptStoreTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.seller = User.objects.create_user(username="seller", password="Seller123!")
+        self.buyer = User.objects.create_user(username="buyer", password="Buyer123!")
+        marque = Marque.objects.create(nom="Citroën", pays="France", date_creation="2000-01-01")
+        modele = Modele.objects.create(marque=marque, nom="C3", annee_lancement=2002)
+        self.voiture = Voiture.objects.create(
+            modele=modele,
+            prix="11000.00",
+            annee=2020,
+            couleur="rouge",
+            etat="occasion",
+            description="Test",
+            vendeur=self.seller,
+        )
+        result = transactions.create_purchase_request(voiture_id=self.voiture.id, buyer=self.buyer)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trx = transactions.confirm_sale(transaction_id=result.transaction.id, seller=self.seller)
+
+    def test_confirmation_warms_cache(self):
+        with mock.patch.object(receipt_store, "build_transaction_receipt") as build:
+            receipt = receipt_store.get_receipt(self.trx, "acheteur")
+        build.assert_not_called()
+        self.assertTrue(receipt.content.startswith(b"%PDF"))
+
+    def test_download_honours_if_none_match(self):
+        self.client.force_login(self.buyer)
+        url = reverse("recu_transaction", args=[self.trx.id])
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/pdf")
+        self.assertEqual(resp["ETag"], receipt_store.etag(self.trx, "acheteur"))
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(resp.status_code, 304)
+
+        outsider = User.objects.create_user(username="other", password="Other123!")
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class ReceiptExportTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username="seller", password="Seller123!")
+        marque = Marque.objects.create(nom="Dacia", pays="Roumanie", date_creation="2000-01-01")
+        modele = Modele.objects.create(marque=marque, nom="Sandero", annee_lancement=2008)
+        self.ids = []
+        for i in range(3):
+            buyer = User.objects.create_user(username=f"buyer{i}", password="Buyer123!")
+            voiture = Voiture.objects.create(
+                modele=modele,
+                prix="8000.00",
+                annee=2021,
+                couleur="bleu",
+                etat="occasion",
+                description="Test",
+                vendeur=self.seller,
+            )
+            result = transactions.create_purchase_request(voiture_id=voiture.id, buyer=buyer)
+            if i < 2:
+                transactions.confirm_sale(transaction_id=result.transaction.id, seller=self.seller)
+                self.ids.append(result.transaction.id)
+        self.today = timezone.localdate()
+
+    def test_command_writes_zip_of_confirmed_sales(self):
+        with TemporaryDirectory() as tmp:
+            output = Path(tmp) / "recus.zip"
+            call_command(
+                "export_receipts",
+                "--from", self.today.isoformat(),
+                "--to", self.today.isoformat(),
+                "--workers", "1",
+                "-o", str(output),
+                stdout=StringIO(),
+            )
+            with zipfile.ZipFile(output) as archive:
+                names = archive.namelist()
+                self.assertTrue(archive.read(names[0]).startswith(b"%PDF"))
+        self.assertEqual(names, [f"recu_transaction_{i}_vendeur.pdf" for i in self.ids])
+
+    def test_pdf_export_has_one_page_per_sale(self):
+        sink = BytesIO()
+        count = receipt_export.export(sink, self.today, self.today, fmt="pdf")
+        self.assertEqual(count, 2)
+        content = sink.getvalue()
+        self.assertIn(b"/Count 2", content)
+        self.assertTrue(content.rstrip().endswith(b"%%EOF"))
+
+    def test_staff_view_streams_export(self):
+        self.client.force_login(self.seller)
+        url = reverse("export_recus")
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        staff = User.objects.create_user(username="staff", password="Staff123!", is_staff=True)
+        self.client.force_login(staff)
+        resp = self.client.get(url, {"debut": self.today.isoformat(), "fin": self.today.isoformat(), "format": "pdf"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertTrue(b"".join(resp.streaming_content).startswith(b"%PDF"))
+
+
+class SimplePdfTests(TestCase):
+    def _objects(self, content: bytes) -> dict[int, int]:
+        start = int(content.rsplit(b"startxref", 1)[1].split()[0])
+        lines = content[start:].split(b"\n")
+        size = int(lines[1].split()[1])
+        return {num: int(lines[2 + num][:10]) for num in range(1, size)}
+
+    def test_writer_streams_pages_with_valid_xref(self):
+        sink = BytesIO()
+        writer = simple_pdf.PdfWriter(sink, fonts={"F1": "Helvetica"}, compress=True)
+        for i in range(3):
+            canvas = simple_pdf.PdfCanvas()
+            canvas.text(72, 720, f"Page {i}")
+            writer.add_page(canvas.stream())
+            self.assertEqual(writer.size, len(sink.getvalue()))
+        writer.close()
+
+        content = sink.getvalue()
+        for num, offset in self._objects(content).items():
+            self.assertTrue(content[offset:].startswith(f"{num} 0 obj".encode()))
+        self.assertIn(b"/Count 3", content)
+        stream = content.split(b"/FlateDecode >>\nstream\n", 1)[1].split(b"\nendstream", 1)[0]
+        self.assertIn(b"(Page 0) Tj", zlib.decompress(stream))
+
+    def test_compression_shrinks_receipt_layout(self):
+        canvas = simple_pdf.PdfCanvas()
+        for i in range(200):
+            canvas.rect(36, 36 + i, 540, 10, stroke=True, fill=False)
+        plain = simple_pdf.build_one_page_pdf(content_stream=canvas.stream(), filename="a.pdf", fonts={})
+        packed = simple_pdf.build_one_page_pdf(
+            content_stream=canvas.stream(), filename="a.pdf", fonts={}, compress=True
+        )
+        self.assertLess(len(packed.content) * 3, len(plain.content))
+
+    def test_text_width_uses_afm_metrics(self):
+        self.assertAlmostEqual(simple_pdf.estimate_text_width("Hello", font="F1", size=12), 27.336)
+        self.assertAlmostEqual(simple_pdf.estimate_text_width("Élan", font="Courier", size=10), 24.0)
+        self.assertGreater(
+            simple_pdf.estimate_text_width("Wagon", font="F2", size=12),
+            simple_pdf.estimate_text_width("Wagon", font="F1", size=12),
+        )
+
+    def test_truncate_and_wrap_fit_measured_width(self):
+        name = "Jean-Baptiste Dupont-Lefèvre de la Villeneuve"
+        short = simple_pdf.truncate_to_width(name, 150, font="F2", size=12)
+        self.assertTrue(short.endswith("…"))
+        self.assertLessEqual(simple_pdf.estimate_text_width(short, font="F2", size=12), 150)
+        self.assertEqual(simple_pdf.truncate_to_width("Clio", 150, font="F2", size=12), "Clio")
+
+        lines = simple_pdf.wrap_text(name, 120, font="F1", size=10)
+        self.assertEqual(" ".join(lines), name)
+        for line in lines:
+            self.assertLessEqual(simple_pdf.estimate_text_width(line, font="F1", size=10), 120)
+
+
+class LogoCatalogTests(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+        (self.dir / "PEGEO.png").write_bytes(b"\x89PNG logo v1")
+        override = override_settings(BRAND_LOGO_CATALOG_DIR=self.dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(logo_catalog.invalidate)
+        self.marque = Marque.objects.create(nom="Peugeot", pays="France", date_creation="2000-01-01")
+
+    def test_logo_served_with_etag_and_304(self):
+        url = reverse("marque_logo", args=[self.marque.id])
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b"".join(resp.streaming_content), b"\x89PNG logo v1")
+        etag = resp["ETag"]
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp["ETag"], etag)
+
+    def test_index_follows_catalog_changes(self):
+        first = logo_catalog.find("Peugeot")
+        self.assertIs(logo_catalog.find("peugeot"), first)
+
+        (self.dir / "PEGEO.png").write_bytes(b"\x89PNG logo v2 plus long")
+        self.assertNotEqual(logo_catalog.find("Peugeot").etag, first.etag)
+        self.assertIsNone(logo_catalog.find("Tesla"))
+
+
+class BrandSvgTests(TestCase):
+    def setUp(self):
+        self.marque = Marque.objects.create(nom="Lancia", pays="Italie", date_creation="2000-01-01")
+
+    def test_versioned_svg_is_immutable_and_revalidates_without_db(self):
+        from .templatetags.branding import marque_logo_svg_url
+
+        url = marque_logo_svg_url(self.marque)
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("immutable", resp["Cache-Control"])
+        self.assertEqual(resp.content, brand_svg.fallback_svg("Lancia").content)
+
+        with self.assertNumQueries(0):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(resp.status_code, 304)
+
+        self.marque.nom = "Lancia Motors"
+        self.marque.save()
+        resp = self.client.get(url)
+        self.assertRedirects(resp, marque_logo_svg_url(self.marque), fetch_redirect_response=False)
+
+    def test_command_pregenerates_one_file_per_brand(self):
+        with TemporaryDirectory() as tmp:
+            (Path(tmp) / "obsolete.svg").write_text("<svg/>")
+            call_command("generate_brand_svgs", "--output", tmp, "--prune", stdout=StringIO())
+            files = sorted(p.name for p in Path(tmp).iterdir())
+        self.assertEqual(files, [f"{brand_svg.digest('Lancia')}.svg"])
+
+    def test_command_writes_outside_tracked_static_dir(self):
+        with TemporaryDirectory() as tmp, override_settings(GENERATED_STATIC_DIR=Path(tmp)):
+            call_command("generate_brand_svgs", stdout=StringIO())
+            files = [p.name for p in (Path(tmp) / brand_svg.STATIC_DIR).iterdir()]
+        self.assertEqual(files, [f"{brand_svg.digest('Lancia')}.svg"])
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class LogoSpriteTests(TestCase):
+    def setUp(self):
+        from PIL import Image
+
+        clear_caches()
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        catalog = Path(tmp.name) / "logo"
+        catalog.mkdir()
+        Image.new("RGB", (300, 120), (200, 30, 30)).save(catalog / "PEGEO.png")
+        override = override_settings(BRAND_LOGO_CATALOG_DIR=catalog, MEDIA_ROOT=Path(tmp.name) / "media")
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(logo_catalog.invalidate)
+        self.peugeot = Marque.objects.create(nom="Peugeot", pays="France", date_creation="2000-01-01")
+        self.lancia = Marque.objects.create(nom="Lancia", pays="Italie", date_creation="2000-01-01")
+
+    def _render_logos(self, *marques):
+        from django.template import RequestContext, Template
+
+        template = Template("{% load branding %}{% for m in marques %}{% marque_logo_sprite m 0.5 %}{% endfor %}")
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        return template.render(RequestContext(request, {"marques": marques}))
+
+    def test_sprite_is_composed_outside_requests_and_served_immutable(self):
+        with mock.patch.object(logo_sprite, "schedule_build") as schedule:
+            css = self.client.get(reverse("logos_sprite_css"))
+        self.assertEqual((css.status_code, css.content), (200, b""))
+        schedule.assert_called_once_with()
+        self.assertIsNone(logo_sprite.published())
+
+        logo_sprite.build()
+        css = self.client.get(reverse("logos_sprite_css"))
+        self.assertIn(f".brand-sprite-{self.peugeot.id}{{", css.content.decode())
+
+        current = logo_sprite.published()
+        self.assertEqual(list(current["logos"]), [str(self.peugeot.id)])
+        self.assertEqual(len(current["symbols"]), 2)
+        with mock.patch.object(logo_sprite, "published", wraps=logo_sprite.published) as lookup:
+            html = self._render_logos(self.peugeot, self.lancia)
+        self.assertEqual(lookup.call_count, 1)
+        self.assertIn(f"brand-sprite-{self.peugeot.id}", html)
+        self.assertIn(".svg", html)
+
+        url = reverse("logos_sprite_file", args=[current["signature"], "png"])
+        resp = self.client.get(url)
+        self.assertEqual(resp["Content-Type"], "image/png")
+        self.assertIn("immutable", resp["Cache-Control"])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=resp["ETag"]).status_code, 304)
+
+    def test_brand_change_keeps_serving_previous_sheet_until_rebuilt(self):
+        out = StringIO()
+        call_command("build_logo_sprite", stdout=out)
+        first = logo_sprite.published()["signature"]
+        self.assertIn(first, out.getvalue())
+
+        with mock.patch.object(logo_sprite, "schedule_build") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.lancia.nom = "Lancia Delta"
+                self.lancia.save()
+        schedule.assert_called_once_with()
+        self.assertEqual(logo_sprite.published()["signature"], first)
+
+        second = logo_sprite.build()["signature"]
+        self.assertNotEqual(second, first)
+        self.assertEqual(logo_sprite.published()["signature"], second)
+        # La planche précédente reste lisible le temps que les caches expirent...
+        self.assertIsNotNone(logo_sprite.read(first, "png"))
+
+        self.lancia.nom = "Lancia Ypsilon"
+        self.lancia.save()
+        logo_sprite.build()
+        # ... puis disparaît à la recomposition suivante.
+        self.assertIsNone(logo_sprite.read(first, "png"))
+        self.assertIsNotNone(logo_sprite.read(second, "png"))
+        stale = reverse("logos_sprite_file", args=[first, "png"])
+        self.assertEqual(self.client.get(stale).status_code, 404)
+
+
+    def test_republishing_never_leaves_the_pointer_missing(self):
+        from django.core.files.storage import default_storage
+
+        first = logo_sprite.build()["signature"]
+        pointer = Path(default_storage.path(logo_sprite.PUBLISHED_NAME))
+        with mock.patch.object(default_storage, "delete", side_effect=AssertionError("suppression")):
+            media_files.overwrite(logo_sprite.PUBLISHED_NAME, b'{"signature": "autre"}')
+        self.assertEqual(pointer.read_bytes(), b'{"signature": "autre"}')
+
+        # Une écriture qui échoue laisse l'ancien pointeur et aucun fichier temporaire.
+        with mock.patch.object(media_files.os, "replace", side_effect=OSError("disque plein")):
+            with self.assertRaises(OSError):
+                media_files.overwrite(logo_sprite.PUBLISHED_NAME, json.dumps({"signature": first}).encode())
+        self.assertEqual(pointer.read_bytes(), b'{"signature": "autre"}')
+        self.assertEqual([p.name for p in pointer.parent.iterdir() if p.suffix == ".tmp"], [])
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        from PIL import Image
+
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = Path(tmp.name) / "media"
+        (media / "voitures").mkdir(parents=True)
+        Image.new("RGB", (900, 500), (30, 90, 200)).save(media / "voitures" / "car.jpg", format="JPEG")
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _size(self, resp):
+        from PIL import Image
+
+        return Image.open(BytesIO(b"".join(resp.streaming_content))).size
+
+    def test_variants_are_negotiated_and_never_upscaled(self):
+        from .templatetags.images import srcset
+
+        self.assertEqual(srcset("voitures/car.jpg").count("w, "), 2)
+        self.assertEqual(srcset("autre/car.jpg"), "")
+
+        resp = self.client.get(reverse("image_variant", args=[320, "voitures/car.jpg"]), HTTP_ACCEPT="image/webp,*/*")
+        self.assertEqual(resp["Content-Type"], "image/webp")
+        self.assertIn("Accept", resp["Vary"])
+        self.assertEqual(self._size(resp), (320, 178))
+
+        url = reverse("image_variant", args=[1280, "voitures/car.jpg"])
+        resp = self.client.get(url)
+        self.assertEqual(resp["Content-Type"], "image/jpeg")
+        self.assertEqual(self._size(resp), (900, 500))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=resp["ETag"]).status_code, 304)
+
+    def test_unknown_width_or_path_is_404(self):
+        self.assertEqual(self.client.get(reverse("image_variant", args=[500, "voitures/car.jpg"])).status_code, 404)
+        self.assertEqual(self.client.get("/photos/320/voitures/../settings.py").status_code, 404)
+        self.assertEqual(self.client.get(reverse("image_variant", args=[320, "voitures/absente.jpg"])).status_code, 404)
+
+    def test_generate_and_invalidate(self):
+        from django.core.files.storage import default_storage
+
+        self.assertEqual(image_variants.generate("voitures/car.jpg"), 6)
+        self.assertEqual(image_variants.generate("voitures/car.jpg"), 0)
+        image_variants.invalidate("voitures/car.jpg")
+        self.assertFalse(default_storage.exists(image_variants.variant_name("voitures/car.jpg", 640, "webp")))
+
+    def test_generation_only_waits_for_the_same_photo(self):
+        import threading
+
+        from django.core.files.storage import default_storage
+
+        with default_storage.open("voitures/car.jpg", "rb") as fh:
+            default_storage.save("voitures/autre.jpg", fh)
+        done = threading.Event()
+        worker = threading.Thread(
+            target=lambda: image_variants.ensure("voitures/autre.jpg", 320, "jpg") and done.set()
+        )
+        with image_variants._source_lock("voitures/car.jpg"):
+            worker.start()
+            self.assertTrue(done.wait(10))
+        worker.join()
+        self.assertEqual(image_variants._locks, {})
+
+
+class PhotoBatchTests(TestCase):
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        override = override_settings(MEDIA_ROOT=self.tmp / "media")
+        override.enable()
+        self.addCleanup(override.disable)
+        seller = User.objects.create_user(username="seller", password="Seller123!")
+        marque = Marque.objects.create(nom="Citroën", pays="France", date_creation="2000-01-01")
+        modele = Modele.objects.create(marque=marque, nom="C3", annee_lancement=2009)
+        self.voitures = [
+            Voiture.objects.create(
+                modele=modele, prix="7000.00", annee=2018, couleur="blanc", etat="occasion",
+                description="Test", vendeur=seller,
+            )
+            for _ in range(3)
+        ]
+
+    def _names(self):
+        return [v.image_principale.name for v in Voiture.objects.order_by("id")]
+
+    def test_demo_images_are_written_in_batches(self):
+        out = StringIO()
+        call_command("generate_demo_images", "--workers", "1", "--batch-size", "2", stdout=out)
+        names = self._names()
+        self.assertTrue(all(name.startswith("voitures/demo_citroen_c3_") for name in names))
+        self.assertTrue(all((self.tmp / "media" / name).exists() for name in names))
+        self.assertIn("2/3", out.getvalue())
+        self.assertIn("3/3", out.getvalue())
+        self.assertFalse(photo_batch.default_checkpoint("generate_demo_images").exists())
+
+    def test_resume_skips_checkpointed_cars(self):
+        first = self.voitures[0]
+        photo_batch.Checkpoint(photo_batch.default_checkpoint("generate_demo_images")).save(first.id)
+        out = StringIO()
+        call_command("generate_demo_images", "--workers", "1", "--overwrite", "--resume", stdout=out)
+        names = self._names()
+        self.assertEqual(names[0], "voitures/default.jpg")
+        self.assertTrue(all(name.startswith("voitures/demo_") for name in names[1:]))
+        self.assertIn("Images générées: 2", out.getvalue())
+
+    def test_import_copies_and_bulk_updates(self):
+        from PIL import Image
+
+        source = self.tmp / "photos"
+        source.mkdir()
+        Image.new("RGB", (40, 30), (10, 20, 30)).save(source / "Citroen.jpg")
+        call_command("import_voiture_images", str(source), "--workers", "1", "--batch-size", "2", stdout=StringIO())
+        self.assertEqual(self._names(), [f"voitures/citroen_c3_{v.id}.jpg" for v in self.voitures])
+        self.assertTrue((self.tmp / "media" / "voitures" / f"citroen_c3_{self.voitures[2].id}.jpg").exists())
+
+
 class AuthRedirectTests(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="u1", password="Pass123456!")
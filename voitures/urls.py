@@ -1,6 +1,8 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
+from . import views_branding
+from . import views_images
 from .forms import PasswordResetEmailForm, SetPasswordStyledForm
 
 urlpatterns = [
@@ -13,8 +15,20 @@ urlpatterns = [
     path('voiture/<int:voiture_id>/favori/', views.toggle_favori, name='toggle_favori'),
     path('voiture/<int:voiture_id>/acheter/', views.acheter_voiture, name='acheter_voiture'),
     path('voiture/<int:voiture_id>/reserver/', views.reserver_voiture, name='reserver_voiture'),
+    path('voiture/<int:voiture_id>/disponibilites/', views.disponibilites_voiture, name='disponibilites_voiture'),
     path('voiture/<int:voiture_id>/avis/', views.ajouter_avis, name='ajouter_avis'),
     path('voiture/<int:voiture_id>/message/', views.envoyer_message, name='envoyer_message'),
+    path('marque/<int:marque_id>/logo/', views_branding.marque_logo, name='marque_logo'),
+    path('marque/<int:marque_id>/logo.svg', views_branding.marque_logo_svg, name='marque_logo_svg'),
+    path(
+        'marque/<int:marque_id>/logo-<slug:digest>.svg',
+        views_branding.marque_logo_svg_versioned,
+        name='marque_logo_svg_versioned',
+    ),
+    path('marques/logos.css', views_branding.logos_sprite_css, name='logos_sprite_css'),
+    path('marques/logos.json', views_branding.logos_sprite_json, name='logos_sprite_json'),
+    path('marques/logos-<slug:signature>.<str:ext>', views_branding.logos_sprite_file, name='logos_sprite_file'),
+    path('photos/<int:width>/<path:name>', views_images.image_variant, name='image_variant'),
     
     path('mes-voitures/', views.mes_voitures, name='mes_voitures'),
     path('mes-favoris/', views.mes_favoris, name='mes_favoris'),
@@ -27,6 +41,7 @@ urlpatterns = [
     path('transaction/<int:transaction_id>/confirmer/', views.confirmer_vente, name='confirmer_vente'),
     path('transaction/<int:transaction_id>/annuler/', views.annuler_transaction, name='annuler_transaction'),
     path('transaction/<int:transaction_id>/refuser/', views.refuser_transaction, name='refuser_transaction'),
+    path('transaction/<int:transaction_id>/recu/', views.recu_transaction, name='recu_transaction'),
     
     path('inscription/', views.inscription, name='inscription'),
     path('connexion/', views.connexion, name='connexion'),
@@ -47,6 +62,8 @@ urlpatterns = [
     
     # Pages d'administration (pour les utilisateurs staff)
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/cache/', views.cache_stats, name='cache_stats'),
+    path('dashboard/recus/export/', views.export_recus, name='export_recus'),
     
     # Page de test
     path('test/', views.test, name='test'),
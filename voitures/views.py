@@ -1,16 +1,18 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User  # IMPORT AJOUTÉ
 from django.contrib import messages
-from django.db.models import Q, Count, Avg, Sum
-from django.core.paginator import Paginator
-from django.http import HttpResponse, JsonResponse
-from django.views.decorators.http import require_POST
+from django.db import transaction as db_transaction
+from django.db.models import Sum, Exists, OuterRef
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.utils import timezone
-from datetime import date
+from datetime import date, datetime, timezone as dt_timezone
 import os
 from decimal import Decimal, InvalidOperation
 from .models import (
@@ -28,6 +30,19 @@ from .models import (
 from .forms import InscriptionForm, AvisForm
 from .services import transactions
 from .services import reservations as res_service
+from .services import availability
+from .services import caching
+from .services import expiry
+from .services import facets
+from .services import homepage
+from .services import image_variants
+from .services import keyset
+from .services import outbox
+from .services import receipt_export
+from .services import receipt_store
+from .services import notifications as notif_service
+from .services import search
+from .services import view_counter
 
 
 def _validate_uploaded_image(uploaded_file):
@@ -43,124 +58,148 @@ def _validate_uploaded_image(uploaded_file):
     return None
 
 
-def _staff_users():
-    return User.objects.filter(is_staff=True, is_active=True)
+def _notify(users, *, type, titre, contenu="", url=""):
+    # File d'envoi (outbox) : écrite dans la transaction courante, livrée par run_outbox_worker.
+    outbox.enqueue(users, type=type, titre=titre, contenu=contenu, url=url)
 
 
-def _notify(users, *, type, titre, contenu="", url=""):
-    notifications = [
-        Notification(utilisateur=user, type=type, titre=titre, contenu=contenu, url=url)
-        for user in users
-        if user and getattr(user, "is_active", False)
-    ]
-    if notifications:
-        Notification.objects.bulk_create(notifications)
+def _notify_staff(*, type, titre, contenu="", url=""):
+    outbox.enqueue_staff(type=type, titre=titre, contenu=contenu, url=url)
+
+
+# Lectures mises en cache : invalidées par les signaux des modèles listés (voir services/caching.py).
+@caching.cached("marques:toutes", models=[Marque], timeout=3600)
+def _marques_triees():
+    return Marque.objects.order_by("nom")
+
+
+@caching.cached("avis:approuves", models=[Avis])
+def _avis_approuves(voiture_id):
+    return Avis.objects.filter(voiture_id=voiture_id, approuve=True).select_related("utilisateur")
+
+
+@caching.cached("voitures:similaires", models=[Voiture])
+def _voitures_similaires(marque_id, voiture_id):
+    return (
+        Voiture.objects.filter(modele__marque_id=marque_id, est_vendue=False)
+        .exclude(id=voiture_id)
+        .select_related("modele__marque")[:4]
+    )
 
 
 # ==================== VUES PUBLIQUES ====================
 
 def accueil(request):
     """Page d'accueil du site"""
-    transactions.expire_stale_purchase_requests()
-    voitures_recentes = Voiture.objects.filter(est_vendue=False).order_by('-date_ajout')[:6]
-    voitures_promo = Voiture.objects.filter(est_vendue=False).order_by('prix')[:6]
-    marques_populaires = Marque.objects.annotate(
-        nb_voitures=Count('modeles__voitures')
-    ).order_by('-nb_voitures')[:8]
-    
-    context = {
-        'voitures_recentes': voitures_recentes,
-        'voitures_promo': voitures_promo,
-        'marques_populaires': marques_populaires,
-        'marques': Marque.objects.all().order_by('nom'),
-        'voitures_vedette': Voiture.objects.filter(est_vendue=False).select_related('modele__marque').order_by('-date_ajout')[:12],
-        'total_voitures': Voiture.objects.filter(est_vendue=False).count(),
-    }
+    # Instantané en cache, reconstruit quand les annonces changent (voir services/homepage.py).
+    context = homepage.get_snapshot()
     return render(request, 'voitures/accueil.html', context)
 
 def liste_voitures(request):
     """Liste toutes les voitures avec filtres"""
-    transactions.expire_stale_purchase_requests()
     voitures_list = Voiture.objects.filter(est_vendue=False).select_related(
         'modele__marque', 'vendeur'
-    ).prefetch_related('favoris')
+    )
 
     q = request.GET.get("q")
     sort = request.GET.get("sort")
     statut = request.GET.get("statut")
     
     # Récupération des filtres
-    marque_id = request.GET.get('marque')
     prix_min = request.GET.get('prix_min')
     prix_max = request.GET.get('prix_max')
     annee_min = request.GET.get('annee_min')
     annee_max = request.GET.get('annee_max')
+    carburant = request.GET.get('carburant') or None
+    transmission = request.GET.get('transmission') or None
+    etat = request.GET.get('etat') or None
+    couleur = request.GET.get('couleur') or None
 
     if q:
-        voitures_list = voitures_list.filter(
-            Q(modele__nom__icontains=q)
-            | Q(modele__marque__nom__icontains=q)
-            | Q(description__icontains=q)
-        )
-    
-    # Application des filtres
-    if marque_id:
-        voitures_list = voitures_list.filter(modele__marque_id=marque_id)
+        voitures_list = search.apply_search(voitures_list, q)
     
+    # Application des filtres hors facettes
     if prix_min:
         voitures_list = voitures_list.filter(prix__gte=prix_min)
     
     if prix_max:
         voitures_list = voitures_list.filter(prix__lte=prix_max)
-    
-    if annee_min:
-        voitures_list = voitures_list.filter(annee__gte=annee_min)
-    
-    if annee_max:
-        voitures_list = voitures_list.filter(annee__lte=annee_max)
 
     if statut == "reservee":
         voitures_list = voitures_list.filter(est_reservee=True)
     elif statut == "disponible":
         voitures_list = voitures_list.filter(est_reservee=False)
 
+    # Compteurs par marque/carburant/transmission/état/couleur/année + prix min/moyen/max
+    # en une requête groupée, mise en cache par combinaison de filtres. Chaque facette
+    # est comptée sans son propre filtre : les autres valeurs gardent leur nombre.
+    selection = facets.Selection.from_params(request.GET)
+    facettes = facets.get_facets(voitures_list, request.GET, selection)
+    voitures_list = selection.apply(voitures_list)
+
+    # Tri (clé de pagination par curseur, l'id sert de départage)
     if sort == "prix_asc":
-        voitures_list = voitures_list.order_by("prix")
+        ordering = ["prix"]
     elif sort == "prix_desc":
-        voitures_list = voitures_list.order_by("-prix")
+        ordering = ["-prix"]
     elif sort == "annee_desc":
-        voitures_list = voitures_list.order_by("-annee")
+        ordering = ["-annee"]
     elif sort == "km_asc":
-        voitures_list = voitures_list.order_by("kilometrage")
-    
-    # Pagination
-    paginator = Paginator(voitures_list, 12)
-    page_number = request.GET.get('page')
-    voitures = paginator.get_page(page_number)
+        ordering = ["kilometrage"]
+    elif q:
+        ordering = ["-search_rank", "-date_ajout"]
+    else:
+        ordering = ["-date_ajout"]
     
-    # Calcul du prix moyen
-    prix_moyen = voitures_list.aggregate(Avg('prix'))['prix__avg']
+    # Favori de l'utilisateur : sous-requête EXISTS évaluée uniquement pour les lignes de la page
+    if request.user.is_authenticated:
+        voitures_list = voitures_list.annotate(
+            est_favori=Exists(
+                Favori.objects.filter(utilisateur=request.user, voiture=OuterRef('pk'))
+            )
+        )
+
+    # Pagination par curseur (le total vient des facettes : pas de COUNT(*) supplémentaire)
+    voitures = keyset.paginate(
+        voitures_list,
+        ordering=ordering,
+        cursor=request.GET.get('cursor'),
+        per_page=12,
+        count=facettes.total,
+    )
+
+    marques = _marques_triees()
+    marque_counts = facettes.marque_counts()
+    for marque in marques:
+        marque.nb_resultats = marque_counts.get(marque.id, 0)
+
+    querystring = request.GET.copy()
+    querystring.pop('page', None)
+    querystring.pop('cursor', None)
     
     context = {
         'voitures': voitures,
-        'marques': Marque.objects.all(),
-        'marque_selected': int(marque_id) if marque_id else None,
+        'marques': marques,
+        'facettes': facettes,
+        'marque_selected': selection.marque,
+        'carburant': carburant,
+        'transmission': transmission,
+        'etat': etat,
+        'couleur': couleur,
         'prix_min': prix_min,
         'prix_max': prix_max,
         'annee_min': annee_min,
         'annee_max': annee_max,
-        'prix_moyen': prix_moyen,
+        'prix_moyen': facettes.prix_moyen,
         'q': q,
         'sort': sort,
         'statut': statut,
+        'querystring': querystring.urlencode(),
     }
     return render(request, 'voitures/liste_voitures.html', context)
 
 def detail_voiture(request, voiture_id):
     """Page de détails d'une voiture"""
-    transactions.expire_stale_purchase_requests()
-    res_service.expire_stale_pending()
-    res_service.expire_finished_reservations()
     voiture = get_object_or_404(
         Voiture.objects.select_related('modele__marque', 'vendeur').prefetch_related("images"),
         id=voiture_id,
@@ -168,7 +207,7 @@ def detail_voiture(request, voiture_id):
 
     if request.method == "GET":
         if not request.user.is_authenticated or request.user != voiture.vendeur:
-            voiture.incrementer_vue()
+            view_counter.record_view(request, voiture.id)
     
     # Vérifier si l'utilisateur a cette voiture en favoris
     est_favori = False
@@ -179,7 +218,7 @@ def detail_voiture(request, voiture_id):
         ).exists()
     
     # Récupérer les avis
-    avis = Avis.objects.filter(voiture=voiture, approuve=True)
+    avis = _avis_approuves(voiture.id)
 
     transaction_en_attente = None
     if request.user.is_authenticated:
@@ -188,10 +227,7 @@ def detail_voiture(request, voiture_id):
         )
     
     # Voitures similaires
-    voitures_similaires = Voiture.objects.filter(
-        modele__marque=voiture.modele.marque,
-        est_vendue=False
-    ).exclude(id=voiture.id)[:4]
+    voitures_similaires = _voitures_similaires(voiture.modele.marque_id, voiture.id)
     
     context = {
         'voiture': voiture,
@@ -373,6 +409,7 @@ def ajouter_voiture(request):
                     return redirect("ajouter_voiture")
                 voiture.image_principale = request.FILES['image']
                 voiture.save()
+                image_variants.generate_on_commit(voiture.image_principale.name)
 
             # Images supplémentaires
             extra_images = request.FILES.getlist("images")
@@ -382,23 +419,24 @@ def ajouter_voiture(request):
                 if error:
                     messages.warning(request, f"Image ignorée: {error}")
                     continue
-                ImageVoiture.objects.create(voiture=voiture, image=img, ordre=ordre)
+                photo = ImageVoiture.objects.create(voiture=voiture, image=img, ordre=ordre)
+                image_variants.generate_on_commit(photo.image.name)
                 ordre += 1
             
             messages.success(request, 'Votre annonce a été publiée avec succès !')
-            _notify(
-                _staff_users(),
+            _notify_staff(
                 type="new_listing",
                 titre="Nouvelle annonce publiée",
                 contenu=f"{request.user.username} a publié l'annonce #{voiture.id}.",
                 url=voiture.get_absolute_url(),
             )
-            _notify(
-                User.objects.filter(is_active=True).exclude(id=request.user.id),
+            # Une seule ligne, fusionnée dans le fil de chaque utilisateur à la lecture.
+            notif_service.broadcast(
                 type="new_listing",
                 titre="Nouvelle voiture disponible",
                 contenu=f"{voiture.modele.marque.nom} {voiture.modele.nom} ({voiture.annee}).",
                 url=voiture.get_absolute_url(),
+                auteur=request.user,
             )
             return redirect('detail_voiture', voiture_id=voiture.id)
             
@@ -461,6 +499,8 @@ def modifier_voiture(request, voiture_id):
                 voiture.image_principale = request.FILES['image']
             
             voiture.save()
+            if 'image' in request.FILES:
+                image_variants.generate_on_commit(voiture.image_principale.name)
             messages.success(request, 'Annonce mise à jour avec succès !')
             return redirect('detail_voiture', voiture_id=voiture.id)
             
@@ -563,19 +603,20 @@ def envoyer_message(request, voiture_id):
         messages.error(request, "Message vide.")
         return redirect("detail_voiture", voiture_id=voiture_id)
 
-    Message.objects.create(
-        expediteur=request.user,
-        destinataire=voiture.vendeur,
-        sujet=f"Annonce #{voiture.id} — {voiture.modele.marque.nom} {voiture.modele.nom}",
-        contenu=contenu,
-    )
-    _notify(
-        [voiture.vendeur],
-        type="message",
-        titre="Nouveau message",
-        contenu=f"Message reçu pour l'annonce #{voiture.id}.",
-        url=voiture.get_absolute_url(),
-    )
+    with db_transaction.atomic():
+        Message.objects.create(
+            expediteur=request.user,
+            destinataire=voiture.vendeur,
+            sujet=f"Annonce #{voiture.id} — {voiture.modele.marque.nom} {voiture.modele.nom}",
+            contenu=contenu,
+        )
+        _notify(
+            [voiture.vendeur_id],
+            type="message",
+            titre="Nouveau message",
+            contenu=f"Message reçu pour l'annonce #{voiture.id}.",
+            url=voiture.get_absolute_url(),
+        )
     messages.success(request, "Message envoyé au vendeur.")
     return redirect("detail_voiture", voiture_id=voiture_id)
 
@@ -598,8 +639,8 @@ def mes_messages(request):
 
 @login_required
 def notifications(request):
-    items = Notification.objects.filter(utilisateur=request.user).order_by("-date_creation")[:200]
-    Notification.objects.filter(utilisateur=request.user, lu=False).update(lu=True)
+    items = notif_service.feed(request.user, limit=200)
+    notif_service.mark_all_read(request.user)
     return render(request, "voitures/notifications.html", {"items": items})
 
 @login_required
@@ -626,22 +667,23 @@ def acheter_voiture(request, voiture_id):
         return redirect('detail_voiture', voiture_id=voiture_id)
     
     if request.method == 'POST':
+        expiry.sweep_if_due()
         try:
-            result = transactions.create_purchase_request(voiture_id=voiture.id, buyer=request.user)
-            _notify(
-                [voiture.vendeur],
-                type="purchase_request",
-                titre="Nouvelle demande d'achat",
-                contenu=f"{request.user.username} a demandé à acheter l'annonce #{voiture.id}.",
-                url=voiture.get_absolute_url(),
-            )
-            _notify(
-                _staff_users(),
-                type="purchase_request",
-                titre="Demande d'achat à traiter",
-                contenu=f"Annonce #{voiture.id} — {voiture.modele.marque.nom} {voiture.modele.nom}.",
-                url="/dashboard/",
-            )
+            with db_transaction.atomic():
+                result = transactions.create_purchase_request(voiture_id=voiture.id, buyer=request.user)
+                _notify(
+                    [voiture.vendeur_id],
+                    type="purchase_request",
+                    titre="Nouvelle demande d'achat",
+                    contenu=f"{request.user.username} a demandé à acheter l'annonce #{voiture.id}.",
+                    url=voiture.get_absolute_url(),
+                )
+                _notify_staff(
+                    type="purchase_request",
+                    titre="Demande d'achat à traiter",
+                    contenu=f"Annonce #{voiture.id} — {voiture.modele.marque.nom} {voiture.modele.nom}.",
+                    url="/dashboard/",
+                )
             if result.created:
                 messages.success(
                     request,
@@ -718,11 +760,15 @@ def mes_reservations(request):
     """Réservations faites par l'utilisateur (client)."""
     res_list = Reservation.objects.filter(client=request.user).select_related(
         "voiture__modele__marque", "voiture__vendeur"
-    ).order_by("-date_creation")
+    )
 
-    paginator = Paginator(res_list, 12)
-    page_number = request.GET.get("page")
-    reservations = paginator.get_page(page_number)
+    reservations = keyset.paginate(
+        res_list,
+        ordering=["-date_creation"],
+        cursor=request.GET.get("cursor"),
+        per_page=12,
+        count=lambda: keyset.cached_count(res_list, f"mes_reservations:{request.user.pk}", models=[Voiture]),
+    )
 
     context = {
         "reservations": reservations,
@@ -735,11 +781,15 @@ def reservations_a_traiter(request):
     """Réservations en attente sur les voitures du vendeur."""
     res_list = Reservation.objects.filter(
         voiture__vendeur=request.user, statut__in=["en_attente", "acceptee"]
-    ).select_related("voiture__modele__marque", "client").order_by("-date_creation")
-
-    paginator = Paginator(res_list, 20)
-    page_number = request.GET.get("page")
-    reservations = paginator.get_page(page_number)
+    ).select_related("voiture__modele__marque", "client")
+
+    reservations = keyset.paginate(
+        res_list,
+        ordering=["-date_creation"],
+        cursor=request.GET.get("cursor"),
+        per_page=20,
+        count=lambda: keyset.cached_count(res_list, f"reservations_a_traiter:{request.user.pk}", models=[Voiture]),
+    )
 
     context = {
         "reservations": reservations,
@@ -752,44 +802,74 @@ def confirmer_vente(request, transaction_id):
     if request.method != "POST":
         return redirect('mes_ventes')
 
-    transaction = transactions.confirm_sale(transaction_id=transaction_id, seller=request.user)
-    voiture = transaction.voiture
-
-    _notify(
-        [transaction.acheteur],
-        type="sale_confirmed",
-        titre="Vente confirmée",
-        contenu=f"Votre achat pour l'annonce #{voiture.id} a été confirmé.",
-        url=voiture.get_absolute_url(),
-    )
-    _notify(
-        _staff_users(),
-        type="sale_confirmed",
-        titre="Vente confirmée",
-        contenu=f"Annonce #{voiture.id} — transaction #{transaction.id} confirmée.",
-        url="/dashboard/",
-    )
+    expiry.sweep_if_due()
+    with db_transaction.atomic():
+        transaction = transactions.confirm_sale(transaction_id=transaction_id, seller=request.user)
+        voiture = transaction.voiture
+
+        _notify(
+            [transaction.acheteur_id],
+            type="sale_confirmed",
+            titre="Vente confirmée",
+            contenu=f"Votre achat pour l'annonce #{voiture.id} a été confirmé.",
+            url=voiture.get_absolute_url(),
+        )
+        _notify_staff(
+            type="sale_confirmed",
+            titre="Vente confirmée",
+            contenu=f"Annonce #{voiture.id} — transaction #{transaction.id} confirmée.",
+            url="/dashboard/",
+        )
     
     messages.success(request, 'Vente confirmée avec succès !')
     return redirect('mes_ventes')
 
 
+@login_required
+def recu_transaction(request, transaction_id):
+    """Reçu PDF (acheteur ou vendeur), servi depuis le cache avec un ETag fort."""
+    trx = get_object_or_404(
+        Transaction.objects.select_related("voiture__modele__marque", "acheteur", "vendeur"),
+        id=transaction_id,
+    )
+    if request.user.pk == trx.acheteur_id:
+        role = "acheteur"
+    elif request.user.pk == trx.vendeur_id:
+        role = "vendeur"
+    elif request.user.is_staff:
+        role = request.GET.get("role") if request.GET.get("role") in receipt_store.ROLES else "vendeur"
+    else:
+        raise Http404("Transaction introuvable")
+
+    etag = receipt_store.etag(trx, role)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        receipt = receipt_store.get_receipt(trx, role)
+        response = HttpResponse(receipt.content, content_type="application/pdf")
+        response["Content-Disposition"] = f'attachment; filename="{receipt.filename}"'
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+    return response
+
+
 @login_required
 @require_POST
 def annuler_transaction(request, transaction_id):
     """
     Annulation par l'acheteur d'une transaction en attente (libère la réservation).
     """
-    trx = transactions.cancel_purchase_request(transaction_id=transaction_id, buyer=request.user)
-    voiture = trx.voiture
-
-    _notify(
-        [trx.vendeur],
-        type="purchase_request",
-        titre="Demande d'achat annulée",
-        contenu=f"{request.user.username} a annulé la demande sur l'annonce #{voiture.id}.",
-        url=voiture.get_absolute_url(),
-    )
+    expiry.sweep_if_due()
+    with db_transaction.atomic():
+        trx = transactions.cancel_purchase_request(transaction_id=transaction_id, buyer=request.user)
+        voiture = trx.voiture
+
+        _notify(
+            [trx.vendeur_id],
+            type="purchase_request",
+            titre="Demande d'achat annulée",
+            contenu=f"{request.user.username} a annulé la demande sur l'annonce #{voiture.id}.",
+            url=voiture.get_absolute_url(),
+        )
     messages.info(request, "Demande annulée.")
     return redirect("mes_achats")
 
@@ -821,22 +901,23 @@ def reserver_voiture(request, voiture_id):
         try:
             debut = timezone.make_aware(datetime.fromisoformat(debut_raw))
             fin = timezone.make_aware(datetime.fromisoformat(fin_raw))
-            res = res_service.create_reservation(
-                voiture_id=voiture.id,
-                client=request.user,
-                debut=debut,
-                fin=fin,
-                type=type_res,
-                note=note,
-                signature=signature,
-            )
-            _notify(
-                [voiture.vendeur],
-                type="purchase_request",
-                titre="Nouvelle réservation",
-                contenu=f"{request.user.username} demande un créneau sur #{voiture.id}.",
-                url=voiture.get_absolute_url(),
-            )
+            with db_transaction.atomic():
+                res = res_service.create_reservation(
+                    voiture_id=voiture.id,
+                    client=request.user,
+                    debut=debut,
+                    fin=fin,
+                    type=type_res,
+                    note=note,
+                    signature=signature,
+                )
+                _notify(
+                    [voiture.vendeur_id],
+                    type="purchase_request",
+                    titre="Nouvelle réservation",
+                    contenu=f"{request.user.username} demande un créneau sur #{voiture.id}.",
+                    url=voiture.get_absolute_url(),
+                )
             messages.success(request, "Demande de réservation envoyée. Le vendeur doit confirmer.")
             if request.headers.get("x-requested-with") == "XMLHttpRequest":
                 return JsonResponse({"ok": True, "reservation_id": res.id, "message": "Demande envoyée"})
@@ -854,39 +935,67 @@ def reserver_voiture(request, voiture_id):
     return redirect("detail_voiture", voiture_id=voiture_id)
 
 
+def _disponibilites_etag(request, voiture_id):
+    debut, fin = availability.calendar_range(request.GET.get("debut"), request.GET.get("fin"))
+    return availability.calendar_etag(voiture_id, debut, fin)
+
+
+def _disponibilites_last_modified(request, voiture_id):
+    return datetime.fromtimestamp(availability.last_change(voiture_id), tz=dt_timezone.utc)
+
+
+@require_GET
+@condition(etag_func=_disponibilites_etag, last_modified_func=_disponibilites_last_modified)
+def disponibilites_voiture(request, voiture_id):
+    """Intervalles occupés d'une voiture (JSON) pour le formulaire de réservation."""
+    debut, fin = availability.calendar_range(request.GET.get("debut"), request.GET.get("fin"))
+    data = availability.calendar(voiture_id, debut, fin)
+    if data is None:
+        raise Http404("Voiture introuvable")
+    response = JsonResponse(data)
+    # Toujours revalider : l'ETag change dès qu'une réservation change de statut.
+    patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    return response
+
+
 @login_required
 @require_POST
 def reservation_action(request, reservation_id, action):
     """Vendeur ou client change le statut (accepter/refuser/annuler)."""
     try:
-        res = res_service.update_status(reservation_id=reservation_id, user=request.user, new_status=action)
-        voiture = res.voiture
+        with db_transaction.atomic():
+            res = res_service.update_status(reservation_id=reservation_id, user=request.user, new_status=action)
+            voiture = res.voiture
+            if action == "acceptee":
+                _notify(
+                    [res.client_id],
+                    type="purchase_request",
+                    titre="Réservation acceptée",
+                    contenu=f"Votre créneau pour l'annonce #{voiture.id} est confirmé.",
+                    url=voiture.get_absolute_url(),
+                )
+            elif action == "refusee":
+                _notify(
+                    [res.client_id],
+                    type="purchase_request",
+                    titre="Réservation refusée",
+                    contenu=f"La réservation pour l'annonce #{voiture.id} a été refusée.",
+                    url=voiture.get_absolute_url(),
+                )
+            elif action == "annulee":
+                _notify(
+                    [voiture.vendeur_id],
+                    type="purchase_request",
+                    titre="Réservation annulée",
+                    contenu=f"{request.user.username} a annulé la réservation sur #{voiture.id}.",
+                    url=voiture.get_absolute_url(),
+                )
+
         if action == "acceptee":
-            _notify(
-                [res.client],
-                type="purchase_request",
-                titre="Réservation acceptée",
-                contenu=f"Votre créneau pour l'annonce #{voiture.id} est confirmé.",
-                url=voiture.get_absolute_url(),
-            )
             messages.success(request, "Réservation acceptée.")
         elif action == "refusee":
-            _notify(
-                [res.client],
-                type="purchase_request",
-                titre="Réservation refusée",
-                contenu=f"La réservation pour l'annonce #{voiture.id} a été refusée.",
-                url=voiture.get_absolute_url(),
-            )
             messages.info(request, "Réservation refusée.")
         elif action == "annulee":
-            _notify(
-                [res.voiture.vendeur],
-                type="purchase_request",
-                titre="Réservation annulée",
-                contenu=f"{request.user.username} a annulé la réservation sur #{voiture.id}.",
-                url=voiture.get_absolute_url(),
-            )
             messages.info(request, "Réservation annulée.")
 
         if request.headers.get("x-requested-with") == "XMLHttpRequest":
@@ -909,16 +1018,18 @@ def refuser_transaction(request, transaction_id):
     """
     Refus par le vendeur d'une transaction en attente (libère la réservation).
     """
-    trx = transactions.refuse_purchase_request(transaction_id=transaction_id, seller=request.user)
-    voiture = trx.voiture
-
-    _notify(
-        [trx.acheteur],
-        type="purchase_request",
-        titre="Demande d'achat refusée",
-        contenu=f"Le vendeur a refusé la demande sur l'annonce #{voiture.id}.",
-        url=voiture.get_absolute_url(),
-    )
+    expiry.sweep_if_due()
+    with db_transaction.atomic():
+        trx = transactions.refuse_purchase_request(transaction_id=transaction_id, seller=request.user)
+        voiture = trx.voiture
+
+        _notify(
+            [trx.acheteur_id],
+            type="purchase_request",
+            titre="Demande d'achat refusée",
+            contenu=f"Le vendeur a refusé la demande sur l'annonce #{voiture.id}.",
+            url=voiture.get_absolute_url(),
+        )
     messages.info(request, "Demande refusée.")
     return redirect("mes_ventes")
 
@@ -952,7 +1063,7 @@ def dashboard(request):
         'modele__marque', 'vendeur'
     ).order_by('-date_ajout')[:10]
 
-    notifications_recentes = Notification.objects.filter(utilisateur=request.user).order_by("-date_creation")[:10]
+    notifications_recentes = notif_service.feed(request.user, limit=10)
     
     context = {
         'total_utilisateurs': total_utilisateurs,
@@ -966,6 +1077,45 @@ def dashboard(request):
     }
     return render(request, 'admin/dashboard.html', context)
 
+
+@login_required
+@require_GET
+def export_recus(request):
+    """Export comptable des reçus d'une période (ZIP ou PDF multi-pages), en streaming."""
+    if not request.user.is_staff:
+        return redirect('accueil')
+
+    today = timezone.localdate()
+    try:
+        debut = date.fromisoformat(request.GET.get("debut") or today.replace(day=1).isoformat())
+        fin = date.fromisoformat(request.GET.get("fin") or today.isoformat())
+    except ValueError:
+        messages.error(request, "Dates invalides (AAAA-MM-JJ).")
+        return redirect('dashboard')
+    fmt = request.GET.get("format") or "zip"
+    if fmt not in receipt_export.FORMATS or fin < debut:
+        messages.error(request, "Période ou format d'export invalide.")
+        return redirect('dashboard')
+
+    response = StreamingHttpResponse(
+        receipt_export.stream_export(
+            debut, fin, fmt=fmt, workers=getattr(settings, "RECEIPT_EXPORT_WORKERS", 1)
+        ),
+        content_type="application/zip" if fmt == "zip" else "application/pdf",
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{receipt_export.export_filename(debut, fin, fmt)}"'
+    )
+    return response
+
+
+@login_required
+def cache_stats(request):
+    """Hits/misses du cache à deux niveaux (processus courant) et versions des modèles."""
+    if not request.user.is_staff:
+        return JsonResponse({"ok": False, "error": "Accès réservé au staff."}, status=403)
+    return JsonResponse(caching.stats())
+
 # ==================== VUES D'ERREUR ====================
 
 def handler404(request, exception):
@@ -1,75 +1,37 @@
 from __future__ import annotations
 
 import hashlib
-import html
 import mimetypes
-import unicodedata
-from pathlib import Path
 
-from django.conf import settings
-from django.http import Http404, HttpResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.http.response import FileResponse
+from django.shortcuts import redirect
+from django.urls import reverse
 
+from voitures import http_cache
+from voitures.http_cache import DEFAULT_CACHE_CONTROL, IMMUTABLE_CACHE_CONTROL
 from voitures.models import Marque
+from voitures.services import brand_svg, logo_catalog, logo_sprite
 
+# Feuille de style / manifeste de la planche : courts, ils pointent vers des fichiers versionnés.
+SPRITE_INDEX_CACHE_CONTROL = "public, max-age=300"
 
-def _brand_initials(name: str) -> str:
-    cleaned = " ".join((name or "").strip().split())
-    if not cleaned:
-        return "?"
-    parts = [p for p in cleaned.replace("-", " ").split(" ") if p]
-    if len(parts) == 1:
-        return parts[0][:2].upper()
-    return (parts[0][:1] + parts[1][:1]).upper()
-
-
-def _brand_colors(key: str) -> tuple[str, str]:
-    digest = hashlib.sha256((key or "").encode("utf-8")).hexdigest()
-    # Couleurs cohérentes par marque (mais sans liste hardcodée).
-    hue = int(digest[:6], 16) % 360
-    hue2 = (hue + 24) % 360
-    return (f"hsl({hue} 82% 50%)", f"hsl({hue2} 86% 58%)")
-
-
-def _normalize_key(value: str) -> str:
-    value = unicodedata.normalize("NFKD", value or "")
-    value = "".join(ch for ch in value if not unicodedata.combining(ch))
-    value = value.lower()
-    return "".join(ch for ch in value if ch.isalnum())
-
-
-def _find_catalog_logo_path(*, catalog_dir: Path, marque_name: str) -> Path | None:
-    if not catalog_dir.exists() or not catalog_dir.is_dir():
-        return None
-
-    wanted = _normalize_key(marque_name)
-    if not wanted:
-        return None
-
-    alias = {
-        "bwm": "bmw",
-        "pegeo": "peugeot",
-        "mercedes_benz": "mercedesbenz",
-        "mercedesbenzlogo": "mercedesbenz",
-    }
-    wanted = alias.get(wanted, wanted)
-
-    # Scan léger (quelques fichiers): match sur le "stem" normalisé.
-    for file_path in sorted(catalog_dir.iterdir(), key=lambda p: p.name.lower()):
-        if not file_path.is_file():
-            continue
-        if file_path.suffix.lower() not in {".png", ".jpg", ".jpeg", ".webp", ".svg"}:
-            continue
-        stem_key = _normalize_key(file_path.stem)
-        stem_key = alias.get(stem_key, stem_key)
-        if stem_key == wanted:
-            return file_path
-    return None
-
-
-def _file_response(path: Path) -> FileResponse:
-    content_type, _ = mimetypes.guess_type(path.name)
-    resp = FileResponse(path.open("rb"), content_type=content_type or "application/octet-stream")
+
+def _svg_response(request, nom: str, cache_control: str = DEFAULT_CACHE_CONTROL) -> HttpResponse:
+    svg = brand_svg.fallback_svg(nom or "")
+    not_modified = http_cache.not_modified(request, svg.etag, cache_control)
+    if not_modified is not None:
+        return not_modified
+    resp = HttpResponse(svg.content, content_type="image/svg+xml; charset=utf-8")
+    resp["ETag"] = svg.etag
+    resp["Cache-Control"] = cache_control
+    return resp
+
+
+def _file_response(fileobj, name: str, etag: str) -> FileResponse:
+    content_type, _ = mimetypes.guess_type(name)
+    resp = FileResponse(fileobj, content_type=content_type or "application/octet-stream")
+    resp["ETag"] = etag
     resp["Cache-Control"] = "public, max-age=86400"
     return resp
 
@@ -87,22 +49,26 @@ def marque_logo(request, marque_id: int):
     # 1) Logo uploadé via Marque.logo
     logo = getattr(marque, "logo", None)
     if logo and getattr(logo, "name", ""):
+        # Le stockage n'écrase jamais un fichier : un nouvel upload change de nom, donc d'ETag.
+        etag = '"' + hashlib.sha256(logo.name.encode("utf-8")).hexdigest()[:32] + '"'
+        not_modified = http_cache.not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
         try:
-            content_type, _ = mimetypes.guess_type(logo.name)
-            resp = FileResponse(logo.open("rb"), content_type=content_type or "application/octet-stream")
-            resp["Cache-Control"] = "public, max-age=86400"
-            return resp
+            return _file_response(logo.open("rb"), logo.name, etag)
         except Exception:
             pass
 
-    # 2) Catalogue (dossier ./logo par défaut)
-    catalog_dir = Path(getattr(settings, "BRAND_LOGO_CATALOG_DIR", settings.BASE_DIR / "logo"))
-    found = _find_catalog_logo_path(catalog_dir=catalog_dir, marque_name=marque.nom or "")
+    # 2) Catalogue (dossier ./logo par défaut), via l'index en mémoire
+    found = logo_catalog.find(marque.nom or "")
     if found:
-        return _file_response(found)
+        not_modified = http_cache.not_modified(request, found.etag)
+        if not_modified is not None:
+            return not_modified
+        return _file_response(found.path.open("rb"), found.path.name, found.etag)
 
     # 3) Fallback SVG généré
-    return marque_logo_svg(request, marque_id)
+    return _svg_response(request, marque.nom)
 
 
 def marque_logo_svg(request, marque_id: int):
@@ -114,25 +80,91 @@ def marque_logo_svg(request, marque_id: int):
         marque = Marque.objects.only("id", "nom").get(id=marque_id)
     except Marque.DoesNotExist as exc:
         raise Http404 from exc
+    return _svg_response(request, marque.nom)
 
-    name = (marque.nom or "").strip() or "Marque"
-    initials = _brand_initials(name)
-    c1, c2 = _brand_colors(name)
-
-    svg = f"""<?xml version="1.0" encoding="UTF-8"?>
-<svg xmlns="http://www.w3.org/2000/svg" width="160" height="80" viewBox="0 0 160 80" role="img" aria-label="{html.escape(name)}">
-  <defs>
-    <linearGradient id="g" x1="0" y1="0" x2="1" y2="1">
-      <stop offset="0" stop-color="{c1}"/>
-      <stop offset="1" stop-color="{c2}"/>
-    </linearGradient>
-  </defs>
-  <rect x="0.5" y="0.5" width="159" height="79" rx="16" fill="url(#g)" stroke="rgba(15,23,42,0.10)"/>
-  <text x="80" y="48" text-anchor="middle" font-family="Inter,system-ui,-apple-system,'Segoe UI',Roboto,Arial,sans-serif"
-        font-size="30" font-weight="700" fill="rgba(255,255,255,0.96)" letter-spacing="0.5">{html.escape(initials)}</text>
-</svg>
-"""
-
-    resp = HttpResponse(svg, content_type="image/svg+xml; charset=utf-8")
-    resp["Cache-Control"] = "public, max-age=86400"
+
+def marque_logo_svg_versioned(request, marque_id: int, digest: str):
+    """
+    SVG de fallback sous une URL qui contient son empreinte : servi `immutable`.
+    Un client qui revalide quand même reçoit un 304 sans requête en base ; une
+    empreinte périmée (marque renommée) redirige vers l'URL courante.
+    """
+    etag = f'"{digest}"'
+    not_modified = http_cache.not_modified(request, etag, IMMUTABLE_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    try:
+        marque = Marque.objects.only("id", "nom").get(id=marque_id)
+    except Marque.DoesNotExist as exc:
+        raise Http404 from exc
+    if brand_svg.digest(marque.nom) != digest:
+        return redirect("marque_logo_svg_versioned", marque_id=marque.id, digest=brand_svg.digest(marque.nom))
+    return _svg_response(request, marque.nom, IMMUTABLE_CACHE_CONTROL)
+
+
+def _sprite_file_url(signature: str, ext: str) -> str:
+    return reverse("logos_sprite_file", args=[signature, ext])
+
+
+def _sprite_pending() -> None:
+    # Aucune planche encore composée : elle l'est en arrière-plan, pas dans cette requête.
+    logo_sprite.schedule_build()
+
+
+def logos_sprite_css(request):
+    """
+    Feuille de style de la dernière planche publiée (une règle de position par marque).
+    Tant qu'aucune n'est prête, feuille vide non mise en cache : les pages gardent
+    une image par marque.
+    """
+    current = logo_sprite.published()
+    if current is None:
+        _sprite_pending()
+        resp = HttpResponse("", content_type="text/css; charset=utf-8")
+        resp["Cache-Control"] = "no-cache"
+        return resp
+    etag = f'"{current["signature"]}"'
+    not_modified = http_cache.not_modified(request, etag, SPRITE_INDEX_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    resp = HttpResponse(
+        logo_sprite.stylesheet(current, _sprite_file_url), content_type="text/css; charset=utf-8"
+    )
+    resp["ETag"] = etag
+    resp["Cache-Control"] = SPRITE_INDEX_CACHE_CONTROL
+    return resp
+
+
+def logos_sprite_json(request):
+    """Manifeste de la dernière planche publiée : positions par marque et URLs versionnées."""
+    current = logo_sprite.published()
+    if current is None:
+        _sprite_pending()
+        raise Http404
+    etag = f'"{current["signature"]}"'
+    not_modified = http_cache.not_modified(request, etag, SPRITE_INDEX_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    payload = dict(current)
+    payload["urls"] = {ext: _sprite_file_url(current["signature"], ext) for ext in logo_sprite.CONTENT_TYPES}
+    resp = JsonResponse(payload)
+    resp["ETag"] = etag
+    resp["Cache-Control"] = SPRITE_INDEX_CACHE_CONTROL
+    return resp
+
+
+def logos_sprite_file(request, signature: str, ext: str):
+    """Planche PNG/WebP ou SVG de symboles, sous une URL qui contient sa signature."""
+    if ext not in logo_sprite.CONTENT_TYPES:
+        raise Http404
+    etag = f'"{signature}-{ext}"'
+    not_modified = http_cache.not_modified(request, etag, IMMUTABLE_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    content = logo_sprite.read(signature, ext)
+    if content is None:
+        raise Http404
+    resp = HttpResponse(content, content_type=logo_sprite.CONTENT_TYPES[ext])
+    resp["ETag"] = etag
+    resp["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
     return resp
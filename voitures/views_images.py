@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import hashlib
+
+from django.core.files.storage import default_storage
+from django.http import Http404
+from django.http.response import FileResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_GET
+
+from voitures import http_cache
+from voitures.http_cache import DEFAULT_CACHE_CONTROL
+from voitures.services import image_variants
+
+
+def _accepts_webp(request) -> bool:
+    return "image/webp" in request.headers.get("Accept", "")
+
+
+@require_GET
+def image_variant(request, width: int, name: str):
+    """
+    Déclinaison d'une photo d'annonce à une largeur du srcset, en WebP si le navigateur
+    l'annonce (en-tête Accept), sinon en JPEG. Générée à la première demande si l'upload
+    ne l'a pas déjà fait. Le nom de la photo peut être réécrit sur place (commandes de
+    démo) : pas d'`immutable`, mais un ETag qui suit le fichier.
+    """
+    if width not in image_variants.WIDTHS or not image_variants.is_source(name):
+        raise Http404
+    fmt = "webp" if _accepts_webp(request) else "jpg"
+    try:
+        variant = image_variants.ensure(name, width, fmt)
+    except OSError as exc:
+        # Source illisible (fichier corrompu ou format inconnu de Pillow).
+        raise Http404 from exc
+    if variant is None:
+        raise Http404
+
+    stamp = f"{variant}:{default_storage.size(variant)}:{default_storage.get_modified_time(variant).timestamp()}"
+    etag = '"' + hashlib.sha256(stamp.encode("utf-8")).hexdigest()[:32] + '"'
+    not_modified = http_cache.not_modified(request, etag)
+    if not_modified is not None:
+        patch_vary_headers(not_modified, ["Accept"])
+        return not_modified
+
+    _pil_format, content_type, _options = image_variants.FORMATS[fmt]
+    resp = FileResponse(default_storage.open(variant, "rb"), content_type=content_type)
+    resp["ETag"] = etag
+    resp["Cache-Control"] = DEFAULT_CACHE_CONTROL
+    patch_vary_headers(resp, ["Accept"])
+    return resp